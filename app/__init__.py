@@ -1,9 +1,15 @@
+import threading
+import click
+from botocore.exceptions import BotoCoreError, ClientError
 from flask import Flask
 from flasgger import Swagger
 from .config import Config
-from .extensions import cors
-from .api.filter_article import article_bp
+from .extensions import cors, job_executor, bulk_poller
+from .api.filter_article import article_bp, resume_unfinished_reports, report_service
 from app.api.report import report_bp
+from app.api.extrace_genes import gene_bp
+from app.api.metrics import metrics_bp
+from app.services.GeneExtraction.extract_logic import gene_extractor
 
 swagger_config = {
     "headers": [],
@@ -29,13 +35,47 @@ template = {
     }
 }
 
+def prepare_tables(app):
+    """Create the DynamoDB tables when configured to, otherwise refuse to start without them."""
+    if app.config.get("DYNAMODB_CREATE_TABLES"):
+        created = report_service.create_tables()
+        if created:
+            print(f"Created DynamoDB tables: {', '.join(created)}")
+    elif app.config.get("DYNAMODB_CHECK_TABLES"):
+        try:
+            missing = report_service.missing_tables()
+        except (BotoCoreError, ClientError) as e:
+            # Unreachable or not allowed to list tables: requests will report the problem
+            print(f"Could not check the DynamoDB tables: {str(e)}")
+            return
+        if missing:
+            raise RuntimeError(
+                f"Missing DynamoDB tables: {', '.join(missing)}. "
+                "Run `flask --app run create-tables` (or set DYNAMODB_CREATE_TABLES=true)."
+            )
+
+
 def create_app(config_class=Config):
 
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # The gene pre-screen rejects articles without gene mentions, so it cannot run without the gene dictionary
+    if app.config.get("GENE_PRESCREEN"):
+        gene_extractor.require_symbols()
+
+    prepare_tables(app)
+
+    @app.cli.command("create-tables")
+    def create_tables_command():
+        """Create the DynamoDB tables and indexes the app needs (safe to run again)."""
+        created = report_service.create_tables()
+        click.echo(f"Created: {', '.join(created)}" if created else "All DynamoDB tables already exist.")
+
     # Initialize extensions
     cors.init_app(app)
+    job_executor.init_app(app)
+    bulk_poller.init_app(app)
 
     # Initialize Flasgger
     Swagger(app, config=swagger_config, template=template)
@@ -46,5 +86,11 @@ def create_app(config_class=Config):
     # Register your blueprint
     app.register_blueprint(article_bp, url_prefix="/api/articles")
     app.register_blueprint(report_bp, url_prefix="/api/reports")
+    app.register_blueprint(gene_bp, url_prefix="/api/genes")
+    app.register_blueprint(metrics_bp)  # Prometheus scrapes /metrics
+
+    # Pick up reports a previous process left unfinished, without delaying startup
+    if app.config.get("RESUME_ON_STARTUP"):
+        threading.Thread(target=resume_unfinished_reports, name="resume-reports", daemon=True).start()
 
     return app
@@ -1,10 +1,24 @@
-from flask import Blueprint
-from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from flask import Blueprint, request, jsonify
+from app.config import Config
+from app.services.GeneExtraction.extract_logic import gene_extractor
 
 gene_bp = Blueprint('gene_bp', __name__)
-service = ArticleFilter()
 
-@gene_bp.route('/filter', methods=['POST'])
-def filter_articles(article_text):
-    # Implementation here
-    return {"status": "success"}
\ No newline at end of file
+
+@gene_bp.route('/extract', methods=['POST'])
+def extract_genes():
+    """
+    Extract gene symbols and variants from one text ({"text": ...}) or many
+    ({"texts": [...]}), returning one {"genes", "variants"} entry per text.
+    """
+    data = request.json or {}
+    texts = data.get("texts")
+    if texts is None and "text" in data:
+        texts = [data["text"]]
+
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({"error": "Expected 'text' (string) or 'texts' (list of strings)"}), 400
+    if len(texts) > Config.GENE_EXTRACTION_MAX_TEXTS:
+        return jsonify({"error": f"At most {Config.GENE_EXTRACTION_MAX_TEXTS} texts per request"}), 400
+
+    return jsonify({"results": gene_extractor.extract_many(texts)}), 200
@@ -1,14 +1,29 @@
 
 from flask import Blueprint, request, jsonify, current_app
-from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from app.services.ArticleFilteration.filter_logic import ArticleFilter, classification_cache, article_store, llm_usage
+from app.services.ArticleFilteration.llm_usage import TierUsage
+from app.services.Metrics import metrics
+from app.services.ArticleFilteration.rule_engine import compile_rules, resolve_rules
+from app.services.ArticleFilteration.pre_ranker import validate_prerank
+from collections import namedtuple
 from datetime import datetime
 from app.services.models.data_models import PubmedRequest
 from app.services.DynamoDB.dynamodb_service import ReportService
-import threading
+from app.services.Pipeline.analysis_pipeline import AnalysisPipeline
+from app.services.Pipeline.report_planner import ReportPlanner
+from app.services.Pipeline.bulk_pipeline import BulkPipeline
+from app.services.ArticleFilteration.bulk_classifier import BulkClassifier
+from app.services.ArticleFilteration.cost_estimator import CostEstimator
+from app.config import Config
+from app.extensions import job_executor, progress_tracker, bulk_poller
+from app.services.Jobs.job_executor import JobQueueFull, WORKER_ID
 
 article_bp = Blueprint('article_bp', __name__)
 filter_service = ArticleFilter()
 report_service = ReportService()
+report_planner = ReportPlanner(report_service)
+bulk_classifier = BulkClassifier()
+cost_estimator = CostEstimator(filter_service)
 
 
 # # ----------------- with reportid and saving, start: ------------------------------
@@ -19,97 +34,372 @@ def filter_articles():
     If found, returns the existing report_id.
     If not, creates a new report and returns its ID.
     """
-    data = request.json or {}
+    try:
+        params = parse_filter_request(request.json or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    (start_date_str, end_date_str, query, criteria, give_reason, extract_genes, batch_mode, use_cache, rules, prerank,
+     cascade, mode) = params
+
+    # Step 1: Check if a report already exists with the same criteria
+    existing_report = report_service.find_existing_report(
+        start_date_str, end_date_str, query, criteria, give_reason, extract_genes, rules, prerank, cascade
+    )
+
+    if existing_report:
+        return jsonify({"report_id": existing_report["report_id"], "message": "Existing report found"}), 200
+
+    # Admission control: refuse new work up front instead of piling up threads
+    if not job_executor.has_capacity():
+        return too_many_jobs(job_executor.reject())
+
+    # Step 2: If no existing report, create a new one (a concurrent identical request may win the race)
+    created_at = datetime.now().isoformat()
+
+    try:
+        report_id, created = report_service.create_report(
+            start_date=start_date_str,
+            end_date=end_date_str,
+            query=query,
+            criteria=criteria,
+            created_at=created_at,
+            give_reason=give_reason,
+            extract_genes=extract_genes,
+            options={
+                "batch_mode": batch_mode, "use_cache": use_cache, "rules": rules, "prerank": prerank,
+                "cascade": cascade, "mode": mode,
+            },
+            worker_id=WORKER_ID
+        )
+    except Exception as e:
+        return jsonify({"error": f"Could not create report: {str(e)}"}), 500
+
+    if not created:
+        return jsonify({"report_id": report_id, "message": "Existing report found"}), 200
+
+    # Step 3: Queue the analysis on the bounded background executor
+    try:
+        job_executor.submit(report_id, run_analysis, report_id, start_date_str, end_date_str, query, criteria, give_reason, extract_genes, batch_mode, use_cache, rules, prerank, cascade, mode)
+    except JobQueueFull as e:
+        report_service.delete_report(report_id)
+        return too_many_jobs(e)
+
+    return jsonify({"report_id": report_id, "message": "Report created, analysis started"}), 201
 
+
+# The options of a /filter request, validated (shared with /filter/estimate)
+FilterRequest = namedtuple("FilterRequest", [
+    "start_date", "end_date", "query", "criteria", "give_reason", "extract_genes", "batch_mode", "use_cache", "rules",
+    "prerank", "cascade", "mode",
+])
+
+
+def parse_filter_request(data):
+    """Read and validate the body of a /filter request. Raises ValueError with the message for the 400."""
     start_date_str = data.get("start_date")
     end_date_str = data.get("end_date")
     query = data.get("query", "")
     criteria = data.get("criteria", "")
     give_reason = data.get("give_reason", False)
     extract_genes = data.get("extract_genes", False)
+    batch_mode = data.get("batch_mode")  # None -> Config.LLM_BATCH_MODE
+    use_cache = not data.get("bypass_cache", False)
 
     if not start_date_str or not end_date_str: #or not criteria:
-        return jsonify({"error": "Missing start_date, end_date, or criteria"}), 400
+        raise ValueError("Missing start_date, end_date, or criteria")
 
     date_format_in = "%Y-%m-%d"
 
     try:
-        start_date_obj = datetime.strptime(start_date_str, date_format_in).date()
-        end_date_obj = datetime.strptime(end_date_str, date_format_in).date()
+        datetime.strptime(start_date_str, date_format_in).date()
+        datetime.strptime(end_date_str, date_format_in).date()
     except ValueError:
-        return jsonify({"error": "Invalid date format, expected YYYY-MM-DD"}), 400
+        raise ValueError("Invalid date format, expected YYYY-MM-DD")
 
-    # Step 1: Check if a report already exists with the same criteria
-    existing_report = report_service.find_existing_report(start_date_str, end_date_str, query, criteria)
+    # Metadata rules (a rule set name or a list of rules) decide some articles without the LLM
+    try:
+        rules = resolve_rules(data.get("rules"))
+        compile_rules(rules)
+    except ValueError as e:
+        raise ValueError(f"Invalid rules: {str(e)}")
 
-    if existing_report:
-        return jsonify({"report_id": existing_report["report_id"], "message": "Existing report found"}), 200
+    # Local BM25 pre-ranking ({"top_k", "top_fraction", "threshold"}) keeps low-scoring articles from the LLM
+    prerank = validate_prerank(data.get("prerank"))
 
-    # Step 2: If no existing report, create a new one
-    report_id = f"report-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    created_at = datetime.now().isoformat()
+    # Cheap first-pass model, reasoning model only for Relevant/uncertain articles (only applies with give_reason)
+    cascade = bool(data.get("cascade", Config.LLM_CASCADE)) and bool(give_reason)
 
-    report_service.save_report(
-        report_id=report_id,
-        start_date=start_date_str,
-        end_date=end_date_str,
-        query=query,
-        criteria=criteria,
-        created_at=created_at
-    )
-    # Step 3: Run analysis in a separate thread
-    thread = threading.Thread(target=run_analysis, args=(report_id, start_date_str, end_date_str, query, criteria, give_reason, extract_genes))
-    thread.start()
+    # "bulk" classifies through the Batch API: slower to finish, cheaper, no rate-limit pressure
+    mode = data.get("mode", "interactive")
+    if mode not in ("interactive", "bulk"):
+        raise ValueError("mode must be 'interactive' or 'bulk'")
 
-    return jsonify({"report_id": report_id, "message": "Report created, analysis started"}), 201
+    return FilterRequest(
+        start_date_str, end_date_str, query, criteria, give_reason, extract_genes, batch_mode, use_cache, rules, prerank,
+        cascade, mode
+    )
 
 
-def run_analysis(report_id, start_date, end_date, query, criteria, give_reason, extract_genes):
+@article_bp.route('/filter/estimate', methods=['POST'])
+def estimate_filter():
     """
-    Runs the analysis and updates the report in DynamoDB.
+    Dry run of /filter: the projected LLM calls, tokens, cost and wall time of the report,
+    without creating it or calling the LLM (see CostEstimator).
+
+    Takes the /filter body, plus optionally `model` (default: the model the report would
+    use) and `max_concurrency` (default: Config.LLM_MAX_CONCURRENCY).
     """
+    data = request.json or {}
     try:
-        print(f"Starting analysis for report_id: {report_id}")
-       
-        date_format_in = "%Y-%m-%d"
-        date_format_pubmed_api = "%Y/%m/%d"
+        params = parse_filter_request(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    max_concurrency = data.get("max_concurrency")
+    # JSON true/false arrive as bools, which are ints too
+    if max_concurrency is not None and (isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1):
+        return jsonify({"error": "max_concurrency must be a positive integer"}), 400
+    model = data.get("model")
+    if model is not None and (not isinstance(model, str) or not model):
+        return jsonify({"error": "model must be a model name"}), 400
+
+    pubmed_request = PubmedRequest(
+        start_date=params.start_date.replace("-", "/"),
+        end_date=params.end_date.replace("-", "/"),
+        query=params.query
+    )
+    try:
+        estimate = cost_estimator.estimate(
+            pubmed_request, params.criteria, params.query, params.give_reason, params.extract_genes, params.batch_mode,
+            params.use_cache, params.rules, params.prerank, params.cascade, params.mode, model, max_concurrency
+        )
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
 
-        try:
-            start_date_obj = datetime.strptime(start_date, date_format_in).date()
-            end_date_obj = datetime.strptime(start_date, date_format_in).date()
-        except ValueError:
-            return jsonify({"error": "Invalid date format, expected YYYY-MM-DD"}), 400
+    # Starting the report would return this one instead
+    existing_report = report_service.find_existing_report(
+        params.start_date, params.end_date, params.query, params.criteria, params.give_reason, params.extract_genes,
+        params.rules, params.prerank, params.cascade
+    )
+    estimate["existing_report_id"] = existing_report["report_id"] if existing_report else None
+    return jsonify(estimate), 200
 
-        pubmed_request = PubmedRequest(
-            start_date=start_date_obj.strftime(date_format_pubmed_api),
-            end_date=end_date_obj.strftime(date_format_pubmed_api),
-            query=query
-        )
 
-        articles = filter_service.get_pubmed_articles(pubmed_request)
+def too_many_jobs(error):
+    response = jsonify({"error": "Too many analyses in progress, please retry later", "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
 
-        # criteria = """The article has gene or variant or mutation name and mentions it's related to one of these disease:
-        #     intellectual disability OR mental retardation OR developmental delay OR neurodevelopmental OR epilepsy OR encephalopathy OR seizure.
-        #     Published in credible journals (avoid poor/local ones).
-        #     Based on multiple families/people (not single-family/person studies).
-        #     Conducted on humans (exclude studies solely on animals/mice).
-        #     Not a GWAS study.
-        #     Avoid articles with 'potential' or 'novel candidate gene' in the title/abstract.
-        #     Focus on Mendelian genetics with correct phenotypes.
-        #     Exclude phenotype expansion papers or known variants."""
 
-        analyzed_results = filter_service.analyze_articles_with_LLM(
-            articles, criteria, query, give_reason, extract_genes
-        )
+def requeue_report(report_id):
+    """Called for jobs left unfinished at shutdown; they are picked up again on the next start."""
+    report_service.update_status(report_id, "queued")
+
+
+job_executor.on_requeue = requeue_report
+
+
+def poll_bulk_report(report_id):
+    """One BulkPoller tick for a bulk report; True once it no longer needs polling."""
+    pipeline = BulkPipeline(filter_service, report_service, bulk_classifier, progress=progress_tracker)
+    return pipeline.poll(report_id)
+
+
+bulk_poller.poll_report = poll_bulk_report
+bulk_poller.on_requeue = requeue_report
+
+
+def resume_analysis_job(report):
+    """
+    Queue `run_analysis` again for a stored report header. The pipeline picks up the
+    checkpointed PMID list and only processes articles without a verdict.
+    Raises JobQueueFull when the executor cannot take the job.
+    """
+    options = report.get("options") or {}
+    job_executor.submit(
+        report["report_id"], run_analysis,
+        report["report_id"], report["start_date"], report["end_date"], report["query"], report["criteria"],
+        options.get("give_reason", False), options.get("extract_genes", False),
+        options.get("batch_mode"), options.get("use_cache", True), options.get("rules"),
+        validate_prerank(options.get("prerank")), options.get("cascade", False), options.get("mode", "interactive")
+    )
 
-        # Step 4: Update the report in DynamoDB with analyzed results
-        report_service.update_report_and_status(report_id, analyzed_results, "complete")
 
-        print(f"Analysis complete for report_id: {report_id}")
+def recently_active(report):
+    """
+    True for a `processing` report whose last checkpoint (or start) is younger than
+    RESUME_STALE_SECONDS: its job may still be running in another process.
+    """
+    if report.get("status") != "processing":
+        return False
+    last_seen = report.get("checkpoint_at") or report.get("created_at")
+    return bool(last_seen) and (datetime.now() - datetime.fromisoformat(last_seen)).total_seconds() < Config.RESUME_STALE_SECONDS
 
+
+def resume_unfinished_reports():
+    """
+    Resume reports left unfinished by a previous process: `queued` ones right away and
+    `processing` ones once their last checkpoint is older than RESUME_STALE_SECONDS
+    (younger ones may still be running elsewhere). Each report is claimed with a
+    conditional update first, so only one process resumes it.
+    """
+    try:
+        unfinished = report_service.find_unfinished_reports()
     except Exception as e:
-        print(f"Error in analysis: {str(e)}")
-        report_service.update_status(report_id, "error")
+        print(f"Could not look for unfinished reports: {str(e)}")
+        return
+
+    for summary in unfinished:
+        report_id = summary["report_id"]
+        if summary.get("worker_id") == WORKER_ID or job_executor.is_active(report_id) or bulk_poller.is_watching(report_id):
+            continue
+        if recently_active(summary):
+            continue
+        if not job_executor.has_capacity():
+            print("Job queue full, leaving the remaining unfinished reports for later.")
+            break
+        try:
+            if not report_service.claim_report(report_id, WORKER_ID, summary.get("worker_id")):
+                continue
+            resume_analysis_job(report_service.get_report_header(report_id))
+            print(f"Resumed unfinished report {report_id}")
+        except JobQueueFull:
+            report_service.update_status(report_id, "queued")
+            break
+        except Exception as e:
+            print(f"Could not resume report {report_id}: {str(e)}")
+
+
+@article_bp.route('/jobs', methods=['GET'])
+def job_stats():
+    """
+    Queued/running/completed gauges of the background analysis executor, and of the
+    poller watching bulk reports' Batch API jobs.
+    """
+    return jsonify({**job_executor.stats(), "bulk_poller": bulk_poller.stats()}), 200
+
+
+def run_analysis(report_id, start_date, end_date, query, criteria, give_reason, extract_genes, batch_mode=None, use_cache=True, rules=None,
+                 prerank=None, cascade=False, mode="interactive"):
+    """
+    Runs the analysis and updates the report in DynamoDB.
+
+    Fetching, classification and persistence are pipelined (see AnalysisPipeline),
+    so results are written to the report while later batches are still being fetched.
+    In bulk mode the LLM verdicts come from Batch API jobs instead (see BulkPipeline),
+    and the report is finished by the BulkPoller once they are collected.
+    Stage timings and request, token, cost and capacity counters are stored on the
+    report header as `metrics`.
+    """
+    # Another process may have claimed the report while the job was queued (see start_job)
+    if not report_service.start_job(report_id, WORKER_ID):
+        print(f"Report {report_id} was taken over by another worker, skipping its queued job.")
+        return
+
+    waiting = False
+    with metrics.report_metrics() as report_metrics:
+        try:
+            print(f"Starting analysis for report_id: {report_id}")
+            progress_tracker.start(report_id)
+       
+            date_format_in = "%Y-%m-%d"
+            date_format_pubmed_api = "%Y/%m/%d"
+
+            start_date_obj = datetime.strptime(start_date, date_format_in).date()
+            end_date_obj = datetime.strptime(end_date, date_format_in).date()
+
+            pubmed_request = PubmedRequest(
+                start_date=start_date_obj.strftime(date_format_pubmed_api),
+                end_date=end_date_obj.strftime(date_format_pubmed_api),
+                query=query
+            )
+
+            # criteria = """The article has gene or variant or mutation name and mentions it's related to one of these disease:
+            #     intellectual disability OR mental retardation OR developmental delay OR neurodevelopmental OR epilepsy OR encephalopathy OR seizure.
+            #     Published in credible journals (avoid poor/local ones).
+            #     Based on multiple families/people (not single-family/person studies).
+            #     Conducted on humans (exclude studies solely on animals/mice).
+            #     Not a GWAS study.
+            #     Avoid articles with 'potential' or 'novel candidate gene' in the title/abstract.
+            #     Focus on Mendelian genetics with correct phenotypes.
+            #     Exclude phenotype expansion papers or known variants."""
+
+            # Reuse verdicts of overlapping earlier reports and only search what they miss
+            search_requests = None
+            if Config.DELTA_ANALYSIS_ENABLED:
+                search_requests = reuse_earlier_verdicts(
+                    report_id, start_date, end_date, query, criteria, give_reason, extract_genes, rules, prerank, cascade
+                )
+
+            tier_usage = TierUsage()
+            if mode == "bulk":
+                pipeline = BulkPipeline(filter_service, report_service, bulk_classifier, progress=progress_tracker)
+            else:
+                pipeline = AnalysisPipeline(filter_service, report_service, progress=progress_tracker)
+            try:
+                pipeline.run(
+                    report_id, pubmed_request, criteria, query, give_reason, extract_genes,
+                    search_requests=search_requests, batch_mode=batch_mode, use_cache=use_cache, rules=rules, prerank=prerank,
+                    cascade=cascade, tier_usage=tier_usage
+                )
+            finally:
+                report_service.record_llm_tiers(report_id, tier_usage.stats())
+
+            # Batch API jobs still running: the poller finishes the report once they are collected
+            if getattr(pipeline, "waiting", False):
+                waiting = True
+                print(f"Waiting for the Batch API for report_id: {report_id}")
+                return
+
+            # Step 4: Mark the report as complete once every result has been written
+            report_service.finish_report(report_id, "complete")
+            progress_tracker.finish(report_id, "complete")
+
+            print(f"Analysis complete for report_id: {report_id}")
+
+        except Exception as e:
+            print(f"Error in analysis: {str(e)}")
+            report_service.update_status(report_id, "error")
+            progress_tracker.finish(report_id, "error")
+        finally:
+            report_service.record_metrics(report_id, report_metrics.stats())
+            # Only once the metrics are stored, polls add to them
+            if waiting:
+                bulk_poller.watch(report_id)
+
+def reuse_earlier_verdicts(report_id, start_date, end_date, query, criteria, give_reason, extract_genes, rules=None, prerank=None,
+                           cascade=False):
+    """
+    Copy the verdicts of overlapping completed reports into `report_id` and return the
+    PubmedRequests for the date ranges they leave uncovered, or None when nothing can be
+    reused (or the report is being resumed and already has its PMID checkpoint).
+    """
+    header = report_service.get_report_header(report_id)
+    if header is None or report_service.get_checkpoint_ids(header) is not None:
+        return None
+
+    plan = report_planner.plan(report_id, start_date, end_date, query, criteria, give_reason, extract_genes, rules, prerank, cascade)
+    if not plan.reused:
+        return None
+
+    reused_from = []
+    for reused in plan.reused:
+        copied = report_service.copy_articles(
+            reused.report_id, report_id,
+            reused.start_date if reused.dated else None, reused.end_date if reused.dated else None
+        )
+        reused_from.append({"report_id": reused.report_id, "start_date": reused.start_date, "end_date": reused.end_date, "articles": copied})
+        print(f"Reused {copied} verdicts of {reused.report_id} for {reused.start_date} to {reused.end_date}")
+    report_service.record_reused_verdicts(report_id, reused_from, verdict_dates=all(reused.dated for reused in plan.reused))
+
+    return [
+        PubmedRequest(
+            start_date=uncovered.start_date.replace("-", "/"),
+            end_date=uncovered.end_date.replace("-", "/"),
+            query=query
+        )
+        for uncovered in plan.uncovered
+    ]
 
 @article_bp.route('/analyze', methods=['POST'])
 def analyze_articles_api():
@@ -127,9 +417,23 @@ def analyze_articles_api():
         query = data.get("query", "")
         give_reason = data.get("give_reason", False)
         extract_genes = data.get("extract_genes", False)
+        batch_mode = data.get("batch_mode")
+        use_cache = not data.get("bypass_cache", False)
+        rules = data.get("rules")
 
         if not start_date_str or not end_date_str:
             return jsonify({"error": "Missing start_date or end_date"}), 400
+
+        try:
+            compile_rules(rules)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid rules: {str(e)}"}), 400
+
+        try:
+            prerank = validate_prerank(data.get("prerank"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        cascade = data.get("cascade")
         
         date_format_in = "%Y-%m-%d"
         date_format_pubmed_api = "%Y/%m/%d"
@@ -159,7 +463,8 @@ def analyze_articles_api():
             Exclude phenotype expansion papers or known variants."""
 
         analyzed_results = filter_service.analyze_articles_with_LLM(
-            articles, criteria, query, give_reason, extract_genes
+            articles, criteria, query, give_reason, extract_genes, batch_mode=batch_mode, use_cache=use_cache, rules=rules, prerank=prerank,
+            cascade=cascade
         )
 
         # Update DynamoDB with analyzed articles
@@ -170,6 +475,27 @@ def analyze_articles_api():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@article_bp.route('/cache/stats', methods=['GET'])
+def classification_cache_stats():
+    """
+    Hit/miss counters and size of the persistent classification cache.
+    """
+    return jsonify(classification_cache.stats()), 200
+
+@article_bp.route('/store/stats', methods=['GET'])
+def article_store_stats():
+    """
+    Hit ratio and size of the local PubMed article store.
+    """
+    return jsonify(article_store.stats()), 200
+
+@article_bp.route('/llm/usage', methods=['GET'])
+def llm_usage_stats():
+    """
+    Prompt, completion and prompt-cache token totals per model, as reported by the API.
+    """
+    return jsonify(llm_usage.stats()), 200
+
 # @article_bp.route('/reports/<report_id>', methods=['GET'])
 # def get_report(report_id):
 #     """
@@ -0,0 +1,14 @@
+from flask import Blueprint, Response
+from app.services.Metrics.metrics import render_prometheus
+from app.extensions import job_executor
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Process-wide stage timings and NCBI, LLM (tokens, estimated cost), DynamoDB and job
+    counters in the Prometheus text format. Per-report values are on the report's `metrics`.
+    """
+    return Response(render_prometheus(jobs=job_executor.stats()), mimetype="text/plain; version=0.0.4")
@@ -1,15 +1,190 @@
-from flask import Blueprint, jsonify
-from app.services.DynamoDB.dynamodb_service import ReportService
+import base64
+import gzip
+import json
+import queue
+import re
+import time
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app.config import Config
+from app.services.DynamoDB.dynamodb_service import ReportService, REPORT_HEADER_FIELDS
+from app.services.Jobs.job_executor import JobQueueFull, WORKER_ID
+from app.extensions import job_executor, progress_tracker, bulk_poller
+from app.api.filter_article import resume_analysis_job, too_many_jobs, recently_active
 
 report_bp = Blueprint('report_bp', __name__)
 report_service = ReportService()
 
+FIELD_NAME = re.compile(r"^\w+$")
+
 @report_bp.route("/<report_id>", methods=["GET"])
 def get_report(report_id):
-    """Fetch a report by report_id"""
-    report = report_service.get_report(report_id) 
+    """
+    Fetch a report by report_id, one page of articles at a time.
+
+    Query parameters:
+      limit     -- articles per page (default REPORT_PAGE_SIZE, at most REPORT_MAX_PAGE_SIZE)
+      cursor    -- `next_cursor` from the previous page
+      fields    -- comma-separated article fields to return, e.g. PubMedID,Title,Relevance
+      relevance -- comma-separated Relevance values to keep, e.g. Relevant
+    """
+    try:
+        limit = int(request.args.get("limit", Config.REPORT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= Config.REPORT_MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {Config.REPORT_MAX_PAGE_SIZE}"}), 400
+
+    fields = split_param(request.args.get("fields"))
+    if any(not FIELD_NAME.match(field) for field in fields):
+        return jsonify({"error": "Invalid field name in fields"}), 400
+    relevance = split_param(request.args.get("relevance"))
+
+    start_key = None
+    if request.args.get("cursor"):
+        start_key = decode_cursor(request.args["cursor"])
+        if start_key is None or start_key.get("report_id", report_id) != report_id:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    try:
+        report, articles, next_key = report_service.get_report_page(report_id, limit, start_key, fields, relevance)
+    except Exception as e:
+        print(f"❌ Error retrieving report: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
     if not report:
         return jsonify({"error": "Report not found"}), 404
 
+    report["filtered_articles"] = articles
+    report["next_cursor"] = encode_cursor(next_key) if next_key else None
     return jsonify(report), 200
+
+
+def split_param(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def encode_cursor(key):
+    """Opaque page token: the DynamoDB LastEvaluatedKey as URL-safe base64 JSON."""
+    return base64.urlsafe_b64encode(json.dumps(key, default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return key if isinstance(key, dict) else None
+
+
+@report_bp.route("/<report_id>/events", methods=["GET"])
+def report_events(report_id):
+    """
+    Server-Sent Events stream of a report's progress.
+
+    Events: `progress` (ids_found, fetched, classified, relevant_so_far, eta_seconds),
+    `article` (each newly persisted verdict, without its abstract) and a final `done`.
+    Reports running in another process are followed by polling their header.
+    """
+    subscription = progress_tracker.subscribe(report_id)
+    if subscription is None and report_service.get_report_header(report_id, ["report_id"]) is None:
+        return jsonify({"error": "Report not found"}), 404
+
+    return Response(
+        stream_with_context(stream_report_events(report_id, subscription)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def stream_report_events(report_id, subscription):
+    # Not running here (queued, on another worker or already finished): poll the header,
+    # switching to the live stream if the job starts in this process
+    last_sent = None
+    while subscription is None:
+        header = report_service.get_report_header(report_id, REPORT_HEADER_FIELDS) or {}
+        progress = {
+            "report_id": report_id,
+            "status": header.get("status"),
+            "ids_found": int(header["resolved_count"]) if "resolved_count" in header else None,
+            "classified": int(header.get("article_count", 0)),
+        }
+        if progress != last_sent:
+            yield format_event("progress", progress)
+            last_sent = progress
+        if header.get("status") not in ("processing", "queued"):
+            yield format_event("done", {"report_id": report_id, "status": header.get("status")})
+            return
+        time.sleep(Config.SSE_POLL_SECONDS)
+        subscription = progress_tracker.subscribe(report_id)
+
+    try:
+        while True:
+            try:
+                event, data = subscription.events.get(timeout=Config.SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                if subscription.dropped:
+                    yield format_event("error", {"error": "Client fell behind, reconnect and page the report instead"})
+                    return
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event, data)
+            if event == "done":
+                return
+    finally:
+        progress_tracker.unsubscribe(subscription)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@report_bp.after_request
+def compress_response(response):
+    """Gzip report responses above GZIP_MIN_BYTES when the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed or not 200 <= response.status_code < 300
+            or "Content-Encoding" in response.headers or "gzip" not in request.accept_encodings):
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.GZIP_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+@report_bp.route("/<report_id>/resume", methods=["POST"])
+def resume_report(report_id):
+    """
+    Continue an unfinished report from its last checkpoint. A `processing` report is
+    only taken over once its checkpoint is older than RESUME_STALE_SECONDS.
+    """
+    report = report_service.get_report_header(report_id)
+
+    if not report:
+        return jsonify({"error": "Report not found"}), 404
+    if report.get("status") == "complete":
+        return jsonify({"error": "Report is already complete"}), 409
+    if job_executor.is_active(report_id) or bulk_poller.is_watching(report_id):
+        return jsonify({"error": "Report is already being analyzed"}), 409
+    # Its job may be running in another process; only abandoned reports are taken over
+    if recently_active(report):
+        return jsonify({
+            "error": "Report is still being analyzed",
+            "checkpoint_at": report.get("checkpoint_at"),
+            "stale_after_seconds": Config.RESUME_STALE_SECONDS,
+        }), 409
+    if not job_executor.has_capacity():
+        return too_many_jobs(job_executor.reject())
+    if not report_service.claim_report(report_id, WORKER_ID, report.get("worker_id")):
+        return jsonify({"error": "Report was claimed by another worker"}), 409
+
+    try:
+        resume_analysis_job(report)
+    except JobQueueFull as e:
+        report_service.update_status(report_id, "queued")
+        return too_many_jobs(e)
+
+    return jsonify({"report_id": report_id, "message": "Analysis resumed"}), 202
@@ -10,6 +10,16 @@ class Config:
     AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY')
     AWS_SECRET_KEY = os.environ.get('AWS_SECRET_KEY')
 
+    # Set to point at DynamoDB Local (e.g. http://localhost:8000); None uses AWS
+    DYNAMODB_ENDPOINT_URL = os.environ.get('DYNAMODB_ENDPOINT_URL')
+    DYNAMODB_MAX_RETRIES = int(os.environ.get('DYNAMODB_MAX_RETRIES', 8))
+    # The report, article and fingerprint tables and the query fingerprint index are provisioned with
+    # `flask --app run create-tables` (once per environment, and again after upgrades that add one).
+    # At startup the app checks they exist and refuses to start otherwise, or creates missing ones
+    # when DYNAMODB_CREATE_TABLES is set (DynamoDB Local, development).
+    DYNAMODB_CHECK_TABLES = os.environ.get('DYNAMODB_CHECK_TABLES', 'true').lower() == 'true'
+    DYNAMODB_CREATE_TABLES = os.environ.get('DYNAMODB_CREATE_TABLES', 'false').lower() == 'true'
+
     # General Flask settings
     SECRET_KEY = os.environ.get('SECRET_KEY', 'a-very-secret-key')
     DEBUG = os.environ.get('DEBUG', True)
@@ -18,6 +28,8 @@ class Config:
     # PubMed API settings
     ENTREZ_EMAIL = os.environ.get('ENTREZ_EMAIL', 'your_email@example.com')
     ENTREZ_API_KEY = os.environ.get('ENTREZ_API_KEY', 'default_ncbi_api_key')
+    # Override to point at a mirror or a local stub (e.g. the benchmark suite's)
+    NCBI_EUTILS_URL = os.environ.get('NCBI_EUTILS_URL', 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils')
     
     TOTAL_PUBMED_RESULTS = int(os.environ.get('TOTAL_PUBMED_RESULTS', 2000))
     BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 500))
@@ -25,5 +37,117 @@ class Config:
     # Add the MAX_FETCH_IDS key
     MAX_FETCH_IDS = int(os.environ.get('MAX_FETCH_IDS', 2000))
 
+    # Parallel efetch workers sharing one NCBI rate limiter and HTTP session
+    NCBI_FETCH_WORKERS = int(os.environ.get('NCBI_FETCH_WORKERS', 4))
+    NCBI_MAX_RETRIES = int(os.environ.get('NCBI_MAX_RETRIES', 4))
+    NCBI_BACKOFF_BASE = float(os.environ.get('NCBI_BACKOFF_BASE', 0.5))
+    NCBI_TIMEOUT = int(os.environ.get('NCBI_TIMEOUT', 60))
+
+    # Search once with usehistory=y and efetch from the Entrez history server
+    PUBMED_USE_HISTORY = os.environ.get('PUBMED_USE_HISTORY', 'true').lower() == 'true'
+    # Upper bound on records fetched through the history server, like TOTAL_PUBMED_RESULTS without it (0 = all matches)
+    PUBMED_MAX_RESULTS = int(os.environ.get('PUBMED_MAX_RESULTS', TOTAL_PUBMED_RESULTS))
+
+    # Local PMID-keyed store of parsed articles, read through before efetch
+    ARTICLE_STORE_ENABLED = os.environ.get('ARTICLE_STORE_ENABLED', 'true').lower() == 'true'
+    ARTICLE_STORE_PATH = os.environ.get('ARTICLE_STORE_PATH', 'cache/article_store.sqlite3')
+    ARTICLE_STORE_MAX_AGE_DAYS = int(os.environ.get('ARTICLE_STORE_MAX_AGE_DAYS', 30))
+
+    # LLM classification settings
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    LLM_REQUESTS_PER_MINUTE = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 500))
+    LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 200000))
+    LLM_MAX_OUTPUT_TOKENS = int(os.environ.get('LLM_MAX_OUTPUT_TOKENS', 400))
+    # Ask for schema-constrained JSON (models that support it)
+    LLM_STRUCTURED_OUTPUT = os.environ.get('LLM_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+    # Rate-limit/server errors are retried with jittered exponential backoff
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 5))
+    LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 1.0))
+    LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 60))
+    # Times a job re-classifies its failed articles after everything else is done
+    LLM_REQUEUE_ROUNDS = int(os.environ.get('LLM_REQUEUE_ROUNDS', 1))
+
+    # Batched classification: several articles per chat completion
+    LLM_BATCH_MODE = os.environ.get('LLM_BATCH_MODE', 'false').lower() == 'true'
+    LLM_BATCH_MAX_TOKENS = int(os.environ.get('LLM_BATCH_MAX_TOKENS', 3800))
+    LLM_BATCH_MAX_ARTICLES = int(os.environ.get('LLM_BATCH_MAX_ARTICLES', 10))
+
+    # Persistent cache of LLM verdicts
+    CLASSIFICATION_CACHE_ENABLED = os.environ.get('CLASSIFICATION_CACHE_ENABLED', 'true').lower() == 'true'
+    CLASSIFICATION_CACHE_PATH = os.environ.get('CLASSIFICATION_CACHE_PATH', 'cache/classification_cache.sqlite3')
+    CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.environ.get('CLASSIFICATION_CACHE_MAX_ENTRIES', 200000))
+
+    # Streaming analysis pipeline (fetch -> classify -> persist)
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 4))
+    PIPELINE_CLASSIFY_CHUNK = int(os.environ.get('PIPELINE_CLASSIFY_CHUNK', 50))
+
+    # Background analysis jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 10))
+    JOB_SHUTDOWN_TIMEOUT = int(os.environ.get('JOB_SHUTDOWN_TIMEOUT', 30))
+    JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 60))
+
+    # Resume unfinished reports when the app starts
+    RESUME_ON_STARTUP = os.environ.get('RESUME_ON_STARTUP', 'true').lower() == 'true'
+    # A processing report whose last checkpoint is older than this is considered abandoned
+    RESUME_STALE_SECONDS = int(os.environ.get('RESUME_STALE_SECONDS', 600))
+
+    # GET /api/reports/<report_id> paging and compression
+    REPORT_PAGE_SIZE = int(os.environ.get('REPORT_PAGE_SIZE', 100))
+    REPORT_MAX_PAGE_SIZE = int(os.environ.get('REPORT_MAX_PAGE_SIZE', 1000))
+    GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', 1024))
+
+    # GET /api/reports/<report_id>/events (Server-Sent Events)
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_POLL_SECONDS = int(os.environ.get('SSE_POLL_SECONDS', 5))  # reports running in another process
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 5000))
+    PROGRESS_RETENTION_SECONDS = int(os.environ.get('PROGRESS_RETENTION_SECONDS', 300))
+
+    # Build new reports from overlapping completed reports and only analyze the uncovered dates
+    DELTA_ANALYSIS_ENABLED = os.environ.get('DELTA_ANALYSIS_ENABLED', 'true').lower() == 'true'
+    DELTA_MAX_SOURCE_AGE_DAYS = int(os.environ.get('DELTA_MAX_SOURCE_AGE_DAYS', 30))  # 0 = any age
+
+    # Optional JSON file of named metadata rule sets ({"name": [rule, ...]}), see rule_engine.py
+    RULES_PATH = os.environ.get('RULES_PATH')
+
+    # Local gene/variant extraction (see GeneExtraction/extract_logic.py). HGNC_PATH is a tab-separated
+    # HGNC export (https://www.genenames.org/download/) with symbol, alias_symbol and prev_symbol columns.
+    HGNC_PATH = os.environ.get('HGNC_PATH', 'data/hgnc_complete_set.txt')
+    GENE_MIN_ALIAS_LENGTH = int(os.environ.get('GENE_MIN_ALIAS_LENGTH', 3))
+    # Comma-separated approved symbols never reported (e.g. "AR" when "AR" mostly means autosomal recessive);
+    # common abbreviations are only dropped from aliases and previous symbols by default
+    GENE_SYMBOL_STOPLIST = os.environ.get('GENE_SYMBOL_STOPLIST', '')
+    GENE_EXTRACTION_MAX_TEXTS = int(os.environ.get('GENE_EXTRACTION_MAX_TEXTS', 10000))
+    # Fill GeneVariants from the extractor instead of asking the LLM for them (saves output tokens)
+    LOCAL_GENE_EXTRACTION = os.environ.get('LOCAL_GENE_EXTRACTION', 'false').lower() == 'true'
+    # Mark articles mentioning no gene or variant Not Relevant without an LLM call
+    GENE_PRESCREEN = os.environ.get('GENE_PRESCREEN', 'false').lower() == 'true'
+
+    # Models: the reasoning model answers give_reason requests. In cascade mode the cheap screening
+    # model classifies every article first and only Relevant or uncertain ones are escalated.
+    LLM_SCREEN_MODEL = os.environ.get('LLM_SCREEN_MODEL', 'gpt-4o-mini')
+    LLM_REASONING_MODEL = os.environ.get('LLM_REASONING_MODEL', 'o1-mini')
+    LLM_CASCADE = os.environ.get('LLM_CASCADE', 'false').lower() == 'true'
+    LLM_CASCADE_MIN_CONFIDENCE = float(os.environ.get('LLM_CASCADE_MIN_CONFIDENCE', 0.8))
+
+    # Bulk mode (mode="bulk" on /filter): requests go through the OpenAI Batch API (see bulk_classifier.py)
+    LLM_BULK_POLL_SECONDS = float(os.environ.get('LLM_BULK_POLL_SECONDS', 60))
+    LLM_BULK_MAX_REQUESTS = int(os.environ.get('LLM_BULK_MAX_REQUESTS', 50000))  # Batch API limit per input file
+    LLM_BULK_DIR = os.environ.get('LLM_BULK_DIR', 'cache/bulk')  # Batch input files, removed once uploaded
+    # Use the in-process fake batch client instead of the API (local development and tests)
+    LLM_BULK_FAKE = os.environ.get('LLM_BULK_FAKE', 'false').lower() == 'true'
+    LLM_BULK_FAKE_SECONDS = float(os.environ.get('LLM_BULK_FAKE_SECONDS', 5))
+
+    # Dry-run estimates (/filter/estimate, see cost_estimator.py): articles fetched as a sample, the
+    # LLM latency assumed until this process has observed one, and the share of articles a cascade escalates
+    ESTIMATE_SAMPLE_SIZE = int(os.environ.get('ESTIMATE_SAMPLE_SIZE', 200))
+    ESTIMATE_LLM_LATENCY_SECONDS = float(os.environ.get('ESTIMATE_LLM_LATENCY_SECONDS', 1.5))
+    ESTIMATE_ESCALATION_RATE = float(os.environ.get('ESTIMATE_ESCALATION_RATE', 0.3))
+
+    # Local BM25 pre-ranking against criteria/query (the `prerank` option of /filter, see pre_ranker.py)
+    PRERANK_K1 = float(os.environ.get('PRERANK_K1', 1.5))
+    PRERANK_B = float(os.environ.get('PRERANK_B', 0.75))
+    PRERANK_QUERY_WEIGHT = float(os.environ.get('PRERANK_QUERY_WEIGHT', 2.0))
+
     # Filtering Criteria
     ARTICLE_FILTERING_CRITERIA = os.environ.get('ARTICLE_FILTERING_CRITERIA', 'The article has gene or variant or mutation names, Published in credible journals (avoid poor/local ones)')
@@ -2,10 +2,16 @@
 from flask_cors import CORS
 import boto3
 import os
+from app.services.Jobs.job_executor import JobExecutor
+from app.services.Jobs.progress import ProgressTracker
+from app.services.Jobs.bulk_poller import BulkPoller
 # from app.config import AWS_REGION, AWS_ACCESS_KEY, AWS_SECRET_KEY
 # from flask import current_app
 
 cors = CORS()
+job_executor = JobExecutor()
+progress_tracker = ProgressTracker()
+bulk_poller = BulkPoller()
 
 # dynamodb = boto3.resource(
 #     "dynamodb",
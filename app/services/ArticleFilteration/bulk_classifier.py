@@ -0,0 +1,144 @@
+import json
+import os
+from types import SimpleNamespace
+from pydantic import ValidationError
+from app.config import Config
+from app.services.models.report_models import ArticleVerdict
+from app.services.ArticleFilteration import filter_logic
+from app.services.ArticleFilteration.filter_logic import completion_params, uses_structured_output, verdict_response_format, parse_json_output, llm_usage
+from app.services.ArticleFilteration.llm_usage import record_metrics
+from app.services.ArticleFilteration.prompt_compiler import compile_prompt
+from app.services.ArticleFilteration.fake_batch_client import FakeBatchClient
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BulkClassifier:
+    """
+    Classifies articles through the OpenAI Batch API instead of synchronous calls.
+
+    Every article becomes one line of a JSONL file (custom_id = PubMed ID, body = the
+    same chat completion request `classify_article` would send). Files of at most
+    LLM_BULK_MAX_REQUESTS lines are uploaded and submitted as batch jobs; once a job
+    has finished (see BulkPoller), its output is validated and keyed by PubMed ID.
+    With LLM_BULK_FAKE, an in-process FakeBatchClient stands in for the API.
+    """
+
+    def __init__(self, client=None, work_dir=None, max_requests=None):
+        self._client = client
+        self.work_dir = work_dir or Config.LLM_BULK_DIR
+        self.max_requests = max_requests or Config.LLM_BULK_MAX_REQUESTS
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = FakeBatchClient(processing_seconds=Config.LLM_BULK_FAKE_SECONDS) if Config.LLM_BULK_FAKE else filter_logic.client
+        return self._client
+
+    def request_line(self, article, prompt, give_reason):
+        """One line of a batch input file: the chat completion request for `article`."""
+        response_format = verdict_response_format(give_reason) if uses_structured_output(prompt.model) else None
+        return {
+            "custom_id": str(article["pubmed_id"]),
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": completion_params(
+                prompt.model, prompt.messages(prompt.render_article(article)), Config.LLM_MAX_OUTPUT_TOKENS, response_format
+            ),
+        }
+
+    def submit(self, report_id, articles, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", on_batch=None):
+        """
+        Write, upload and submit the batch files for `articles` (any iterable; it is
+        consumed as the files are written, so it may be a generator) and return the batch
+        IDs. `on_batch(batch_id)` is called as soon as each batch exists.
+        """
+        prompt = compile_prompt(criteria, query, give_reason, extract_genes, model)
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        batch_ids = []
+        f, path, lines = None, None, 0
+        try:
+            for article in articles:
+                if f is None:
+                    path = os.path.join(self.work_dir, f"{report_id}-{len(batch_ids)}.jsonl")
+                    f, lines = open(path, "w", encoding="utf-8"), 0
+                f.write(json.dumps(self.request_line(article, prompt, give_reason)) + "\n")
+                lines += 1
+                if lines == self.max_requests:
+                    f.close()
+                    f = None
+                    batch_ids.append(self.submit_file(report_id, path, lines, on_batch))
+            if f is not None:
+                f.close()
+                f = None
+                batch_ids.append(self.submit_file(report_id, path, lines, on_batch))
+        finally:
+            if f is not None:
+                f.close()
+                os.remove(path)
+        return batch_ids
+
+    def submit_file(self, report_id, path, lines, on_batch=None):
+        """Upload one batch input file, submit it and remove the local copy; returns the batch ID."""
+        try:
+            with open(path, "rb") as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(path)
+
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h",
+            metadata={"report_id": report_id}
+        )
+        print(f"Submitted batch {batch.id} with {lines} articles for {report_id}.")
+        if on_batch is not None:
+            on_batch(batch.id)
+        return batch.id
+
+    def retrieve(self, batch_id):
+        """Current state of `batch_id` (final once its status is in FINAL_BATCH_STATUSES)."""
+        batch = self.client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        if batch.status not in FINAL_BATCH_STATUSES and counts is not None:
+            print(f"Batch {batch_id} {batch.status}: {counts.completed}/{counts.total} done.")
+        return batch
+
+    def results(self, batch, usage=None):
+        """
+        Verdicts of a finished batch as {pubmed_id: verdict dict}, with None for requests
+        that failed or whose answer does not validate. Token usage and cost (at the Batch
+        API price) are recorded like for synchronous calls; latency is not meaningful here
+        and is left at 0.
+        """
+        verdicts = {}
+        if getattr(batch, "error_file_id", None):
+            for line in self.client.files.content(batch.error_file_id).text.splitlines():
+                if line.strip():
+                    verdicts[json.loads(line)["custom_id"]] = None
+
+        if not getattr(batch, "output_file_id", None):
+            return verdicts
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                verdicts[result["custom_id"]] = None
+                continue
+
+            body = response["body"]
+            token_usage = SimpleNamespace(**body.get("usage") or {})
+            llm_usage.record(body.get("model"), token_usage, batch=True)
+            record_metrics(body.get("model"), token_usage, batch=True)
+            if usage is not None:
+                usage.record(body.get("model"), token_usage, batch=True)
+            try:
+                output = (body["choices"][0]["message"]["content"] or "").strip()
+                verdicts[result["custom_id"]] = ArticleVerdict.model_validate(parse_json_output(output)).model_dump()
+            except (KeyError, IndexError, ValueError, ValidationError) as e:
+                print(f"Invalid batch answer for {result['custom_id']}: {e}")
+                verdicts[result["custom_id"]] = None
+        return verdicts
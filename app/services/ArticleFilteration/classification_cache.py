@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from app.config import Config
+from app.services.models.prompts import PROMPT_VERSION
+
+# Only the verdict fields are cached (see ArticleVerdict, plus the cascade Tier that produced it);
+# title/abstract/journal come from the article itself
+CACHED_FIELDS = ("Relevance", "GeneVariants", "Reason", "Confidence", "Tier")
+
+
+class ClassificationCache:
+    """
+    SQLite-backed cache of LLM verdicts keyed by (prompt fingerprint, PubMed ID).
+
+    The fingerprint covers everything that changes the prompt or model, so a hit is
+    only ever returned for an identical classification request. The least recently
+    used entries are evicted once the cache grows past `max_entries`.
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or Config.CLASSIFICATION_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else Config.CLASSIFICATION_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._conn = None
+
+    @staticmethod
+    def fingerprint(criteria, query, model, give_reason, extract_genes, prompt_version=PROMPT_VERSION, cascade=None):
+        """Hash of every input that affects the verdict apart from the article itself."""
+        request = {
+            "criteria": criteria,
+            "query": query,
+            "model": model,
+            "give_reason": bool(give_reason),
+            "extract_genes": bool(extract_genes),
+            "prompt_version": prompt_version,
+        }
+        if cascade:
+            # Cascade verdicts partly come from the first-pass model (see analyze_articles_with_LLM)
+            request["cascade"] = cascade
+        payload = json.dumps(request, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def conn(self):
+        # Opened lazily so importing the service never touches the filesystem
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS classifications (
+                    fingerprint TEXT NOT NULL,
+                    pubmed_id TEXT NOT NULL,
+                    verdict TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, pubmed_id)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, pubmed_ids, fingerprint, peek=False):
+        """
+        Return cached verdicts for `pubmed_ids` as {pubmed_id: {field: value}}.
+
+        With `peek` the lookup changes nothing: the entries keep their LRU position and
+        the hit/miss counters are left alone (used by dry runs).
+        """
+        pubmed_ids = list(dict.fromkeys(pubmed_ids))
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(pubmed_ids), 500):
+                chunk = pubmed_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT pubmed_id, verdict FROM classifications WHERE fingerprint = ? AND pubmed_id IN ({placeholders})",
+                    [fingerprint, *chunk]
+                ).fetchall()
+                found.update((pubmed_id, json.loads(verdict)) for pubmed_id, verdict in rows)
+
+            if peek:
+                return found
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE classifications SET last_used = ? WHERE fingerprint = ? AND pubmed_id = ?",
+                    [(now, fingerprint, pubmed_id) for pubmed_id in found]
+                )
+                self.conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(pubmed_ids) - len(found)
+        return found
+
+    def put_many(self, rows, fingerprint):
+        """Store the verdicts of analyzed result rows, skipping rows that errored."""
+        now = time.time()
+        # Optional fields are only stored when set, so a cached row has the same keys as the original
+        entries = [
+            (fingerprint, row["PubMedID"], json.dumps({field: row[field] for field in CACHED_FIELDS if row.get(field) is not None}), now)
+            for row in rows
+            if row.get("Relevance") in ("Relevant", "Not Relevant")
+        ]
+        if not entries:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO classifications (fingerprint, pubmed_id, verdict, last_used) VALUES (?, ?, ?, ?)",
+                entries
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.max_entries <= 0:
+            return
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM classifications WHERE rowid IN "
+                "(SELECT rowid FROM classifications ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,223 @@
+import math
+import time
+from app.config import Config
+from app.services.Metrics import metrics
+from app.services.pubmed_services.pubmed_services import search_pubmed, fetch_in_parallel
+from app.services.pubmed_services.entrez_client import ncbi_rate_limiter
+from app.services.ArticleFilteration.prompt_compiler import compile_prompt
+from app.services.ArticleFilteration.llm_usage import MODEL_PRICES, estimate_cost
+from app.services.ArticleFilteration.filter_logic import cascade_settings, llm_usage
+
+# Typical completion tokens per verdict: the JSON skeleton, plus each optional field
+VERDICT_TOKENS = 15
+GENES_TOKENS = 15
+REASON_TOKENS = 60
+CONFIDENCE_TOKENS = 5
+# Hidden reasoning tokens o-series models bill as completion tokens
+REASONING_MODEL_TOKENS = 500
+# Chunks the sample is spread over, so it is not only the newest matches
+SAMPLE_CHUNKS = 4
+# Providers cache prompt prefixes from this length on
+PROMPT_CACHE_MIN_TOKENS = 1024
+# PMIDs per efetch uilist call of the pipeline's ID resolution (see fetch_pubmed_ids_from_history)
+ID_LIST_BATCH = 10000
+
+
+def completion_tokens(model, give_reason, extract_genes, confidence=False):
+    tokens = VERDICT_TOKENS + (GENES_TOKENS if extract_genes else 0) + (REASON_TOKENS if give_reason else 0)
+    tokens += CONFIDENCE_TOKENS if confidence else 0
+    return tokens + (REASONING_MODEL_TOKENS if model.startswith("o") else 0)
+
+
+class CostEstimator:
+    """
+    Dry run of a report: projects its LLM calls, tokens, cost and wall time without
+    calling the LLM.
+
+    One esearch gives the number of matches and a few efetch chunks spread over the
+    result set give a sample of articles. The sample goes through the same local stages
+    as a real run (rules, gene pre-screen, pre-ranking, classification cache), so the
+    share that would reach the LLM is measured, not assumed; they run without recording
+    metrics and only peek at the classification cache. Prompts for the sampled
+    articles are compiled and their tokens counted with one batched encode; everything
+    is then scaled to the matches the report would analyze (at most PUBMED_MAX_RESULTS).
+
+    Completion tokens, LLM latency (the average observed by this process when there is
+    one) and the share of articles a cascade escalates are estimates, and are returned
+    alongside the projection.
+    """
+
+    def __init__(self, filter_service, sample_size=None):
+        self.filter_service = filter_service
+        self.sample_size = sample_size or Config.ESTIMATE_SAMPLE_SIZE
+
+    def sample_params(self, history, count=None):
+        """efetch parameters of SAMPLE_CHUNKS evenly spaced slices of the first `count` results (default: all)."""
+        count = history["count"] if count is None else count
+        if count <= self.sample_size:
+            return [{"query_key": history["query_key"], "WebEnv": history["webenv"], "retstart": 0, "retmax": count}]
+        chunk = max(self.sample_size // SAMPLE_CHUNKS, 1)
+        chunks = min(SAMPLE_CHUNKS, count // chunk)
+        step = (count - chunk) / max(chunks - 1, 1)
+        return [
+            {"query_key": history["query_key"], "WebEnv": history["webenv"], "retstart": int(i * step), "retmax": chunk}
+            for i in range(chunks)
+        ]
+
+    def estimate(self, pubmed_request, criteria, query, give_reason=False, extract_genes=False, batch_mode=None,
+                 use_cache=True, rules=None, prerank=None, cascade=False, mode="interactive", model=None,
+                 max_concurrency=None, llm_latency=None):
+        """Projection for one /filter request. Raises RuntimeError when PubMed cannot be searched."""
+        batch_mode = Config.LLM_BATCH_MODE if batch_mode is None else batch_mode
+        max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        # Same model choice as analyze_articles_with_LLM and the bulk pipeline
+        model = model or (Config.LLM_REASONING_MODEL if give_reason else "gpt-4o-mini")
+        cascade = cascade_settings(model) if cascade and give_reason and mode != "bulk" else None
+
+        history = search_pubmed(pubmed_request.query, mindate=pubmed_request.start_date, maxdate=pubmed_request.end_date)
+        if history is None:
+            raise RuntimeError("PubMed search failed")
+        # A report only fetches the first PUBMED_MAX_RESULTS matches
+        matches = min(history["count"], Config.PUBMED_MAX_RESULTS) if Config.PUBMED_MAX_RESULTS > 0 else history["count"]
+
+        sample, sample_seconds, requested = [], 0.0, 0
+        if matches:
+            params = self.sample_params(history, matches)
+            requested = sum(chunk["retmax"] for chunk in params)
+            started_at = time.monotonic()
+            sample = fetch_in_parallel(params, pubmed_request.start_date, pubmed_request.end_date)
+            sample_seconds = time.monotonic() - started_at
+
+        # Like the pipeline, pre-rank the whole sample at once; top_k is scaled to the sample's share of the matches
+        scale = matches / requested if requested else 0.0
+        prerank_selection = None
+        # A dry run leaves no trace: no prerank/prepare spans and no classification cache hits or LRU updates
+        with metrics.paused():
+            if prerank and sample:
+                sample_prerank = dict(prerank)
+                if "top_k" in sample_prerank and scale > 1:
+                    sample_prerank["top_k"] = math.ceil(sample_prerank["top_k"] / scale)
+                prerank_selection = self.filter_service.rank_articles([sample], criteria, query, sample_prerank, rules)
+            plan = self.filter_service.prepare_classification(
+                sample, criteria, query, give_reason, extract_genes, model, use_cache, rules, prerank, cascade, prerank_selection,
+                peek_cache=True
+            )
+        pending = plan.pending
+        decided, cached = len(plan.decided), len(plan.cached)
+        prompt_extract_genes = plan.extract_genes
+
+        # Scale the sample to every match (records outside the dates are dropped by the parser too)
+        articles = round(len(sample) * scale)
+        to_llm = round(len(pending) * scale)
+
+        tiers = []
+        if cascade:
+            tiers.append(self.tier("screen", cascade["screen_model"], pending, to_llm, criteria, query, False, False,
+                                   batch_mode, confidence=True))
+            escalated = round(to_llm * Config.ESTIMATE_ESCALATION_RATE)
+            tiers.append(self.tier("escalate", model, pending, escalated, criteria, query, give_reason, prompt_extract_genes,
+                                   batch_mode))
+        else:
+            # Bulk mode sends one request per article
+            tiers.append(self.tier("bulk" if mode == "bulk" else "classify", model, pending, to_llm, criteria, query,
+                                   give_reason, prompt_extract_genes, batch_mode and mode != "bulk", batch=mode == "bulk"))
+
+        ncbi_requests = (1 + math.ceil(matches / ID_LIST_BATCH) + math.ceil(matches / Config.BATCH_SIZE)) if matches else 1
+        # NCBI's rate limit, or the sample's fetch throughput (same workers) when that is slower
+        fetch_seconds = max(ncbi_requests / ncbi_rate_limiter.rate, matches * sample_seconds / requested if requested else 0.0)
+
+        llm_seconds, slowest, bottleneck = 0.0, 0.0, None
+        if mode != "bulk":
+            for tier in tiers:
+                seconds, limit = self.llm_seconds(tier, max_concurrency, llm_latency)
+                llm_seconds += seconds
+                if limit and seconds >= slowest:
+                    slowest, bottleneck = seconds, limit
+        if fetch_seconds >= llm_seconds:
+            bottleneck = "ncbi"
+
+        totals = {
+            key: sum(tier[key] for tier in tiers)
+            for key in ("llm_calls", "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd")
+        }
+        return {
+            "matching_articles": history["count"],
+            "analyzed_articles": matches,
+            "sample": {
+                "size": len(sample), "decided_locally": decided, "cached": cached, "to_llm": len(pending),
+                "seconds": round(sample_seconds, 3),
+            },
+            "projected": {
+                "articles": articles,
+                "articles_to_llm": to_llm,
+                **totals,
+                "cost_usd": round(totals["cost_usd"], 4),
+                "ncbi_requests": ncbi_requests,
+                # Fetching and classification overlap in the pipeline; bulk jobs finish within 24h
+                "wall_seconds": None if mode == "bulk" else round(max(fetch_seconds, llm_seconds), 1),
+                "bottleneck": None if mode == "bulk" else bottleneck,
+            },
+            "tiers": tiers,
+            "assumptions": {
+                "model": model,
+                "mode": mode,
+                "batch_mode": bool(batch_mode) and mode != "bulk",
+                "max_concurrency": max_concurrency,
+                "requests_per_minute": Config.LLM_REQUESTS_PER_MINUTE,
+                "tokens_per_minute": Config.LLM_TOKENS_PER_MINUTE,
+                "escalation_rate": Config.ESTIMATE_ESCALATION_RATE if cascade else None,
+                "priced": all(any(tier["model"].startswith(prefix) for prefix in MODEL_PRICES) for tier in tiers),
+            },
+        }
+
+    def tier(self, name, model, sample_pending, articles, criteria, query, give_reason, extract_genes, batch_mode,
+             confidence=False, batch=False):
+        """Calls, tokens and cost of sending `articles` articles (like `sample_pending`) to `model`."""
+        result = {"tier": name, "model": model, "articles": articles, "llm_calls": 0, "prompt_tokens": 0,
+                  "cached_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "latency_seconds": None}
+        if not articles or not sample_pending:
+            return result
+
+        prompt = compile_prompt(criteria, query, give_reason, extract_genes, model, batch=bool(batch_mode), confidence=confidence)
+        if batch_mode:
+            groups = self.filter_service.batch_articles(
+                sample_pending, model=model, max_tokens=Config.LLM_BATCH_MAX_TOKENS, max_articles=Config.LLM_BATCH_MAX_ARTICLES
+            )
+            prompt_tokens = prompt.count_tokens_many(prompt.render_batch(group) for group in groups)
+        else:
+            groups = [[article] for article in sample_pending]
+            prompt_tokens = prompt.count_tokens_many(prompt.render_article(article) for article in sample_pending)
+
+        # Scale the sample's calls and tokens to `articles`
+        scale = articles / len(sample_pending)
+        calls = max(round(len(groups) * scale), 1)
+        prompt_total = round(sum(prompt_tokens) * scale)
+        cached_total = calls * prompt.prefix_tokens if prompt.prefix_tokens >= PROMPT_CACHE_MIN_TOKENS else 0
+        completion_total = articles * completion_tokens(model, give_reason, extract_genes, confidence)
+        result.update({
+            "llm_calls": calls,
+            "prompt_tokens": prompt_total,
+            "cached_tokens": cached_total,
+            "completion_tokens": completion_total,
+            "cost_usd": round(estimate_cost(model, prompt_total, cached_total, completion_total, batch), 4),
+        })
+        return result
+
+    def llm_seconds(self, tier, max_concurrency, latency=None):
+        """Seconds the calls of `tier` take and what limits them: concurrency, requests or tokens per minute."""
+        if not tier["llm_calls"]:
+            return 0.0, None
+        if latency is None:
+            observed = llm_usage.stats().get(tier["model"], {})
+            latency = observed.get("avg_latency_seconds") or Config.ESTIMATE_LLM_LATENCY_SECONDS
+        tier["latency_seconds"] = latency
+
+        limits = {"concurrency": tier["llm_calls"] * latency / max(max_concurrency, 1)}
+        if Config.LLM_REQUESTS_PER_MINUTE > 0:
+            limits["requests_per_minute"] = tier["llm_calls"] / Config.LLM_REQUESTS_PER_MINUTE * 60
+        if Config.LLM_TOKENS_PER_MINUTE > 0:
+            # The rate limiter reserves the prompt plus the maximum output of every call
+            reserved = tier["prompt_tokens"] + tier["articles"] * Config.LLM_MAX_OUTPUT_TOKENS
+            limits["tokens_per_minute"] = reserved / Config.LLM_TOKENS_PER_MINUTE * 60
+        limit = max(limits, key=limits.get)
+        return limits[limit], limit
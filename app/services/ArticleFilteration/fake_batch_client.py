@@ -0,0 +1,134 @@
+import json
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+def default_responder(body):
+    """
+    Verdict for one chat completion request body: Relevant when the article mentions a
+    word of the research focus, Not Relevant otherwise. Good enough to exercise bulk mode.
+    """
+    system = " ".join(message["content"] for message in body["messages"] if message["role"] == "system")
+    article = body["messages"][-1]["content"]
+    focus = re.search(r"- Research Focus: (.*)", system or article)
+    words = {word.lower() for word in re.findall(r"\w{4,}", focus.group(1))} if focus else set()
+    relevant = any(word in article.lower() for word in words)
+    return json.dumps({
+        "relevance": "Relevant" if relevant else "Not Relevant",
+        "genes_variants": [],
+        "reason": "Mentions the research focus" if relevant else "",
+        "confidence": 0.9,
+    })
+
+
+class FakeFiles:
+    def __init__(self, server):
+        self.server = server
+
+    def create(self, file, purpose):
+        content = file.read() if hasattr(file, "read") else file
+        return self.server.store(content if isinstance(content, bytes) else content.encode("utf-8"), purpose)
+
+    def content(self, file_id):
+        data = self.server.stored_files[file_id]
+        return SimpleNamespace(text=data.decode("utf-8"), content=data)
+
+    def delete(self, file_id):
+        self.server.stored_files.pop(file_id, None)
+
+
+class FakeBatches:
+    def __init__(self, server):
+        self.server = server
+
+    def create(self, input_file_id, endpoint, completion_window, metadata=None):
+        return self.server.create_batch(input_file_id, endpoint, metadata)
+
+    def retrieve(self, batch_id):
+        return self.server.retrieve_batch(batch_id)
+
+
+class FakeBatchClient:
+    """
+    In-process stand-in for the OpenAI Files and Batch APIs, used when LLM_BULK_FAKE is set
+    (local development, tests). A batch stays `in_progress` for `processing_seconds`, then
+    answers every request with `responder(body)`; requests whose PubMed ID is in `fail_ids`
+    get an error line instead. Only the calls bulk mode makes are implemented.
+    """
+
+    def __init__(self, responder=None, processing_seconds=0.0, fail_ids=()):
+        self.responder = responder or default_responder
+        self.processing_seconds = processing_seconds
+        self.fail_ids = set(fail_ids)
+        self.lock = threading.Lock()
+        self.stored_files = {}
+        self.jobs = {}
+        # Same attributes as openai.OpenAI
+        self.files = FakeFiles(self)
+        self.batches = FakeBatches(self)
+
+    def store(self, data, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.stored_files[file_id] = data
+        return SimpleNamespace(id=file_id, purpose=purpose, bytes=len(data))
+
+    def create_batch(self, input_file_id, endpoint, metadata):
+        if input_file_id not in self.stored_files:
+            raise ValueError(f"Unknown input file {input_file_id}")
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.jobs[batch_id] = {
+                "id": batch_id, "input_file_id": input_file_id, "endpoint": endpoint, "metadata": metadata or {},
+                "created_at": time.monotonic(), "status": "in_progress", "output_file_id": None, "error_file_id": None,
+                "failed": 0,
+            }
+        return self.retrieve_batch(batch_id)
+
+    def retrieve_batch(self, batch_id):
+        with self.lock:
+            batch = self.jobs[batch_id]
+            if batch["status"] == "in_progress" and time.monotonic() - batch["created_at"] >= self.processing_seconds:
+                self._complete(batch)
+            lines = self.stored_files[batch["input_file_id"]].decode("utf-8").splitlines()
+            return SimpleNamespace(
+                id=batch["id"], status=batch["status"], input_file_id=batch["input_file_id"],
+                output_file_id=batch["output_file_id"], error_file_id=batch["error_file_id"], metadata=batch["metadata"],
+                request_counts=SimpleNamespace(
+                    total=len(lines),
+                    completed=len(lines) - batch["failed"] if batch["status"] == "completed" else 0,
+                    failed=batch["failed"],
+                ),
+            )
+
+    def _complete(self, batch):
+        output, errors = [], []
+        for line in self.stored_files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            if request["custom_id"] in self.fail_ids:
+                errors.append({"id": f"req_{uuid.uuid4().hex[:8]}", "custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "Fake failure"}})
+                continue
+            output.append({
+                "id": f"req_{uuid.uuid4().hex[:8]}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "model": request["body"]["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": self.responder(request["body"])}}],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+                    },
+                },
+                "error": None,
+            })
+        for key, results in (("output_file_id", output), ("error_file_id", errors)):
+            if results:
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                self.stored_files[file_id] = "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+                batch[key] = file_id
+        batch["failed"] = len(errors)
+        batch["status"] = "completed"
@@ -1,22 +1,151 @@
-from app.services.pubmed_services.pubmed_services import fetch_pubmed_ids, fetch_pubmed_data
+from app.services.pubmed_services.pubmed_services import (
+    fetch_pubmed_ids,
+    fetch_pubmed_data,
+    search_pubmed,
+    fetch_pubmed_data_from_history,
+    fetch_pubmed_ids_from_history,
+    iter_pubmed_data,
+    iter_pubmed_data_with_ids,
+    iter_pubmed_data_from_history,
+    in_date_range
+)
+from app.services.pubmed_services.article_store import ArticleStore
 from app.services.models.data_models import PubmedRequest
+from app.services.models.report_models import ArticleVerdict
 from flask import current_app
+from pydantic import ValidationError
 import openai
 import json
+import random
 import re
-import tiktoken
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from app.config import Config
+from app.services.RateLimiting.rate_limiter import RateLimiter
+from app.services.ArticleFilteration.classification_cache import ClassificationCache
+from app.services.ArticleFilteration.prompt_compiler import compile_prompt, get_encoding
+from app.services.ArticleFilteration.llm_usage import UsageRecorder, record_metrics
+from app.services.Metrics import metrics
+from app.services.ArticleFilteration.rule_engine import compile_rules
+from app.services.ArticleFilteration.pre_ranker import PreRanker
+from app.services.GeneExtraction.extract_logic import gene_extractor
+
+client = openai.OpenAI(max_retries=0)  # Initialize the OpenAI client; retries are done in create_completion
+
+# Transient API failures worth retrying (429, 5xx, network)
+RETRYABLE_LLM_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+# Shared by every job so concurrent reports stay inside the account limits together
+llm_rate_limiter = RateLimiter(Config.LLM_REQUESTS_PER_MINUTE, Config.LLM_TOKENS_PER_MINUTE)
+classification_cache = ClassificationCache()
+article_store = ArticleStore()
+# Prompt/completion/cached token totals reported by the API
+llm_usage = UsageRecorder()
+pre_ranker = PreRanker()
+
+def cascade_settings(model):
+    """The cascade in front of `model`, or None when the screening model is that model already."""
+    if Config.LLM_SCREEN_MODEL == model:
+        return None
+    return {"screen_model": Config.LLM_SCREEN_MODEL, "min_confidence": Config.LLM_CASCADE_MIN_CONFIDENCE}
+
+
+def needs_escalation(row, min_confidence):
+    """Whether a first-pass verdict has to be confirmed by the reasoning model."""
+    if row.get("Relevance") != "Not Relevant":
+        return True  # Relevant (needs its reason and genes) or failed
+    return row.get("Confidence") is None or row["Confidence"] < min_confidence
+
+
+# What `prepare_classification` settled before the LLM: rows decided locally, cached verdicts,
+# the articles still pending, and what `finish_classification` needs to complete the rows
+ClassificationPlan = namedtuple("ClassificationPlan", [
+    "decided", "cached", "pending", "fingerprint", "extract_genes", "local_genes", "mentions", "prerank_scores",
+])
+
+
+class LLMUnavailable(Exception):
+    """Raised when a completion still fails after every retry."""
+
+
+def completion_params(model, messages, max_tokens, response_format=None):
+    """Request body of a chat completion (also used for the lines of bulk batch files)."""
+    params = {"model": model, "messages": messages, "temperature": 0.2, "max_tokens": max_tokens}
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+
+def create_completion(model, messages, max_tokens, reserve_tokens, response_format=None, usage=None):
+    """
+    Call the chat completions API, retrying rate-limit and server errors with jittered
+    exponential backoff (honouring Retry-After). Each attempt is admitted by the shared
+    rate limiter; the token usage and latency of every answered call are recorded in
+    `llm_usage`, the report's metrics and, if given, the job's `usage` recorder.
+    """
+    params = completion_params(model, messages, max_tokens, response_format)
+
+    for attempt in range(Config.LLM_MAX_RETRIES + 1):
+        llm_rate_limiter.acquire(reserve_tokens)
+        try:
+            started_at = time.monotonic()
+            try:
+                response = client.chat.completions.create(**params)
+            finally:
+                seconds = time.monotonic() - started_at
+                metrics.observe("llm_request", seconds)
+            llm_usage.record(model, getattr(response, "usage", None), seconds)
+            record_metrics(model, getattr(response, "usage", None))
+            if usage is not None:
+                usage.record(model, getattr(response, "usage", None), seconds)
+            return response
+        except RETRYABLE_LLM_ERRORS as e:
+            error = e
+
+        if attempt == Config.LLM_MAX_RETRIES:
+            raise LLMUnavailable(f"{model} failed after {attempt + 1} attempts: {error}") from error
+        metrics.count("llm_retries", model)
+        delay = min(Config.LLM_BACKOFF_BASE * (2 ** attempt), Config.LLM_BACKOFF_MAX) * random.uniform(0.5, 1.5)
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        print(f"{model} request failed ({type(error).__name__}), retrying in {delay:.1f}s...")
+        time.sleep(delay)
+
+
+def uses_structured_output(model):
+    # o1 models do not accept response_format
+    return Config.LLM_STRUCTURED_OUTPUT and not model.startswith("o1")
+
+
+def verdict_response_format(give_reason=False, pubmed_ids=None, confidence=False):
+    """json_schema response_format for one verdict, or for an object of verdicts keyed by `pubmed_ids`."""
+    schema = ArticleVerdict.json_schema(give_reason, confidence)
+    if pubmed_ids is not None:
+        schema = {
+            "type": "object",
+            "properties": {str(pubmed_id): schema for pubmed_id in pubmed_ids},
+            "required": [str(pubmed_id) for pubmed_id in pubmed_ids],
+            "additionalProperties": False,
+        }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "article_verdicts" if pubmed_ids is not None else "article_verdict", "strict": True, "schema": schema},
+    }
+
+
+def parse_json_output(output):
+    """Structured outputs are plain JSON; free-text answers are scanned for the outermost object."""
+    try:
+        return json.loads(output)
+    except ValueError:
+        json_match = re.search(r"\{.*\}", output, re.DOTALL)
+        if not json_match:
+            raise ValueError("No valid JSON found in GPT response.")
+        return json.loads(json_match.group(0))
 
-from app.services.models.prompts import (
-    SYSTEM_PROMPT,
-    BASE_PROMPT,
-    REASON_SECTION,
-    GENE_EXTRACTION_SECTION,
-    REASON_AND_GENE_SECTION,
-    RESPONSE_FORMAT
-)
-
-client = openai.OpenAI()  # Initialize the OpenAI client
 
 class ArticleFilter:
 
@@ -26,29 +155,149 @@ class ArticleFilter:
         print(f"Query: {request_data.query}")
         print(f"Getting results from {request_data.start_date} to {request_data.end_date}...\n")
 
+        history = None
+        if Config.PUBMED_USE_HISTORY:
+            print("\n--- Searching PubMed (history server) ---")
+            history = search_pubmed(request_data.query, mindate=request_data.start_date, maxdate=request_data.end_date)
+            if history is not None:
+                print(f"Found {history['count']} matching articles.")
+
+        if Config.ARTICLE_STORE_ENABLED:
+            pubmed_ids = sself.get_pubmed_ids(request_data, history)
+            return sself.get_articles_by_ids(pubmed_ids, request_data.start_date, request_data.end_date)
+
+        print("\n--- Fetching PubMed Data ---")
+        if history is not None:
+            articles = fetch_pubmed_data_from_history(
+                history, request_data.start_date, request_data.end_date, max_results=Config.PUBMED_MAX_RESULTS
+            )
+        else:
+            pubmed_ids = sself.get_pubmed_ids(request_data)
+            articles = fetch_pubmed_data(pubmed_ids, request_data.start_date, request_data.end_date)
+        print(f"Fetched {len(articles)} articles.")
+
+        return articles
+
+    def get_pubmed_ids(sself, request_data: PubmedRequest, history=None):
+        """Resolve the PMIDs matching the request, from the history server when a search handle is given."""
         print("\n--- Fetching PubMed IDs ---")
-        pubmed_ids = fetch_pubmed_ids(request_data.query, total_results = Config.TOTAL_PUBMED_RESULTS, batch_size = Config.BATCH_SIZE, mindate=request_data.start_date, maxdate=request_data.end_date)
+        if history is not None:
+            pubmed_ids = fetch_pubmed_ids_from_history(history, max_results=Config.PUBMED_MAX_RESULTS)
+        else:
+            pubmed_ids = fetch_pubmed_ids(request_data.query, total_results = Config.TOTAL_PUBMED_RESULTS, batch_size = Config.BATCH_SIZE, mindate=request_data.start_date, maxdate=request_data.end_date)
         print(f"Fetched {len(pubmed_ids)} article IDs.")
+        return pubmed_ids
 
+    def get_articles_by_ids(sself, pubmed_ids, mindate=None, maxdate=None):
+        """
+        Read articles through the local article store: only PMIDs that are missing or
+        stale are efetched (and stored), then the date filter is applied to all of them.
+        """
         print("\n--- Fetching PubMed Data ---")
-        articles = fetch_pubmed_data(pubmed_ids, request_data.start_date, request_data.end_date)
-        print(f"Fetched {len(articles)} articles.")
+        stored = article_store.get_many(pubmed_ids)
+        missing_ids = [pubmed_id for pubmed_id in pubmed_ids if pubmed_id not in stored]
+        print(f"Article store: {len(stored)}/{len(pubmed_ids)} hits, fetching {len(missing_ids)} from PubMed.")
 
+        for fetched in sself.fetch_into_store(missing_ids):
+            stored.update((article["pubmed_id"], article) for article in fetched)
+
+        articles = [
+            stored[pubmed_id] for pubmed_id in dict.fromkeys(pubmed_ids)
+            if stored.get(pubmed_id) is not None and in_date_range(stored[pubmed_id], mindate, maxdate)
+        ]
+        print(f"Fetched {len(articles)} articles.")
         return articles
 
-    def batch_articles(sself, articles, model="gpt-4o-mini", max_tokens=3800):
-    
-        encoding = tiktoken.encoding_for_model(model)
+    def resolve_pubmed_ids(sself, request_data: PubmedRequest):
+        """Search PubMed (through the history server when enabled) and return the matching PMIDs."""
+        history = None
+        if Config.PUBMED_USE_HISTORY:
+            history = search_pubmed(request_data.query, mindate=request_data.start_date, maxdate=request_data.end_date)
+            if history is not None:
+                print(f"Found {history['count']} matching articles.")
+        return sself.get_pubmed_ids(request_data, history)
+
+    def iter_pubmed_article_batches(sself, request_data: PubmedRequest, pubmed_ids=None):
+        """
+        Streaming counterpart of `get_pubmed_articles`: yields lists of articles as
+        each efetch batch (or chunk of stored articles) becomes available.
+
+        When `pubmed_ids` is given (e.g. the unfinished part of a resumed job) no
+        search is run and only those articles are fetched.
+        """
+        if pubmed_ids is not None:
+            if Config.ARTICLE_STORE_ENABLED:
+                yield from sself.iter_articles_by_ids(pubmed_ids, request_data.start_date, request_data.end_date)
+            else:
+                yield from iter_pubmed_data(pubmed_ids, request_data.start_date, request_data.end_date)
+            return
+
+        print(f"Query: {request_data.query}")
+        print(f"Getting results from {request_data.start_date} to {request_data.end_date}...\n")
+
+        history = None
+        if Config.PUBMED_USE_HISTORY:
+            history = search_pubmed(request_data.query, mindate=request_data.start_date, maxdate=request_data.end_date)
+            if history is not None:
+                print(f"Found {history['count']} matching articles.")
+
+        if Config.ARTICLE_STORE_ENABLED:
+            pubmed_ids = sself.get_pubmed_ids(request_data, history)
+            yield from sself.iter_articles_by_ids(pubmed_ids, request_data.start_date, request_data.end_date)
+        elif history is not None:
+            yield from iter_pubmed_data_from_history(
+                history, request_data.start_date, request_data.end_date, max_results=Config.PUBMED_MAX_RESULTS
+            )
+        else:
+            pubmed_ids = sself.get_pubmed_ids(request_data)
+            yield from iter_pubmed_data(pubmed_ids, request_data.start_date, request_data.end_date)
+
+    def iter_articles_by_ids(sself, pubmed_ids, mindate=None, maxdate=None):
+        """
+        Streaming counterpart of `get_articles_by_ids`. Articles already in the store
+        are yielded first, then each efetch batch of the missing ones as it arrives.
+        """
+        stored = article_store.get_many(pubmed_ids)
+        missing_ids = [pubmed_id for pubmed_id in dict.fromkeys(pubmed_ids) if pubmed_id not in stored]
+        print(f"Article store: {len(stored)}/{len(pubmed_ids)} hits, fetching {len(missing_ids)} from PubMed.")
+
+        stored_articles = [
+            stored[pubmed_id] for pubmed_id in dict.fromkeys(pubmed_ids)
+            if stored.get(pubmed_id) is not None and in_date_range(stored[pubmed_id], mindate, maxdate)
+        ]
+        for i in range(0, len(stored_articles), Config.BATCH_SIZE):
+            yield stored_articles[i:i + Config.BATCH_SIZE]
+
+        for fetched in sself.fetch_into_store(missing_ids):
+            yield [article for article in fetched if in_date_range(article, mindate, maxdate)]
+
+    def fetch_into_store(sself, pubmed_ids):
+        """
+        efetch `pubmed_ids` (without a date filter, so every parsed record can be stored)
+        and store each batch's articles, plus tombstones for the PMIDs it did not return;
+        yields the articles of each batch. A failed efetch stores nothing for its PMIDs.
+        """
+        for requested_ids, fetched in iter_pubmed_data_with_ids(pubmed_ids):
+            if fetched is None:
+                continue
+            returned = {article["pubmed_id"] for article in fetched}
+            article_store.put_many(fetched, [pubmed_id for pubmed_id in requested_ids if pubmed_id not in returned])
+            yield fetched
+
+    def batch_articles(sself, articles, model="gpt-4o-mini", max_tokens=3800, max_articles=None):
+        """Pack articles into batches of at most `max_tokens` article tokens (and `max_articles` articles)."""
+        # One encode_batch call for all articles instead of one encode per article
+        token_counts = [len(tokens) for tokens in get_encoding(model).encode_batch([
+            f"Article Id: {article['pubmed_id']}\nTitle: {article['title']}\nAbstract: {article['abstract']}\n"
+            for article in articles
+        ])]
         batches = []
         current_batch = []
         current_prompt_tokens = 0
 
-        for article in articles:
-            article_text = f"Article Id: {article['pubmed_id']}\nTitle: {article['title']}\nAbstract: {article['abstract']}\n"
-            # Estimate tokens if we add this article
-            tokens_needed = len(encoding.encode(article_text))
-
-            if current_prompt_tokens + tokens_needed > max_tokens:
+        for article, tokens_needed in zip(articles, token_counts):
+            batch_full = max_articles is not None and len(current_batch) >= max_articles
+            if current_batch and (current_prompt_tokens + tokens_needed > max_tokens or batch_full):
                 # Start a new batch
                 batches.append(current_batch)
                 current_batch = [article]
@@ -64,161 +313,433 @@ class ArticleFilter:
 
         return batches
     
-    def build_prompt(sself, article, criteria, query, give_reason=False, extract_genes=False):
-        # Start with the base prompt
-        prompt = BASE_PROMPT.format(criteria=criteria, query=query)
-
-        # Conditionally add reason &/or gene extraction tasks
-        if give_reason and extract_genes:
-            prompt += REASON_AND_GENE_SECTION
-        elif give_reason:
-            prompt += REASON_SECTION
-        elif extract_genes:
-            prompt += GENE_EXTRACTION_SECTION
-        else:
-            # No additional tasks
-            # pass
-            prompt += REASON_SECTION
-
-        # Finally, add the standard response format (including placeholders for article info)
-        prompt += RESPONSE_FORMAT.format(
-            article_title=article["title"],
-            article_journal=article["journal"],
-            article_abstract=article["abstract"]
-        )
-        # for batches
-        # prompt += "\n\nHere are the articles:\n\n"
-        # for article in bartch_article:
-        #     prompt += f"""
-        #                     PubMed ID: {article["pubmedId"]}
-        #                     Title: {article["title"]}
-        #                     Journal: {article["journal"]}
-        #                     Abstract: {article["abstract"]}
+    def count_tokens(sself, text, model="gpt-4o-mini"):
+        """Count the tokens `text` takes for `model`."""
+        return len(get_encoding(model).encode(text))
+
+    def classify_article(sself, article, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini",
+                         confidence=False, usage=None):
+        """
+        Classify a single article with the LLM.
+
+        The answer is validated against ArticleVerdict. Any failure (after the API
+        retries in `create_completion`) is caught and turned into an "Error" row so one
+        bad article never affects the rest of the job; the pipeline re-queues those.
+        """
+        try:
+            # The static instructions are compiled once per job; only the article is rendered here
+            prompt = compile_prompt(criteria, query, give_reason, extract_genes, model, confidence=confidence)
+            user_prompt = prompt.render_article(article)
+            messages = prompt.messages(user_prompt)
+
+            # Reserve the prompt plus the worst-case completion against the tokens-per-minute budget
+            response = create_completion(
+                model, messages, Config.LLM_MAX_OUTPUT_TOKENS,
+                reserve_tokens=prompt.count_tokens(user_prompt) + Config.LLM_MAX_OUTPUT_TOKENS,
+                response_format=verdict_response_format(give_reason, confidence=confidence) if uses_structured_output(model) else None,
+                usage=usage
+            )
+
+            # Extract response content
+            output = (response.choices[0].message.content or "").strip()
+
+            print(f"{model} Response for {article['pubmed_id']}:\n{output}")
+
+            verdict = ArticleVerdict.model_validate(parse_json_output(output))
+            return sself.result_row(article, verdict.model_dump())
+
+        except LLMUnavailable as e:
+            print(f"Error processing article {article['pubmed_id']}: {e}")
+            return sself.error_row(article, "LLM unavailable")
+        except Exception as e:
+            print(f"Error processing article {article['pubmed_id']}: {e}")
+            return sself.error_row(article)
+
+    def classify_batch(sself, batch, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini",
+                       confidence=False, usage=None):
+        """
+        Classify several articles with a single chat completion.
 
-        #                     ---
-        #                     """
-        return prompt
+        The model must answer with a JSON object keyed by PubMed ID. Articles that are
+        missing or malformed in the answer (or the whole batch, if the call fails) are
+        split in half and retried; a batch of one falls back to `classify_article`.
 
-    def analyze_articles_with_LLM(sself, articles, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini"):
+        Returns:
+            dict: Result rows keyed by PubMed ID, one for every article in `batch`.
+        """
+        if len(batch) == 1:
+            return {batch[0]["pubmed_id"]: sself.classify_article(batch[0], criteria, query, give_reason, extract_genes, model, confidence, usage)}
+
+        results = {}
+        try:
+            prompt = compile_prompt(criteria, query, give_reason, extract_genes, model, batch=True, confidence=confidence)
+            user_prompt = prompt.render_batch(batch)
+            messages = prompt.messages(user_prompt)
+            max_tokens = Config.LLM_MAX_OUTPUT_TOKENS * len(batch)
+
+            response = create_completion(
+                model, messages, max_tokens,
+                reserve_tokens=prompt.count_tokens(user_prompt) + max_tokens,
+                response_format=(
+                    verdict_response_format(give_reason, [article["pubmed_id"] for article in batch], confidence)
+                    if uses_structured_output(model) else None
+                ),
+                usage=usage
+            )
+            output = (response.choices[0].message.content or "").strip()
+
+            batch_result = parse_json_output(output)
+            if not isinstance(batch_result, dict):
+                raise ValueError("Batch response is not a JSON object.")
+
+            for article in batch:
+                try:
+                    verdict = ArticleVerdict.model_validate(batch_result.get(str(article["pubmed_id"])))
+                except ValidationError:
+                    continue
+                results[article["pubmed_id"]] = sself.result_row(article, verdict.model_dump())
+
+        except LLMUnavailable as e:
+            # Splitting will not help while the API is failing; let the job re-queue them
+            print(f"Error processing batch of {len(batch)} articles: {e}")
+            return {article["pubmed_id"]: sself.error_row(article, "LLM unavailable") for article in batch}
+        except Exception as e:
+            print(f"Error processing batch of {len(batch)} articles: {e}")
+
+        unanswered = [article for article in batch if article["pubmed_id"] not in results]
+        if unanswered:
+            print(f"{len(unanswered)}/{len(batch)} articles missing from batch response, splitting and retrying.")
+            middle = (len(unanswered) + 1) // 2
+            for half in (unanswered[:middle], unanswered[middle:]):
+                if half:
+                    results.update(sself.classify_batch(half, criteria, query, give_reason, extract_genes, model, confidence, usage))
+
+        return results
+
+    def result_row(sself, article, result_data):
+        """Turn the parsed LLM verdict for `article` into a report row."""
+        # Ensure empty reason for "Not Relevant" articles
+        reason = (result_data.get("reason") or "").strip()
+        if result_data.get("relevance") == "Not Relevant":
+            reason = ""
+
+        row = {
+            "PubMedID": article['pubmed_id'],
+            "Title": article['title'],
+            "Abstract": article['abstract'],
+            "Journal": article['journal'],
+            "Date": article.get('date'),  # Lets later reports reuse the verdict by date range
+            "Relevance": result_data.get("relevance", "Error"),
+            "GeneVariants": ", ".join(result_data.get("genes_variants") or []) or "None",
+            "Reason": reason,  # Will be empty for Not Relevant articles
+        }
+        if result_data.get("confidence") is not None:
+            row["Confidence"] = result_data["confidence"]
+        return row
+
+    def cached_row(sself, article, verdict):
+        """Rebuild a report row from the verdict fields stored in the classification cache."""
+        return {
+            "PubMedID": article['pubmed_id'],
+            "Title": article['title'],
+            "Abstract": article['abstract'],
+            "Journal": article['journal'],
+            "Date": article.get('date'),
+            **verdict,
+        }
+
+    def rule_row(sself, article, rule_name, action):
+        """Report row for an article decided by a metadata rule instead of the LLM."""
+        accepted = action == "accept"
+        return {
+            "PubMedID": article['pubmed_id'],
+            "Title": article['title'],
+            "Abstract": article['abstract'],
+            "Journal": article['journal'],
+            "Date": article.get('date'),
+            "Relevance": "Relevant" if accepted else "Not Relevant",
+            "GeneVariants": "None",
+            "Reason": f"Accepted by rule {rule_name}" if accepted else "",
+            "Rule": rule_name,
+        }
+
+    def error_row(sself, article, reason="Parsing error"):
+        return {
+            "PubMedID": article['pubmed_id'],
+            "Title": article['title'],
+            "Abstract": article['abstract'],
+            "Journal": article['journal'],
+            "Date": article.get('date'),
+            "Relevance": "Error",
+            "GeneVariants": "Error",
+            "Reason": reason
+        }
+
+    def pending_row(sself, article, gene_variants=None):
+        """Placeholder row of an article waiting for its Batch API verdict (see BulkPipeline)."""
+        return {
+            "PubMedID": article['pubmed_id'],
+            "Title": article['title'],
+            "Abstract": article['abstract'],
+            "Journal": article['journal'],
+            "Date": article.get('date'),
+            "Relevance": "Pending",
+            "GeneVariants": ", ".join(gene_variants or []) or "None",
+            "Reason": ""
+        }
+
+    def analyze_articles_with_LLM(sself, articles, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", max_concurrency=None, batch_mode=None, use_cache=None, rules=None, prerank=None, cascade=None, tier_usage=None,
+                                  prerank_selection=None):
         """
         Analyze a list of articles using GPT-4o to determine relevance, extract gene/variant names, 
         and provide reasoning only if the article is classified as Relevant.
 
+        Up to `max_concurrency` requests are kept in flight at once, all sharing the
+        process-wide requests/tokens-per-minute limiter. In batch mode several articles
+        are sent per request (see `classify_batch`). Verdicts already in the persistent
+        classification cache for an identical prompt are reused instead of re-classified.
+        Articles a metadata rule decides (see rule_engine.py) never reach the cache or the LLM.
+        With GENE_PRESCREEN, articles in which the local gene extractor finds no gene or
+        variant are rejected the same way; with LOCAL_GENE_EXTRACTION and `extract_genes`,
+        GeneVariants comes from the extractor and the LLM is not asked for it.
+        With `prerank`, the remaining articles are scored locally against the criteria and
+        query (see pre_ranker.py) and only the best ones go on; the rest are recorded as
+        Not Relevant with rule "prerank". Scored rows carry their PrerankScore.
+
+        In cascade mode (only meaningful with `give_reason`, which needs the reasoning
+        model), the cheap LLM_SCREEN_MODEL first classifies every article and rates its
+        confidence; only articles it finds Relevant, or is less than
+        LLM_CASCADE_MIN_CONFIDENCE sure about, go to the reasoning model for the reason
+        and genes. Rows record the Tier that decided them.
+
         Args:
             articles (list): List of article dictionaries containing 'title', 'abstract', 'journal', and 'pubmed_id'.
             criteria (str): Filtering criteria to determine relevance.
             query (str): Specific research question to guide relevance classification.
             model (str): OpenAI model to use (default: "gpt-4o-mini").
+            max_concurrency (int): Maximum in-flight LLM requests (default: Config.LLM_MAX_CONCURRENCY).
+            batch_mode (bool): Classify several articles per request (default: Config.LLM_BATCH_MODE).
+            use_cache (bool): Read verdicts from the classification cache (default: Config.CLASSIFICATION_CACHE_ENABLED).
+                Fresh verdicts are always written back.
+            rules (str | list): Rule set name or list of metadata rules applied before the LLM (default: none).
+            prerank (dict): top_k, top_fraction and/or threshold of the local pre-ranking (default: none).
+                Limits apply to the articles of this call unless `prerank_selection` is given.
+            cascade (bool): Screen with the cheap model before the reasoning model (default: Config.LLM_CASCADE).
+            tier_usage (TierUsage): Records the articles, calls, tokens and latency of each tier.
+            prerank_selection (PrerankSelection): Pre-ranking cut-off made over a whole report (see `rank_articles`),
+                used instead of ranking `articles` among themselves.
 
         Returns:
-            list: List of dictionaries containing PubMed ID, Title, Relevance, Extracted Genes/Variants, and Reason (only for Relevant articles).
+            list: List of dictionaries containing PubMed ID, Title, Relevance, Extracted Genes/Variants, and Reason (only for Relevant articles),
+                in the same order as `articles`.
         """
-        results = []
         if give_reason:
-            model = "o1-mini"
+            model = Config.LLM_REASONING_MODEL
+        if max_concurrency is None:
+            max_concurrency = Config.LLM_MAX_CONCURRENCY
+        if batch_mode is None:
+            batch_mode = Config.LLM_BATCH_MODE
+        if use_cache is None:
+            use_cache = Config.CLASSIFICATION_CACHE_ENABLED
+        if cascade is None:
+            cascade = Config.LLM_CASCADE
+        cascade = cascade_settings(model) if cascade and give_reason else None
+
+        plan = sself.prepare_classification(
+            articles, criteria, query, give_reason, extract_genes, model, use_cache, rules, prerank, cascade, prerank_selection
+        )
+        pending, extract_genes = plan.pending, plan.extract_genes
+
+        classify_options = {"max_concurrency": max_concurrency, "batch_mode": batch_mode}
+        if cascade and pending:
+            screened = sself.classify_pending(
+                pending, criteria, query, False, False, cascade["screen_model"], confidence=True,
+                usage=tier_usage.recorder("screen", len(pending)) if tier_usage else None, **classify_options
+            )
+            escalate = [article for article, row in zip(pending, screened) if needs_escalation(row, cascade["min_confidence"])]
+            print(f"Cascade: escalating {len(escalate)}/{len(pending)} articles to {model}.")
+            escalated = sself.classify_pending(
+                escalate, criteria, query, give_reason, extract_genes, model,
+                usage=tier_usage.recorder("escalate", len(escalate)) if tier_usage else None, **classify_options
+            )
+            escalated = {row["PubMedID"]: {**row, "Tier": "escalate"} for row in escalated}
+            new_results = [escalated.get(row["PubMedID"]) or {**row, "Tier": "screen"} for row in screened]
+        else:
+            new_results = sself.classify_pending(
+                pending, criteria, query, give_reason, extract_genes, model,
+                usage=tier_usage.recorder("classify", len(pending)) if tier_usage and pending else None, **classify_options
+            )
 
-        # print(f"Additional Filtering Criteria: {criteria}")
-        for i, article in enumerate(articles):
-            print(f"Processing article {i+1}/{len(articles)}...")
+        return sself.finish_classification(articles, plan, new_results)
 
-            try:
-                # Construct the unified prompt
-                user_prompt = sself.build_prompt(article, criteria, query, give_reason, extract_genes)
-                # print(f"User prompt: {user_prompt}")
-                messages = [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_prompt}
-                    ]
-                # Call GPT-4o API
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.2,  # Low randomness for consistency
-                    max_tokens=400,  # Sufficient for structured response
-                )
-
-                # Extract response content
-                output = response.choices[0].message.content.strip()
-
-                print(f"{model} Response for {article['pubmed_id']}:\n{output}")
-
-                # Extract JSON safely using regex
-                json_match = re.search(r"\{.*\}", output, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(0)
-                    result_data = json.loads(json_text)
-                else:
-                    raise ValueError("No valid JSON found in GPT response.")
-
-                # Ensure empty reason for "Not Relevant" articles
-                reason = result_data.get("reason", "").strip()
-                if result_data.get("relevance") == "Not Relevant":
-                    reason = ""
-
-                # Append the results
-                results.append({
-                    "PubMedID": article['pubmed_id'],
-                    "Title": article['title'],
-                    "Abstract": article['abstract'],
-                    "Journal": article['journal'],
-                    "Relevance": result_data.get("relevance", "Error"),
-                    "GeneVariants": ", ".join(result_data.get("genes_variants", [])) or "None",
-                    "Reason": reason,  # Will be empty for Not Relevant articles
-                })
-
-            except Exception as e:
-                print(f"Error processing article {i+1}: {e}")
-                results.append({
-                    "PubMedID": article['pubmed_id'],
-                    "Title": article['title'],
-                    "Abstract": article['abstract'],
-                    "Journal": article['journal'],
-                    "Relevance": "Error",
-                    "GeneVariants": "Error",
-                    "Reason": "Parsing error"
-                })
+    @metrics.timed("prepare")
+    def prepare_classification(sself, articles, criteria, query, give_reason, extract_genes, model, use_cache, rules=None, prerank=None, cascade=None,
+                               prerank_selection=None, peek_cache=False):
+        """
+        Everything `analyze_articles_with_LLM` does before the LLM: metadata rules, the gene
+        pre-screen, pre-ranking and the classification cache. Returns a ClassificationPlan
+        whose `pending` articles still need an LLM verdict.
 
-        return results
+        `prerank_selection` (see `rank_articles`) replaces ranking `articles` among
+        themselves with the cut-off made over the whole report. With `peek_cache` the
+        classification cache is read without touching its LRU order or counters.
+        """
+        decided, mentions, local_genes = sself.screen_articles(articles, rules, extract_genes)
+        if local_genes:
+            extract_genes = False
+        undecided = [article for article in articles if article["pubmed_id"] not in decided]
+
+        prerank_scores = {}
+        dropped = []
+        if prerank_selection is not None:
+            # Articles the ranking pass did not see are kept
+            prerank_scores = {
+                article["pubmed_id"]: prerank_selection.scores[article["pubmed_id"]]
+                for article in undecided if article["pubmed_id"] in prerank_selection.scores
+            }
+            dropped = [
+                article for article in undecided
+                if article["pubmed_id"] in prerank_scores and article["pubmed_id"] not in prerank_selection.kept
+            ]
+            undecided = [
+                article for article in undecided
+                if article["pubmed_id"] not in prerank_scores or article["pubmed_id"] in prerank_selection.kept
+            ]
+        elif prerank and undecided:
+            undecided, dropped, prerank_scores = pre_ranker.select(undecided, criteria, query, **prerank)
+        for article in dropped:
+            decided[article["pubmed_id"]] = sself.rule_row(article, "prerank", "reject")
+        if prerank_scores:
+            print(f"Pre-ranking kept {len(undecided)}/{len(undecided) + len(dropped)} articles for the LLM.")
+
+        fingerprint = ClassificationCache.fingerprint(criteria, query, model, give_reason, extract_genes, cascade=cascade)
+        cached = {}
+        if use_cache and undecided:
+            cached = classification_cache.get_many([article["pubmed_id"] for article in undecided], fingerprint, peek=peek_cache)
+            print(f"Classification cache: {len(cached)}/{len(undecided)} hits.")
+        pending = [article for article in undecided if article["pubmed_id"] not in cached]
+
+        return ClassificationPlan(decided, cached, pending, fingerprint, extract_genes, local_genes, mentions, prerank_scores)
+
+    def screen_articles(sself, articles, rules, extract_genes):
+        """
+        The metadata rules and the gene pre-screen. Returns the rows they decided (keyed by
+        PubMed ID), the genes/variants found locally and whether those fill GeneVariants.
+        """
+        decided = {}
+        rule_set = compile_rules(rules)
+        if rule_set:
+            for article in articles:
+                match = rule_set.evaluate(article)
+                if match:
+                    decided[article["pubmed_id"]] = sself.rule_row(article, *match)
+            print(f"Metadata rules decided {len(decided)}/{len(articles)} articles.")
+
+        # Genes/variants found locally fill GeneVariants, so the LLM only has to judge relevance
+        local_genes = extract_genes and Config.LOCAL_GENE_EXTRACTION
+        # Without gene symbols only variants would count as mentions and nearly everything would be rejected
+        prescreen = Config.GENE_PRESCREEN and bool(gene_extractor.symbols)
+        if Config.GENE_PRESCREEN and not prescreen:
+            print("Gene pre-screen skipped: no HGNC gene symbols are loaded.")
+        mentions = {}
+        if local_genes or prescreen:
+            extractions = gene_extractor.extract_many(f"{article['title']}\n{article['abstract']}" for article in articles)
+            mentions = {
+                article["pubmed_id"]: extraction["genes"] + extraction["variants"]
+                for article, extraction in zip(articles, extractions)
+            }
+        if prescreen:
+            screened = 0
+            for article in articles:
+                if article["pubmed_id"] not in decided and not mentions[article["pubmed_id"]]:
+                    decided[article["pubmed_id"]] = sself.rule_row(article, "no-gene-mention", "reject")
+                    screened += 1
+            print(f"Gene pre-screen rejected {screened}/{len(articles)} articles.")
+        return decided, mentions, local_genes
+
+    @metrics.timed("prerank")
+    def rank_articles(sself, article_batches, criteria, query, prerank, rules=None):
+        """
+        Pre-rank a whole report in one pass over `article_batches`: articles the rules or
+        the gene pre-screen decide are left out, every other one is scored and the
+        `prerank` limits are applied to all of them together. Returns the
+        PrerankSelection to pass to `prepare_classification` for each chunk.
+        """
+        def undecided_batches():
+            for articles in article_batches:
+                decided, _, _ = sself.screen_articles(articles, rules, False)
+                yield [article for article in articles if article["pubmed_id"] not in decided]
+
+        selection = pre_ranker.rank(undecided_batches(), criteria, query, **prerank)
+        print(f"Pre-ranking kept {len(selection.kept)}/{len(selection.scores)} articles of the report for the LLM.")
+        return selection
 
+    def finish_classification(sself, articles, plan, new_results):
+        """
+        Cache the LLM verdicts `new_results` and return the rows of `articles` (in order),
+        taking each from `plan` or `new_results`.
+        """
+        if Config.CLASSIFICATION_CACHE_ENABLED:
+            classification_cache.put_many(new_results, plan.fingerprint)
+
+        results_by_id = {**plan.decided, **{row["PubMedID"]: row for row in new_results}}
+        rows = [
+            results_by_id[article["pubmed_id"]] if article["pubmed_id"] in results_by_id
+            else sself.cached_row(article, plan.cached[article["pubmed_id"]])
+            for article in articles
+        ]
+        if plan.local_genes:
+            for row in rows:
+                if row["Relevance"] != "Error":
+                    row["GeneVariants"] = ", ".join(plan.mentions[row["PubMedID"]]) or "None"
+        for row in rows:
+            if row["PubMedID"] in plan.prerank_scores:
+                row["PrerankScore"] = plan.prerank_scores[row["PubMedID"]]
+        return rows
+
+    @metrics.timed("classify")
+    def classify_pending(sself, articles, criteria, query, give_reason, extract_genes, model, max_concurrency, batch_mode,
+                         confidence=False, usage=None):
+        """Classify `articles` with the LLM, one or several per request; returns rows in input order."""
+        if batch_mode:
+            return sself.analyze_articles_in_batches(articles, criteria, query, give_reason, extract_genes, model, max_concurrency, confidence, usage)
+        return sself.analyze_articles_concurrently(articles, criteria, query, give_reason, extract_genes, model, max_concurrency, confidence, usage)
+
+    def analyze_articles_concurrently(sself, articles, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", max_concurrency=1,
+                                      confidence=False, usage=None):
+        """One request per article with up to `max_concurrency` in flight; returns rows in input order."""
+        def classify(indexed_article):
+            i, article = indexed_article
+            print(f"Processing article {i+1}/{len(articles)}...")
+            return sself.classify_article(article, criteria, query, give_reason, extract_genes, model, confidence, usage)
 
+        # print(f"Additional Filtering Criteria: {criteria}")
+        if max_concurrency <= 1 or len(articles) <= 1:
+            return [classify(item) for item in enumerate(articles)]
+
+        # executor.map yields results in input order regardless of completion order
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(articles))) as executor:
+            return list(executor.map(metrics.in_current_context(classify), enumerate(articles)))
+
+    def analyze_articles_in_batches(sself, articles, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", max_concurrency=1,
+                                    confidence=False, usage=None):
+        """Batched variant of `analyze_articles_with_LLM`; returns rows in input order."""
+        article_batches = sself.batch_articles(
+            articles, model=model, max_tokens=Config.LLM_BATCH_MAX_TOKENS, max_articles=Config.LLM_BATCH_MAX_ARTICLES
+        )
 
-        # # 1. Prepare article batches
-        # article_batches = sself.batch_articles(articles, model=model)
-
-        # # 2. For each batch, build prompt and call the API
-        # all_results = {}
-        # for batch_index, batch_article in enumerate(article_batches):
-        #     # Build the user prompt
-        #     user_prompt = sself.build_prompt(batch_article, criteria, query, give_reason, extract_genes)
-            
-        #     messages = [
-        #         {"role": "system", "content": SYSTEM_PROMPT},
-        #         {"role": "user", "content": user_prompt}
-        #     ]
-            
-        #     response = openai.ChatCompletion.create(
-        #         model=model,
-        #         messages=messages,
-        #         temperature=0.2
-        #     )
-            
-        #     # The model's JSON response (as string)
-        #     raw_json = response["choices"][0]["message"]["content"].strip()
-            
-        #     # 3. Parse the JSON. In production code, wrap in try/except
-        #     #    in case the model fails to provide valid JSON.
-        #     try:
-        #         batch_result = json.loads(raw_json)
-                
-        #         # Merge into all_results
-        #         # batch_result should be like { "pubmedId1": {...}, "pubmedId2": {...} }
-        #         for pmid, info in batch_result.items():
-        #             all_results[pmid] = info
-        #     except Exception as e:
-        #         # In practice, handle or log JSON parsing errors
-        #         print(f"Warning: Could not parse JSON for batch {batch_index}. Error: {e}")
-        #         print("Raw response:", raw_json)
-
-        # return all_results
+        def classify(indexed_batch):
+            batch_index, batch = indexed_batch
+            print(f"Processing batch {batch_index+1}/{len(article_batches)} ({len(batch)} articles)...")
+            return sself.classify_batch(batch, criteria, query, give_reason, extract_genes, model, confidence, usage)
 
+        all_results = {}
+        if max_concurrency <= 1 or len(article_batches) <= 1:
+            for item in enumerate(article_batches):
+                all_results.update(classify(item))
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(article_batches))) as executor:
+                for batch_result in executor.map(metrics.in_current_context(classify), enumerate(article_batches)):
+                    all_results.update(batch_result)
 
+        return [all_results[article["pubmed_id"]] for article in articles]
@@ -0,0 +1,126 @@
+import threading
+from app.services.Metrics import metrics
+
+# USD per million prompt, cached prompt and completion tokens; matched by longest model name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "o1-mini": (1.10, 0.55, 4.40),
+    "o3-mini": (1.10, 0.55, 4.40),
+    "o1": (15.00, 7.50, 60.00),
+}
+# The Batch API bills half the synchronous price
+BATCH_PRICE_FACTOR = 0.5
+
+
+def estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens, batch=False):
+    """Estimated USD cost of a call (0 for models missing from MODEL_PRICES)."""
+    prefixes = [prefix for prefix in MODEL_PRICES if (model or "").startswith(prefix)]
+    if not prefixes:
+        return 0.0
+    prompt_price, cached_price, completion_price = MODEL_PRICES[max(prefixes, key=len)]
+    cost = ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+
+def token_counts(usage):
+    """(prompt, cached, completion) tokens of a chat completion `usage` object."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(details, "cached_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+
+def record_metrics(model, usage, batch=False):
+    """Count an answered call's tokens and estimated cost for the process and the current report."""
+    prompt_tokens, cached_tokens, completion_tokens = token_counts(usage)
+    metrics.count("llm_calls", model)
+    metrics.count("llm_prompt_tokens", model, prompt_tokens)
+    metrics.count("llm_cached_tokens", model, cached_tokens)
+    metrics.count("llm_completion_tokens", model, completion_tokens)
+    metrics.count("llm_cost_usd", model, estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens, batch))
+
+
+class UsageRecorder:
+    """
+    Running totals of the token usage reported by the API, per model.
+
+    `record` is called with the `usage` object of every chat completion and the
+    seconds the call took (`batch` for Batch API answers, which are billed at half
+    price); cached_tokens is the part of the prompt served from the provider's prompt
+    cache and cost_usd the estimate of `estimate_cost`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models = {}
+
+    def record(self, model, usage, seconds=0.0, batch=False):
+        prompt_tokens, cached_tokens, completion_tokens = token_counts(usage)
+        with self.lock:
+            totals = self.models.setdefault(model, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0, "cost_usd": 0.0,
+            })
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["cost_usd"] += estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens, batch)
+
+    def add_stats(self, stats):
+        """Add the per-model totals of an earlier `stats()` to these."""
+        with self.lock:
+            for model, stored in stats.items():
+                totals = self.models.setdefault(model, {
+                    "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0, "cost_usd": 0.0,
+                })
+                for key in ("calls", "prompt_tokens", "completion_tokens", "cached_tokens"):
+                    totals[key] += int(stored.get(key, 0))
+                for key in ("seconds", "cost_usd"):
+                    totals[key] += float(stored.get(key, 0))
+
+    def stats(self):
+        with self.lock:
+            models = {model: dict(totals) for model, totals in self.models.items()}
+        for totals in models.values():
+            totals["cached_ratio"] = round(totals["cached_tokens"] / totals["prompt_tokens"], 3) if totals["prompt_tokens"] else 0.0
+            totals["avg_latency_seconds"] = round(totals["seconds"] / totals["calls"], 3) if totals["calls"] else 0.0
+            totals["seconds"] = round(totals["seconds"], 3)
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return models
+
+
+class TierUsage:
+    """
+    LLM usage of one analysis job per tier ("classify", or "screen" and "escalate" in
+    cascade mode): articles sent to the tier plus the calls, tokens and latency of its models.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.articles = {}
+        self.recorders = {}
+
+    def recorder(self, tier, articles):
+        """Count `articles` more for `tier` and return the UsageRecorder of its calls."""
+        with self.lock:
+            self.articles[tier] = self.articles.get(tier, 0) + articles
+            return self.recorders.setdefault(tier, UsageRecorder())
+
+    def add_stats(self, stats):
+        """Add the tiers of an earlier `stats()` (e.g. a report header's llm_tiers) to these."""
+        for tier, stored in stats.items():
+            self.recorder(tier, int(stored.get("articles", 0))).add_stats(stored.get("models") or {})
+
+    def stats(self):
+        with self.lock:
+            tiers = dict(self.recorders)
+            articles = dict(self.articles)
+        return {tier: {"articles": articles[tier], "models": recorder.stats()} for tier, recorder in tiers.items()}
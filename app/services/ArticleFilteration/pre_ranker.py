@@ -0,0 +1,169 @@
+import math
+import string
+from collections import namedtuple
+import numpy as np
+from app.config import Config
+
+# Punctuation splits words; str.translate + str.split is several times faster than a regex tokenizer
+SEPARATORS = str.maketrans({character: " " for character in string.punctuation})
+
+# Words that carry no topical signal in criteria/queries (PubMed AND/OR/NOT included)
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at based be been being between both but by can could did do does
+during each either for from had has have having how if in into is it its may might more most no nor not of on one
+only or other our over same should so some such than that the their them then there these they this those through
+to under up very was we were what when where which while who will with within without would
+article articles study studies paper published journal journals related mention mentions mentioned avoid
+focus exclude include including multiple correct known novel potential
+""".split())
+
+
+# Outcome of ranking a whole report: the PubMed IDs within the limits and the score of every ranked article
+PrerankSelection = namedtuple("PrerankSelection", ["kept", "scores"])
+
+
+def tokenize(text):
+    return (text or "").lower().translate(SEPARATORS).split()
+
+
+class PreRanker:
+    """
+    Local BM25 scoring of articles against the job's criteria and query.
+
+    Only the columns of the term-frequency matrix that the criteria/query use are
+    built (one NumPy bincount over all matching tokens), since every other column
+    contributes nothing to the score. IDF and average length come from the articles
+    scored together, so scores are comparable within one call only; `rank` scores a
+    whole streamed report in one call. Query terms weigh PRERANK_QUERY_WEIGHT times as
+    much as criteria terms.
+    """
+
+    def __init__(self, k1=None, b=None, query_weight=None):
+        self.k1 = k1 if k1 is not None else Config.PRERANK_K1
+        self.b = b if b is not None else Config.PRERANK_B
+        self.query_weight = query_weight if query_weight is not None else Config.PRERANK_QUERY_WEIGHT
+
+    def term_weights(self, criteria, query):
+        weights = {}
+        for term in tokenize(criteria):
+            if term not in STOPWORDS and len(term) > 1:
+                weights[term] = 1.0
+        for term in tokenize(query):
+            if term not in STOPWORDS and len(term) > 1:
+                weights[term] = self.query_weight
+        return weights
+
+    def term_frequencies(self, articles, vocabulary):
+        """Term-frequency matrix (articles x vocabulary) and token count of each article's title and abstract."""
+        lengths = np.empty(len(articles))
+        matches = []
+        for i, article in enumerate(articles):
+            tokens = tokenize(f"{article.get('title') or ''} {article.get('abstract') or ''}")
+            lengths[i] = len(tokens)
+            matches.append([vocabulary[token] for token in tokens if token in vocabulary])
+
+        counts = np.fromiter((len(ids) for ids in matches), dtype=np.int64, count=len(articles))
+        term_ids = np.fromiter((term for ids in matches for term in ids), dtype=np.int64, count=int(counts.sum()))
+        doc_ids = np.repeat(np.arange(len(articles)), counts)
+        size = len(vocabulary)
+        tf = np.bincount(doc_ids * size + term_ids, minlength=len(articles) * size).reshape(len(articles), size)
+        return tf, lengths
+
+    def bm25(self, tf, lengths, weights):
+        """BM25 scores of term-frequency rows, with IDF and average length taken from the rows themselves."""
+        if not len(lengths):
+            return np.zeros(0)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((len(lengths) - df + 0.5) / (df + 0.5))
+        average_length = lengths.mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        saturated = tf * (self.k1 + 1) / (tf + norm[:, None])
+        return saturated @ (idf * np.fromiter(weights.values(), dtype=float, count=len(weights)))
+
+    def score(self, articles, criteria, query):
+        """BM25 score of each article's title and abstract, as an array in input order."""
+        weights = self.term_weights(criteria, query)
+        if not articles or not weights:
+            return np.zeros(len(articles))
+        tf, lengths = self.term_frequencies(articles, {term: i for i, term in enumerate(weights)})
+        return self.bm25(tf, lengths, weights)
+
+    def cutoff(self, scores, top_k=None, top_fraction=None, threshold=None):
+        """
+        Boolean mask of the scores to keep: within the `top_k` (or the best `top_fraction`)
+        and at least `threshold`; unset limits keep everything.
+        """
+        keep = np.ones(len(scores), dtype=bool)
+        if top_fraction is not None:
+            limit = math.ceil(len(scores) * float(top_fraction))
+            top_k = limit if top_k is None else min(int(top_k), limit)
+        if top_k is not None and int(top_k) < len(scores):
+            # Stable order so ties keep the earlier article
+            ranked = np.argsort(-scores, kind="stable")
+            keep[:] = False
+            keep[ranked[:max(int(top_k), 0)]] = True
+        if threshold is not None:
+            keep &= scores >= float(threshold)
+        return keep
+
+    def select(self, articles, criteria, query, top_k=None, top_fraction=None, threshold=None):
+        """
+        Split `articles` into (kept, dropped) by score; returns those two lists and the
+        score of every article keyed by PubMed ID (see `cutoff` for the limits).
+        """
+        scores = self.score(articles, criteria, query)
+        keep = self.cutoff(scores, top_k, top_fraction, threshold)
+        kept = [article for article, selected in zip(articles, keep) if selected]
+        dropped = [article for article, selected in zip(articles, keep) if not selected]
+        return kept, dropped, {article["pubmed_id"]: round(float(score), 4) for article, score in zip(articles, scores)}
+
+    def rank(self, article_batches, criteria, query, top_k=None, top_fraction=None, threshold=None):
+        """
+        `select` over every article of `article_batches` at once, for result sets that are
+        streamed: only each article's term frequencies for the criteria/query terms and
+        its length are kept while the batches go by. IDF, average length and the limits
+        all apply to the whole set. Returns a PrerankSelection.
+        """
+        weights = self.term_weights(criteria, query)
+        vocabulary = {term: i for i, term in enumerate(weights)}
+        pubmed_ids, tf_blocks, length_blocks = [], [], []
+        for articles in article_batches:
+            if not articles:
+                continue
+            tf, lengths = self.term_frequencies(articles, vocabulary)
+            tf_blocks.append(tf.astype(np.int32))
+            length_blocks.append(lengths)
+            pubmed_ids.extend(article["pubmed_id"] for article in articles)
+
+        if not pubmed_ids:
+            return PrerankSelection(frozenset(), {})
+        if weights:
+            scores = self.bm25(np.concatenate(tf_blocks), np.concatenate(length_blocks), weights)
+        else:
+            scores = np.zeros(len(pubmed_ids))
+        keep = self.cutoff(scores, top_k, top_fraction, threshold)
+        return PrerankSelection(
+            frozenset(pubmed_id for pubmed_id, selected in zip(pubmed_ids, keep) if selected),
+            {pubmed_id: round(float(score), 4) for pubmed_id, score in zip(pubmed_ids, scores)},
+        )
+
+
+def validate_prerank(prerank):
+    """
+    Check and normalize the `prerank` option ({"top_k": int, "top_fraction": 0-1,
+    "threshold": float}); None or {} disables pre-ranking. Raises ValueError.
+    """
+    if not prerank:
+        return None
+    if not isinstance(prerank, dict) or not set(prerank) <= {"top_k", "top_fraction", "threshold"}:
+        raise ValueError("prerank must be an object with top_k, top_fraction and/or threshold")
+    try:
+        # Numbers read back from DynamoDB are Decimals
+        normalized = {key: int(value) if key == "top_k" else float(value) for key, value in prerank.items() if value is not None}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid prerank option: {e}")
+    if normalized.get("top_k", 0) < 0:
+        raise ValueError("Invalid prerank option: top_k must not be negative")
+    if not 0 < normalized.get("top_fraction", 1) <= 1:
+        raise ValueError("Invalid prerank option: top_fraction must be in (0, 1]")
+    return normalized or None
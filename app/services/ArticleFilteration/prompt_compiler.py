@@ -0,0 +1,115 @@
+import tiktoken
+from functools import lru_cache
+from app.services.models.prompts import (
+    PROMPT_VERSION,
+    SYSTEM_PROMPT,
+    BASE_PROMPT,
+    REASON_SECTION,
+    NO_REASON_SECTION,
+    GENE_EXTRACTION_SECTION,
+    CONFIDENCE_SECTION,
+    REASON_AND_GENE_SECTION,
+    RESPONSE_FORMAT,
+    ARTICLE,
+    BATCH_BASE_PROMPT,
+    BATCH_ARTICLE,
+    BATCH_RESPONSE_FORMAT
+)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """Load the tiktoken encoding for `model` once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def strip_lines(text):
+    """Drop indentation and blank lines from user-supplied text (often pasted from indented code)."""
+    return "\n".join(line.strip() for line in (text or "").splitlines() if line.strip())
+
+
+def task_sections(give_reason=False, extract_genes=False):
+    # Conditionally add reason &/or gene extraction tasks
+    if give_reason and extract_genes:
+        return REASON_AND_GENE_SECTION
+    elif give_reason:
+        return REASON_SECTION
+    elif extract_genes:
+        return GENE_EXTRACTION_SECTION
+    else:
+        return NO_REASON_SECTION
+
+
+class CompiledPrompt:
+    """
+    The prompt of one classification job with its static part rendered once.
+
+    `prefix` (system prompt, task, criteria, query and response format) is byte-for-byte
+    identical for every request of the job, so providers that cache prompt prefixes
+    only bill it in full once; each request appends just its article(s).
+    """
+
+    def __init__(self, criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", batch=False, confidence=False):
+        self.model = model
+        self.version = PROMPT_VERSION
+        base = BATCH_BASE_PROMPT if batch else BASE_PROMPT
+        response_format = BATCH_RESPONSE_FORMAT if batch else RESPONSE_FORMAT
+        self.instructions = (
+            base.format(criteria=strip_lines(criteria), query=strip_lines(query))
+            + task_sections(give_reason, extract_genes)
+            + (CONFIDENCE_SECTION if confidence else "")
+            + response_format
+        ).strip()
+        # o1 models take no system message; the instructions still lead the user message
+        self.system_role = not model.startswith("o1")
+        if self.system_role:
+            self.prefix_messages = [
+                {"role": "system", "content": f"{SYSTEM_PROMPT}\n\n{self.instructions}"},
+            ]
+        else:
+            self.prefix_messages = []
+        self.prefix_tokens = self.count(SYSTEM_PROMPT + self.instructions)
+
+    def count(self, text):
+        return len(get_encoding(self.model).encode(text))
+
+    def render_article(self, article):
+        return ARTICLE.format(
+            article_title=article["title"],
+            article_journal=article["journal"],
+            article_abstract=article["abstract"]
+        )
+
+    def render_batch(self, batch):
+        return "Here are the articles:\n\n" + "".join(
+            BATCH_ARTICLE.format(
+                pubmed_id=article["pubmed_id"],
+                article_title=article["title"],
+                article_journal=article["journal"],
+                article_abstract=article["abstract"]
+            )
+            for article in batch
+        )
+
+    def messages(self, content):
+        """Chat messages for one request: the cached prefix, then `content`."""
+        if not self.system_role:
+            content = f"{SYSTEM_PROMPT}\n\n{self.instructions}\n\n{content}"
+        return self.prefix_messages + [{"role": "user", "content": content}]
+
+    def count_tokens(self, content):
+        """Prompt tokens of a request carrying `content` (the prefix is only encoded once)."""
+        return self.prefix_tokens + self.count(content)
+
+    def count_tokens_many(self, contents):
+        """`count_tokens` for many requests at once, with a single batched encode."""
+        return [self.prefix_tokens + len(tokens) for tokens in get_encoding(self.model).encode_batch(list(contents))]
+
+
+@lru_cache(maxsize=64)
+def compile_prompt(criteria, query, give_reason=False, extract_genes=False, model="gpt-4o-mini", batch=False, confidence=False):
+    """Compile (once per distinct job settings) the prompt used to classify articles."""
+    return CompiledPrompt(criteria, query, give_reason, extract_genes, model, batch, confidence)
@@ -0,0 +1,136 @@
+import json
+import os
+import re
+from functools import lru_cache
+from app.config import Config
+
+# Article fields a rule condition can look at; list fields match whole values
+# (case-insensitively), text fields are searched with a regex
+LIST_FIELDS = {"mesh": "mesh_terms", "publication_type": "publication_types", "issn": "issn"}
+TEXT_FIELDS = {"title": ("title",), "abstract": ("abstract",), "journal": ("journal",), "text": ("title", "abstract")}
+
+# Built-in rule sets, selectable by name in the `rules` option of /filter. The
+# neurogenetics set covers the parts of the default criteria that metadata answers.
+RULE_SETS = {
+    "neurogenetics": [
+        {
+            "name": "animal-study-only",
+            "action": "reject",
+            "conditions": [{"field": "mesh", "any": ["Animals"]}, {"field": "mesh", "none": ["Humans"]}],
+        },
+        {
+            "name": "gwas",
+            "action": "reject",
+            "conditions": [{"field": "text", "regex": r"\bGWAS\b|genome[- ]wide association"}],
+        },
+        {
+            "name": "single-case-report",
+            "action": "reject",
+            "conditions": [{"field": "publication_type", "any": ["Case Reports"]}],
+        },
+        {
+            "name": "candidate-gene-wording",
+            "action": "reject",
+            "conditions": [{"field": "text", "regex": r"\bpotential\b|novel candidate gene"}],
+        },
+        {
+            "name": "not-primary-research",
+            "action": "reject",
+            "conditions": [{"field": "publication_type", "any": [
+                "Comment", "Editorial", "Erratum", "Published Erratum", "Retracted Publication", "Retraction of Publication",
+            ]}],
+        },
+    ],
+}
+
+
+class RuleSet:
+    """
+    Ordered metadata rules, compiled once per job.
+
+    Each rule has a name, an action ("reject": Not Relevant, "accept": Relevant) and
+    conditions that must all hold. The first matching rule decides the article without
+    an LLM call; articles no rule matches go on to the LLM.
+    """
+
+    def __init__(self, rules):
+        self.rules = [compile_rule(rule) for rule in rules]
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def evaluate(self, article):
+        """Return the (name, action) of the first rule matching `article`, or None."""
+        for name, action, conditions in self.rules:
+            if all(condition(article) for condition in conditions):
+                return name, action
+        return None
+
+
+def compile_rule(rule):
+    name = rule.get("name")
+    action = rule.get("action")
+    conditions = rule.get("conditions") or []
+    if not name or action not in ("reject", "accept") or not conditions:
+        raise ValueError(f"Rule {name or rule!r} needs a name, an action (reject/accept) and conditions")
+    return name, action, [compile_condition(name, condition) for condition in conditions]
+
+
+def compile_condition(rule_name, condition):
+    field = condition.get("field")
+    if field in LIST_FIELDS:
+        key = LIST_FIELDS[field]
+        if "any" in condition:
+            values = frozenset(value.lower() for value in condition["any"])
+            return lambda article: any(value.lower() in values for value in article.get(key) or [])
+        if "none" in condition:
+            values = frozenset(value.lower() for value in condition["none"])
+            return lambda article: not any(value.lower() in values for value in article.get(key) or [])
+    elif field in TEXT_FIELDS and "regex" in condition:
+        keys = TEXT_FIELDS[field]
+        try:
+            pattern = re.compile(condition["regex"], re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Rule {rule_name!r} has an invalid regex: {e}")
+        return lambda article: any(pattern.search(article.get(key) or "") for key in keys)
+    raise ValueError(f"Rule {rule_name!r} has an unsupported condition: {condition!r}")
+
+
+@lru_cache(maxsize=None)
+def load_rule_sets():
+    """Built-in rule sets plus (overriding them) the named sets in RULES_PATH, if configured."""
+    rule_sets = dict(RULE_SETS)
+    if Config.RULES_PATH and os.path.exists(Config.RULES_PATH):
+        with open(Config.RULES_PATH) as f:
+            rule_sets.update(json.load(f))
+    return rule_sets
+
+
+def resolve_rules(rules):
+    """
+    Turn the `rules` option (a rule set name, or a list of rule dicts) into the rule
+    list it stands for; None means no rules. Raises ValueError for unknown sets.
+    """
+    if not rules:
+        return None
+    if isinstance(rules, str):
+        rule_sets = load_rule_sets()
+        if rules not in rule_sets:
+            raise ValueError(f"Unknown rule set {rules!r}, expected one of {sorted(rule_sets)}")
+        return rule_sets[rules]
+    if not isinstance(rules, list):
+        raise ValueError("rules must be a rule set name or a list of rules")
+    return rules
+
+
+@lru_cache(maxsize=32)
+def _compile_rules(rules_json):
+    return RuleSet(json.loads(rules_json))
+
+
+def compile_rules(rules):
+    """Compile (once per distinct rule list) the rules given in any form `resolve_rules` accepts."""
+    rules = resolve_rules(rules)
+    if not rules:
+        return None
+    return _compile_rules(json.dumps(rules, sort_keys=True))
@@ -1,7 +1,16 @@
 import boto3
+import hashlib
+import json
 import os
+import random
+import time
+import uuid
+import zlib
+from datetime import datetime
+from decimal import Decimal
 from botocore.exceptions import BotoCoreError, ClientError
 from app.config import Config
+from app.services.Metrics import metrics
 
 
 # Initialize DynamoDB
@@ -9,48 +18,310 @@ dynamodb = boto3.resource(
     "dynamodb",
     region_name = Config.AWS_REGION,
     aws_access_key_id = Config.AWS_ACCESS_KEY,
-    aws_secret_access_key = Config.AWS_SECRET_KEY
+    aws_secret_access_key = Config.AWS_SECRET_KEY,
+    endpoint_url = Config.DYNAMODB_ENDPOINT_URL  # e.g. DynamoDB Local
 )
 
 
+# Report header items, keyed by report_id
 TABLE_NAME = "report_filtered_articles"
+# One item per analyzed article, keyed by report_id (partition) + pubmed_id (sort)
+ARTICLES_TABLE_NAME = "report_articles"
+# Canonical request fingerprint -> report_id, written with a conditional put
+FINGERPRINTS_TABLE_NAME = "report_fingerprints"
+
+# BatchWriteItem accepts at most 25 put requests per call, BatchGetItem 100 keys
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+
+# Header GSI grouping reports of the same query/criteria/flags across date ranges
+QUERY_FINGERPRINT_INDEX = "query_fingerprint-index"
+
+# Header attributes returned to API clients; internal bookkeeping such as the
+# compressed checkpoint ID list is left out
+REPORT_HEADER_FIELDS = [
+    "report_id", "created_at", "start_date", "end_date", "query", "criteria", "options",
+    "status", "article_count", "resolved_count", "checkpoint_at", "finished_at", "reused_from", "llm_tiers",
+    "bulk_batches", "metrics",
+]
+
+
+# Operations that report ConsumedCapacity when asked to
+CAPACITY_OPERATIONS = [
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan", "BatchGetItem", "BatchWriteItem",
+    "TransactGetItems", "TransactWriteItems",
+]
+
+
+def request_consumed_capacity(params, **kwargs):
+    params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def record_dynamodb_call(parsed, model, **kwargs):
+    metrics.count("dynamodb_requests", model.name)
+    consumed = parsed.get("ConsumedCapacity") or []
+    for capacity in consumed if isinstance(consumed, list) else [consumed]:
+        metrics.count("dynamodb_consumed_capacity", capacity.get("TableName", "unknown"), float(capacity.get("CapacityUnits", 0)))
+
+
+def instrument_client(client):
+    """Count every call of a DynamoDB client and the capacity it consumes (see metrics.py)."""
+    events = client.meta.events
+    for operation in CAPACITY_OPERATIONS:
+        events.register(f"provide-client-params.dynamodb.{operation}", request_consumed_capacity,
+                        unique_id=f"consumed-capacity-{operation}")
+    events.register("after-call.dynamodb", record_dynamodb_call, unique_id="dynamodb-metrics")
+
+
+def to_dynamo(value):
+    """Recursively convert floats (which boto3 rejects) to Decimal."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: to_dynamo(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_dynamo(item) for item in value]
+    return value
+
+
+def query_fingerprint_index():
+    return {
+        "IndexName": QUERY_FINGERPRINT_INDEX,
+        "KeySchema": [{"AttributeName": "query_fingerprint", "KeyType": "HASH"}],
+        "Projection": {
+            "ProjectionType": "INCLUDE",
+            "NonKeyAttributes": ["status", "start_date", "end_date", "created_at", "verdict_dates"],
+        },
+    }
+
+
+def projection_params(fields):
+    """ProjectionExpression for `fields`, with placeholders so reserved words are safe."""
+    names = {f"#p{i}": field for i, field in enumerate(fields)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def request_fingerprint(start_date, end_date, query, criteria, give_reason=False, extract_genes=False, rules=None, prerank=None,
+                        cascade=False):
+    """Canonical hash of a report request; whitespace-only differences map to the same report."""
+    request = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "query": " ".join((query or "").split()),
+        "criteria": " ".join((criteria or "").split()),
+        "give_reason": bool(give_reason),
+        "extract_genes": bool(extract_genes),
+    }
+    if rules:
+        # Only present when set, so reports without rules keep their fingerprint
+        request["rules"] = rules
+    if prerank:
+        request["prerank"] = prerank
+    if cascade:
+        request["cascade"] = True
+    payload = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def query_fingerprint(query, criteria, give_reason=False, extract_genes=False, rules=None, prerank=None, cascade=False):
+    """Like `request_fingerprint` without the dates: reports whose verdicts are interchangeable."""
+    return request_fingerprint(None, None, query, criteria, give_reason, extract_genes, rules, prerank, cascade)
+
 
 class ReportService:
-    def __init__(self):
-        self.table = dynamodb.Table(TABLE_NAME)
+    def __init__(self, dynamodb_resource=None, table_name=TABLE_NAME, articles_table_name=ARTICLES_TABLE_NAME,
+                 fingerprints_table_name=FINGERPRINTS_TABLE_NAME):
+        self.dynamodb = dynamodb_resource or dynamodb
+        self.table = self.dynamodb.Table(table_name)
+        self.articles_table = self.dynamodb.Table(articles_table_name)
+        self.fingerprints_table = self.dynamodb.Table(fingerprints_table_name)
+        instrument_client(self.dynamodb.meta.client)
+
+    def create_tables(self):
+        """
+        Create the report and article tables if they are missing (DynamoDB Local, moto, new
+        environments) and add the query fingerprint index to an older header table.
+        Returns the names of the tables and indexes created.
+        """
+        existing = {table.name for table in self.dynamodb.tables.all()}
+        created = []
+        if self.table.name in existing and self.create_query_fingerprint_index():
+            created.append(f"{self.table.name}/{QUERY_FINGERPRINT_INDEX}")
+        definitions = [
+            (self.table.name, [("report_id", "HASH")]),
+            (self.articles_table.name, [("report_id", "HASH"), ("pubmed_id", "RANGE")]),
+            (self.fingerprints_table.name, [("fingerprint", "HASH")]),
+        ]
+        for name, keys in definitions:
+            if name in existing:
+                continue
+            indexes = {}
+            if name == self.table.name:
+                keys = keys + [("query_fingerprint", None)]
+                indexes["GlobalSecondaryIndexes"] = [query_fingerprint_index()]
+            self.dynamodb.create_table(
+                TableName=name,
+                KeySchema=[{"AttributeName": attribute, "KeyType": key_type} for attribute, key_type in keys if key_type],
+                AttributeDefinitions=[{"AttributeName": attribute, "AttributeType": "S"} for attribute, _ in keys],
+                BillingMode="PAY_PER_REQUEST",
+                **indexes
+            ).wait_until_exists()
+            created.append(name)
+        return created
+
+    def missing_tables(self):
+        """Names of the tables (and the header table's query fingerprint index) that do not exist yet."""
+        existing = {table.name for table in self.dynamodb.tables.all()}
+        missing = [table.name for table in (self.table, self.articles_table, self.fingerprints_table) if table.name not in existing]
+        if self.table.name in existing and not self.has_query_fingerprint_index():
+            missing.append(f"{self.table.name}/{QUERY_FINGERPRINT_INDEX}")
+        return missing
+
+    def has_query_fingerprint_index(self):
+        description = self.dynamodb.meta.client.describe_table(TableName=self.table.name)["Table"]
+        return any(index["IndexName"] == QUERY_FINGERPRINT_INDEX for index in description.get("GlobalSecondaryIndexes", []))
 
-    def find_existing_report(self, start_date: str, end_date: str, query: str, criteria: str):
-        """Check if a report with the same parameters exists in DynamoDB."""
+    def create_query_fingerprint_index(self):
+        """Add the query fingerprint GSI to a header table created before it existed; True if it was added."""
+        if self.has_query_fingerprint_index():
+            return False
+        self.dynamodb.meta.client.update_table(
+            TableName=self.table.name,
+            AttributeDefinitions=[{"AttributeName": "query_fingerprint", "AttributeType": "S"}],
+            GlobalSecondaryIndexUpdates=[{"Create": query_fingerprint_index()}]
+        )
+        return True
+
+    def find_existing_report(self, start_date: str, end_date: str, query: str, criteria: str,
+                             give_reason: bool = False, extract_genes: bool = False, rules: list = None,
+                             prerank: dict = None, cascade: bool = False):
+        """Look up the report for the same request parameters with a single GetItem on its fingerprint."""
         try:
-            response = self.table.scan(
-                FilterExpression="start_date = :sd AND end_date = :ed AND query = :q AND criteria = :c",
-                ExpressionAttributeValues={
-                    ":sd": start_date,
-                    ":ed": end_date,
-                    ":q": query,
-                    ":c": criteria
-                }
-            )
-            reports = response.get("Items", [])
+            fingerprint = request_fingerprint(start_date, end_date, query, criteria, give_reason, extract_genes, rules, prerank, cascade)
+            response = self.fingerprints_table.get_item(Key={"fingerprint": fingerprint})
+            if "Item" not in response:
+                return None
 
-            return reports[0] if reports else None
+            return {"report_id": response["Item"]["report_id"], "fingerprint": fingerprint}
 
         except Exception as e:
             print(f"Error finding existing report: {str(e)}")
             return None  # 🔹 Fix: Return None instead of an error dictionary
-    
-    def save_report(self, report_id: str, start_date: str, end_date: str, query: str, criteria: str, created_at: str):
+
+    def find_overlapping_reports(self, start_date: str, end_date: str, query: str, criteria: str,
+                                 give_reason: bool = False, extract_genes: bool = False, created_after: str = None,
+                                 rules: list = None, prerank: dict = None, cascade: bool = False):
+        """
+        Completed reports of the same query, criteria and flags whose date range overlaps
+        [start_date, end_date], read from the query fingerprint GSI.
+
+        Each result carries report_id, start_date, end_date, created_at and verdict_dates
+        (whether its rows record the article date, so a part of the report can be reused).
+        """
+        params = {
+            "IndexName": QUERY_FINGERPRINT_INDEX,
+            "KeyConditionExpression": "query_fingerprint = :qfp",
+            # ISO dates compare correctly as strings
+            "FilterExpression": "#status = :complete AND start_date <= :end AND end_date >= :start",
+            "ProjectionExpression": "report_id, start_date, end_date, created_at, verdict_dates",
+            "ExpressionAttributeNames": {"#status": "status"},
+            "ExpressionAttributeValues": {
+                ":qfp": query_fingerprint(query, criteria, give_reason, extract_genes, rules, prerank, cascade),
+                ":complete": "complete",
+                ":start": start_date,
+                ":end": end_date,
+            },
+        }
+        if created_after:
+            params["FilterExpression"] += " AND created_at >= :created_after"
+            params["ExpressionAttributeValues"][":created_after"] = created_after
+
+        reports = []
+        try:
+            while True:
+                response = self.table.query(**params)
+                reports.extend(response.get("Items", []))
+                if "LastEvaluatedKey" not in response:
+                    return reports
+                params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception as e:
+            print(f"Error finding overlapping reports: {str(e)}")
+            return []
+
+    def claim_fingerprint(self, fingerprint: str, report_id: str, created_at: str):
+        """
+        Atomically bind `fingerprint` to `report_id`.
+
+        Returns None if this call won, otherwise the report_id that already owns the
+        fingerprint, so concurrent identical submissions collapse into one report.
+        """
+        try:
+            self.fingerprints_table.put_item(
+                Item={"fingerprint": fingerprint, "report_id": report_id, "created_at": created_at},
+                ConditionExpression="attribute_not_exists(fingerprint)"
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            response = self.fingerprints_table.get_item(Key={"fingerprint": fingerprint}, ConsistentRead=True)
+            return response["Item"]["report_id"]
+
+    def create_report(self, start_date: str, end_date: str, query: str, criteria: str, created_at: str,
+                      give_reason: bool = False, extract_genes: bool = False, options: dict = None, worker_id: str = None):
+        """
+        Create the report for a request unless an identical one already exists.
+
+        Returns (report_id, created). The header is written first and only kept if the
+        conditional put on the request fingerprint succeeds. `worker_id` is the process
+        that will run the analysis job, so no other process claims the report while the
+        job waits in its queue.
+        """
+        fingerprint = request_fingerprint(
+            start_date, end_date, query, criteria, give_reason, extract_genes,
+            (options or {}).get("rules"), (options or {}).get("prerank"), (options or {}).get("cascade")
+        )
+        report_id = f"report-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+        options = {"give_reason": give_reason, "extract_genes": extract_genes, **(options or {})}
+        result = self.save_report(report_id, start_date, end_date, query, criteria, created_at, fingerprint=fingerprint, options=options,
+                                  worker_id=worker_id)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+
+        try:
+            existing_report_id = self.claim_fingerprint(fingerprint, report_id, created_at)
+        except Exception:
+            self.table.delete_item(Key={"report_id": report_id})
+            raise
+
+        if existing_report_id is not None:
+            self.table.delete_item(Key={"report_id": report_id})
+            return existing_report_id, False
+        return report_id, True
+
+    def save_report(self, report_id: str, start_date: str, end_date: str, query: str, criteria: str, created_at: str,
+                    fingerprint: str = None, options: dict = None, worker_id: str = None):
         """Create a new report entry in DynamoDB."""
         try:
+            owner = {"worker_id": worker_id} if worker_id else {}
             self.table.put_item(
                 Item={
+                    **owner,
                     "report_id": report_id,
+                    "fingerprint": fingerprint or request_fingerprint(start_date, end_date, query, criteria),
+                    "query_fingerprint": query_fingerprint(
+                        query, criteria, (options or {}).get("give_reason", False), (options or {}).get("extract_genes", False),
+                        (options or {}).get("rules"), (options or {}).get("prerank"), (options or {}).get("cascade")
+                    ),
+                    "verdict_dates": True,  # Rows carry their article date (see copy_articles)
                     "created_at": created_at,
                     "start_date": start_date,
                     "end_date": end_date,
                     "query": query,
                     "criteria": criteria,
-                    "filtered_articles": [],  # Empty at first
+                    "options": to_dynamo(options or {}),  # Analysis flags, needed to resume the job
+                    "article_count": 0,  # Articles live in ARTICLES_TABLE_NAME
                     "status": "processing"
                 }
             )
@@ -58,54 +329,396 @@ class ReportService:
         except (BotoCoreError, ClientError) as e:
             return {"error": str(e)}
 
+    def delete_report(self, report_id):
+        """Remove a report header and release its fingerprint (used when a new report cannot be started)."""
+        report = self.get_report_header(report_id)
+        if report is None:
+            return
+        if report.get("fingerprint"):
+            try:
+                self.fingerprints_table.delete_item(
+                    Key={"fingerprint": report["fingerprint"]},
+                    ConditionExpression="report_id = :rid",
+                    ExpressionAttributeValues={":rid": report_id}
+                )
+            except ClientError as e:
+                # The fingerprint belongs to another report; leave it alone
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+        self.table.delete_item(Key={"report_id": report_id})
+
+    def get_report_header(self, report_id, fields=None):
+        """Retrieve only the report header item (no articles), optionally projected to `fields`."""
+        params = projection_params(fields) if fields else {}
+        response = self.table.get_item(Key={"report_id": report_id}, **params)
+        return response.get("Item")
+
     def get_report(self, report_id):
-        """Retrieve the report from DynamoDB"""
+        """Retrieve the report from DynamoDB, with its articles under `filtered_articles`."""
         try:
-            response = self.table.get_item(Key={"report_id": report_id})
+            report = self.get_report_header(report_id)
 
-            if "Item" not in response:
+            if report is None:
                 return None 
 
-            return response["Item"]
+            # Reports written before the per-article layout still carry the list inline
+            if "filtered_articles" not in report:
+                report["filtered_articles"] = self.get_all_articles(report_id)
+            return report
         except Exception as e:
             print(f"❌ Error retrieving report: {str(e)}")
             return {"error": str(e)}
 
+    def query_articles(self, report_id, limit=None, exclusive_start_key=None, **query_options):
+        """
+        Read one page of a report's article items.
+
+        Returns (items, last_evaluated_key); pass the key back as `exclusive_start_key`
+        to read the next page, until it comes back as None.
+        """
+        params = {"KeyConditionExpression": "report_id = :rid", **query_options}
+        params["ExpressionAttributeValues"] = {":rid": report_id, **query_options.get("ExpressionAttributeValues", {})}
+        if limit:
+            params["Limit"] = limit
+        if exclusive_start_key:
+            params["ExclusiveStartKey"] = exclusive_start_key
+
+        response = self.articles_table.query(**params)
+        return response.get("Items", []), response.get("LastEvaluatedKey")
+
+    def get_report_page(self, report_id, limit, start_key=None, fields=None, relevance=None):
+        """
+        Read one page of a report: the public header fields plus up to `limit` articles.
+
+        `fields` projects the article attributes and `relevance` (a list of values) keeps
+        only matching articles, both evaluated by DynamoDB. Returns (header, articles, next_key);
+        header is None when the report does not exist and next_key is None on the last page.
+        """
+        header = self.get_report_header(report_id, REPORT_HEADER_FIELDS)
+        if header is None:
+            return None, [], None
+
+        # Reports written before the per-article layout keep the list inline
+        legacy = self.get_report_header(report_id, ["filtered_articles"]) if "article_count" not in header else None
+        if legacy and "filtered_articles" in legacy:
+            return (header,) + self.slice_inline_articles(legacy["filtered_articles"], limit, start_key, fields, relevance)
+
+        query_options = {}
+        if fields:
+            # pubmed_id is needed to build the cursor when a page ends mid-response
+            query_options.update(projection_params(list(dict.fromkeys(["pubmed_id", *fields]))))
+        if relevance:
+            placeholders = {f":relevance{i}": value for i, value in enumerate(relevance)}
+            query_options.setdefault("ExpressionAttributeNames", {})["#relevance"] = "Relevance"
+            query_options["FilterExpression"] = f"#relevance IN ({', '.join(placeholders)})"
+            query_options["ExpressionAttributeValues"] = placeholders
+
+        # Limit caps the items evaluated, not returned, so a filtered page may need several reads
+        articles = []
+        last_key = start_key
+        while len(articles) < limit:
+            items, last_key = self.query_articles(report_id, limit=limit, exclusive_start_key=last_key, **query_options)
+            articles.extend(items)
+            if not last_key:
+                break
+
+        if len(articles) > limit:
+            articles = articles[:limit]
+            last_key = {"report_id": report_id, "pubmed_id": articles[-1]["pubmed_id"]}
+        for article in articles:
+            article.pop("report_id", None)
+            if fields and "pubmed_id" not in fields:
+                article.pop("pubmed_id", None)
+        return header, articles, last_key
+
+    @staticmethod
+    def slice_inline_articles(articles, limit, start_key=None, fields=None, relevance=None):
+        """In-memory equivalent of `get_report_page` for reports that store their articles inline."""
+        if relevance:
+            articles = [article for article in articles if article.get("Relevance") in relevance]
+        offset = int((start_key or {}).get("offset", 0))
+        page = articles[offset:offset + limit]
+        if fields:
+            page = [{field: article[field] for field in fields if field in article} for article in page]
+        next_key = {"offset": offset + limit} if offset + limit < len(articles) else None
+        return page, next_key
+
+    def copy_articles(self, source_report_id, report_id, start_date=None, end_date=None):
+        """
+        Reuse the verdicts of another report: copy its article items published between
+        `start_date` and `end_date` (YYYY-MM-DD, inclusive; None copies everything) into
+        `report_id`. Errored rows are left out so they get classified again.
+
+        Returns the number of copied articles.
+        """
+        query_options = {
+            "FilterExpression": "#relevance <> :error",
+            "ExpressionAttributeNames": {"#relevance": "Relevance"},
+            "ExpressionAttributeValues": {":error": "Error"},
+        }
+        if start_date and end_date:
+            # Rows store the article date as YYYY/MM/DD
+            query_options["FilterExpression"] += " AND #date BETWEEN :start AND :end"
+            query_options["ExpressionAttributeNames"]["#date"] = "Date"
+            query_options["ExpressionAttributeValues"].update({
+                ":start": start_date.replace("-", "/"),
+                ":end": end_date.replace("-", "/"),
+            })
+
+        copied = 0
+        last_key = None
+        while True:
+            items, last_key = self.query_articles(source_report_id, exclusive_start_key=last_key, **query_options)
+            if items:
+                rows = [{key: value for key, value in item.items() if key not in ("report_id", "pubmed_id")} for item in items]
+                response = self.add_filtered_articles(report_id, rows)
+                if "error" in response:
+                    raise RuntimeError(f"Failed to copy verdicts from {source_report_id}: {response['error']}")
+                copied += len(rows)
+            if not last_key:
+                return copied
+
+    def get_all_articles(self, report_id):
+        """Read every article item of a report, following Query pagination."""
+        articles = []
+        last_key = None
+        while True:
+            items, last_key = self.query_articles(report_id, exclusive_start_key=last_key)
+            articles.extend(items)
+            if not last_key:
+                return articles
+
+    def iter_article_pages(self, report_id, **query_options):
+        """Yield a report's article items one Query page at a time."""
+        last_key = None
+        while True:
+            items, last_key = self.query_articles(report_id, exclusive_start_key=last_key, **query_options)
+            if items:
+                yield items
+            if not last_key:
+                return
+
+    def iter_articles_with_relevance(self, report_id, relevance):
+        """Pages of the article items whose Relevance is `relevance` (e.g. "Pending")."""
+        return self.iter_article_pages(
+            report_id,
+            FilterExpression="#relevance = :relevance",
+            ExpressionAttributeNames={"#relevance": "Relevance"},
+            ExpressionAttributeValues={":relevance": relevance}
+        )
+
+    def get_articles(self, report_id, pubmed_ids):
+        """
+        Read the article items of `pubmed_ids` with BatchGetItem, 100 keys at a time,
+        retrying UnprocessedKeys. Missing items are left out; the order is not kept.
+        """
+        table_name = self.articles_table.name
+        pubmed_ids = list(dict.fromkeys(str(pubmed_id) for pubmed_id in pubmed_ids))
+        items = []
+        for i in range(0, len(pubmed_ids), BATCH_GET_SIZE):
+            request_items = {table_name: {"Keys": [
+                {"report_id": report_id, "pubmed_id": pubmed_id} for pubmed_id in pubmed_ids[i:i + BATCH_GET_SIZE]
+            ]}}
+            for attempt in range(Config.DYNAMODB_MAX_RETRIES + 1):
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                items.extend(response.get("Responses", {}).get(table_name, []))
+                request_items = response.get("UnprocessedKeys") or {}
+                if not request_items:
+                    break
+                if attempt == Config.DYNAMODB_MAX_RETRIES:
+                    raise RuntimeError(f"{len(request_items[table_name]['Keys'])} articles still unprocessed for {report_id}")
+                metrics.count("dynamodb_retries", table_name)
+                time.sleep(min(0.05 * (2 ** attempt), 5) * random.uniform(0.5, 1.5))
+        return items
+
+    def batch_write_articles(self, report_id: str, articles: list):
+        """
+        Write one item per article with BatchWriteItem, 25 at a time, retrying any
+        UnprocessedItems with jittered exponential backoff.
+
+        Returns the number of items written.
+        """
+        # A single BatchWriteItem call may not contain the same key twice
+        items = {
+            str(article["PubMedID"]): to_dynamo({**article, "report_id": report_id, "pubmed_id": str(article["PubMedID"])})
+            for article in articles
+        }
+        items = list(items.values())
+        table_name = self.articles_table.name
+
+        for i in range(0, len(items), BATCH_WRITE_SIZE):
+            request_items = {table_name: [{"PutRequest": {"Item": item}} for item in items[i:i + BATCH_WRITE_SIZE]]}
+            for attempt in range(Config.DYNAMODB_MAX_RETRIES + 1):
+                response = self.dynamodb.batch_write_item(RequestItems=request_items)
+                request_items = response.get("UnprocessedItems") or {}
+                if not request_items:
+                    break
+                if attempt == Config.DYNAMODB_MAX_RETRIES:
+                    raise RuntimeError(f"{len(request_items[table_name])} articles still unprocessed for {report_id}")
+                metrics.count("dynamodb_retries", table_name)
+                time.sleep(min(0.05 * (2 ** attempt), 5) * random.uniform(0.5, 1.5))
+
+        return len(items)
+
     def add_filtered_articles(self, report_id: str, new_articles: list):
         """Append new filtered articles to an existing report."""
         try:
-            response = self.table.update_item(
+            written = self.batch_write_articles(report_id, new_articles)
+            # The written article items double as the job's checkpoint
+            self.table.update_item(
                 Key={"report_id": report_id},
-                UpdateExpression="SET filtered_articles = list_append(filtered_articles, :new_articles)",
-                ExpressionAttributeValues={
-                    ":new_articles": new_articles
-                },
-                ReturnValues="UPDATED_NEW"
+                UpdateExpression="SET checkpoint_at = :now ADD article_count :n",
+                ExpressionAttributeValues={":n": written, ":now": datetime.now().isoformat()}
             )
-            return response.get("Attributes", {})
-        except (BotoCoreError, ClientError) as e:
+            return {"message": "Articles added", "written": written}
+        except (BotoCoreError, ClientError, RuntimeError) as e:
             return {"error": str(e)}
 
-    def update_genes_for_article(self, report_id: str, pubmed_id: str, new_genes: list):
-        """Update genes for a specific article inside filtered_articles."""
-        try:
-            report = self.get_report(report_id)
-            if not report:
-                return {"error": "Report not found"}
+    def save_checkpoint_ids(self, report_id: str, pubmed_ids: list):
+        """Checkpoint the resolved PMID list (zlib-compressed to stay far below the item size limit)."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET resolved_ids = :ids, resolved_count = :n",
+            ExpressionAttributeValues={
+                ":ids": zlib.compress(",".join(pubmed_ids).encode("utf-8")),
+                ":n": len(pubmed_ids)
+            }
+        )
 
-            articles = report.get("filtered_articles", [])
+    @staticmethod
+    def get_checkpoint_ids(report):
+        """The PMID list checkpointed on a report header, or None if the job never got that far."""
+        resolved_ids = report.get("resolved_ids") if report else None
+        if resolved_ids is None:
+            return None
+        # boto3 wraps binary attributes in a Binary object
+        data = zlib.decompress(getattr(resolved_ids, "value", resolved_ids)).decode("utf-8")
+        return data.split(",") if data else []
 
-            # Find the article that matches pubmed_id
-            for article in articles:
-                if article["pubmedId"] == pubmed_id:
-                    article["genes_found"] = list(set(article.get("genes_found", []) + new_genes))
-                    break
+    def get_completed_pubmed_ids(self, report_id: str):
+        """
+        PMIDs of a report that already have a verdict (Error rows are retried on resume)
+        or are waiting for one in a Batch API job (Pending rows, see BulkPipeline).
+        """
+        completed = set()
+        last_key = None
+        while True:
+            items, last_key = self.query_articles(
+                report_id, exclusive_start_key=last_key,
+                ProjectionExpression="pubmed_id, Relevance"
+            )
+            completed.update(item["pubmed_id"] for item in items if item.get("Relevance") != "Error")
+            if not last_key:
+                return completed
+
+    def count_articles(self, report_id: str, relevance: str = None):
+        """Number of article items of a report (only those with `relevance`, when given)."""
+        count = 0
+        last_key = None
+        while True:
+            params = {"KeyConditionExpression": "report_id = :rid", "ExpressionAttributeValues": {":rid": report_id}, "Select": "COUNT"}
+            if relevance:
+                params["FilterExpression"] = "#relevance = :relevance"
+                params["ExpressionAttributeNames"] = {"#relevance": "Relevance"}
+                params["ExpressionAttributeValues"][":relevance"] = relevance
+            if last_key:
+                params["ExclusiveStartKey"] = last_key
+            response = self.articles_table.query(**params)
+            count += response["Count"]
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return count
+
+    def finish_report(self, report_id: str, status: str):
+        """Set the final status together with the exact number of stored articles."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET #status = :status, article_count = :n, finished_at = :now",
+            ExpressionAttributeValues={
+                ":status": status,
+                ":n": self.count_articles(report_id),
+                ":now": datetime.now().isoformat()
+            },
+            ExpressionAttributeNames={"#status": "status"}
+        )
+        return {"message": "Report finished"}
 
-            # Update the filtered_articles field in DynamoDB
-            response = self.table.update_item(
+    def find_unfinished_reports(self):
+        """Headers of reports left in processing/queued, e.g. by a worker that was stopped (startup only: scans)."""
+        reports = []
+        params = {
+            "FilterExpression": "#status IN (:processing, :queued)",
+            "ProjectionExpression": "report_id, #status, worker_id, created_at, checkpoint_at",
+            "ExpressionAttributeNames": {"#status": "status"},
+            "ExpressionAttributeValues": {":processing": "processing", ":queued": "queued"},
+        }
+        while True:
+            response = self.table.scan(**params)
+            reports.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return reports
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def claim_report(self, report_id: str, worker_id: str, previous_worker_id: str = None):
+        """
+        Take ownership of a report for `worker_id`, provided nobody else claimed it
+        since `previous_worker_id` was read. Returns True when the claim succeeded.
+        """
+        if previous_worker_id is None:
+            condition = "attribute_not_exists(worker_id)"
+            values = {":me": worker_id, ":processing": "processing"}
+        else:
+            condition = "worker_id = :previous"
+            values = {":me": worker_id, ":processing": "processing", ":previous": previous_worker_id}
+        try:
+            self.table.update_item(
+                Key={"report_id": report_id},
+                UpdateExpression="SET worker_id = :me, #status = :processing",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def start_job(self, report_id: str, worker_id: str):
+        """
+        Mark the start of `worker_id`'s job for the report (see RESUME_STALE_SECONDS).
+
+        Only succeeds while the report is still owned by `worker_id` (set when it was
+        created or claimed); returns False when another process took it over while the
+        job was queued, in which case the job must not run.
+        """
+        try:
+            self.table.update_item(
                 Key={"report_id": report_id},
-                UpdateExpression="SET filtered_articles = :articles",
-                ExpressionAttributeValues={":articles": articles},
+                UpdateExpression="SET checkpoint_at = :now",
+                ConditionExpression="worker_id = :me",
+                ExpressionAttributeValues={":me": worker_id, ":now": datetime.now().isoformat()}
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def update_genes_for_article(self, report_id: str, pubmed_id: str, new_genes: list):
+        """Update genes for a specific article item."""
+        try:
+            response = self.articles_table.get_item(Key={"report_id": report_id, "pubmed_id": str(pubmed_id)})
+            article = response.get("Item")
+            if not article:
+                return {"error": "Article not found"}
+
+            genes_found = list(set(article.get("genes_found", []) + new_genes))
+
+            response = self.articles_table.update_item(
+                Key={"report_id": report_id, "pubmed_id": str(pubmed_id)},
+                UpdateExpression="SET genes_found = :genes",
+                ExpressionAttributeValues={":genes": genes_found},
                 ReturnValues="UPDATED_NEW"
             )
 
@@ -115,36 +728,94 @@ class ReportService:
 
     def update_report(self, report_id, analyzed_results):
         """Update the report in DynamoDB with analyzed results"""
+        result = self.add_filtered_articles(report_id, analyzed_results)
+        if "error" in result:
+            return result
+        return {"message": "Report updated"}
+
+    def record_reused_verdicts(self, report_id, reused_from, verdict_dates=True):
+        """Note on the header which earlier reports (and date ranges) the report was assembled from."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET reused_from = :reused, verdict_dates = :dated",
+            ExpressionAttributeValues={":reused": reused_from, ":dated": verdict_dates}
+        )
+
+    def record_bulk_batch(self, report_id, batch_id, status):
+        """Track a Batch API job of a bulk report ("submitted", then "collected") in its header's bulk_batches map."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET bulk_batches = if_not_exists(bulk_batches, :empty)",
+            ExpressionAttributeValues={":empty": {}}
+        )
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET bulk_batches.#batch = :status",
+            ExpressionAttributeNames={"#batch": batch_id},
+            ExpressionAttributeValues={":status": status}
+        )
+
+    def record_bulk_round(self, report_id, round_number):
+        """Note how many times a bulk report's failed Batch API requests have been resubmitted."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET bulk_round = :round",
+            ExpressionAttributeValues={":round": round_number}
+        )
+
+    def touch_checkpoint(self, report_id):
+        """Show that the report's job is still alive (see RESUME_STALE_SECONDS) without writing articles."""
+        self.table.update_item(
+            Key={"report_id": report_id},
+            UpdateExpression="SET checkpoint_at = :now",
+            ExpressionAttributeValues={":now": datetime.now().isoformat()}
+        )
+
+    def record_llm_tiers(self, report_id, tiers):
+        """Store the per-tier LLM article counts, calls, tokens and latencies of the report's analysis."""
         try:
             self.table.update_item(
                 Key={"report_id": report_id},
-                UpdateExpression="SET filtered_articles = :articles",
-                ExpressionAttributeValues={":articles": analyzed_results}
+                UpdateExpression="SET llm_tiers = :tiers",
+                ExpressionAttributeValues={":tiers": to_dynamo(tiers)}
             )
-            return {"message": "Report updated"}
         except Exception as e:
-            return {"error": str(e)}
+            print(f"Error recording LLM tiers for {report_id}: {str(e)}")
+
+    def record_metrics(self, report_id, report_metrics):
+        """Store the stage timings and request, token, cost and capacity counters of the report's analysis."""
+        try:
+            self.table.update_item(
+                Key={"report_id": report_id},
+                UpdateExpression="SET #metrics = :metrics",
+                ExpressionAttributeNames={"#metrics": "metrics"},  # Reserved word
+                ExpressionAttributeValues={":metrics": to_dynamo(report_metrics)}
+            )
+        except Exception as e:
+            print(f"Error recording metrics for {report_id}: {str(e)}")
 
     def update_status(self, report_id, status):
         """Update the status of the report"""
         try:
             self.table.update_item(
                 Key={"report_id": report_id},
-                UpdateExpression="SET status = :status",
-                ExpressionAttributeValues={":status": status}
+                UpdateExpression="SET #status = :status",
+                ExpressionAttributeValues={":status": status},
+                ExpressionAttributeNames={"#status": "status"}
             )
             return {"message": "Status updated"}
         except Exception as e:
             return {"error": str(e)}
 
     def update_report_and_status(self, report_id, analyzed_results, status):
-        """Update both filtered articles and status in a single DynamoDB request"""
+        """Write the analyzed articles, then update the article count and status in one header update"""
         try:
+            written = self.batch_write_articles(report_id, analyzed_results)
             self.table.update_item(
                 Key={"report_id": report_id},
-                UpdateExpression="SET filtered_articles = :articles, #status = :status",
+                UpdateExpression="SET #status = :status ADD article_count :n",
                 ExpressionAttributeValues={
-                    ":articles": analyzed_results,
+                    ":n": written,
                     ":status": status
                 },
                 ExpressionAttributeNames={  # 🔹 Use this to escape reserved words
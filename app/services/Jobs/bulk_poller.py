@@ -0,0 +1,89 @@
+import atexit
+import threading
+from app.config import Config
+
+
+class BulkPoller:
+    """
+    Watches the Batch API jobs of bulk reports from a single background thread.
+
+    A bulk report's analysis job submits its batches and returns (see BulkPipeline),
+    so no executor worker is held for the hours a batch can take. Every `poll_seconds`
+    the poller calls `poll_report(report_id)` for each watched report, which collects
+    finished batches and touches the report's checkpoint; the report is dropped once
+    that returns True. A failing poll is retried on the next tick. On shutdown the
+    watched reports are handed to `on_requeue`, like the executor's unfinished jobs.
+    """
+
+    def __init__(self, poll_seconds=None):
+        self.poll_seconds = poll_seconds if poll_seconds is not None else Config.LLM_BULK_POLL_SECONDS
+        self.poll_report = None
+        self.on_requeue = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.reports = set()
+        self.thread = None
+        self.counters = {"polls": 0, "failed_polls": 0, "finished": 0, "requeued": 0}
+
+    def init_app(self, app):
+        self.poll_seconds = app.config.get("LLM_BULK_POLL_SECONDS", self.poll_seconds)
+        atexit.register(self.shutdown)
+
+    def watch(self, report_id):
+        """Poll `report_id` from now on (starting the thread on first use)."""
+        with self.lock:
+            if self.stop_event.is_set():
+                return
+            self.reports.add(report_id)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="bulk-poller", daemon=True)
+                self.thread.start()
+
+    def is_watching(self, report_id):
+        with self.lock:
+            return report_id in self.reports
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_seconds):
+            self.poll_once()
+
+    def poll_once(self):
+        with self.lock:
+            reports = sorted(self.reports)
+        for report_id in reports:
+            if self.stop_event.is_set():
+                return
+            try:
+                done = self.poll_report(report_id)
+                outcome = "polls"
+            except Exception as e:
+                print(f"Polling bulk report {report_id} failed: {e}")
+                done, outcome = False, "failed_polls"
+            with self.lock:
+                self.counters[outcome] += 1
+                if done:
+                    self.reports.discard(report_id)
+                    self.counters["finished"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"watching": len(self.reports), "poll_seconds": self.poll_seconds, **self.counters}
+
+    def shutdown(self, timeout=None):
+        """Stop polling and hand the watched reports back (their batches keep running at the provider)."""
+        with self.lock:
+            if self.stop_event.is_set():
+                return
+            self.stop_event.set()
+            reports = list(self.reports)
+            self.reports.clear()
+        if self.thread is not None:
+            self.thread.join(timeout if timeout is not None else Config.JOB_SHUTDOWN_TIMEOUT)
+        for report_id in reports:
+            with self.lock:
+                self.counters["requeued"] += 1
+            if self.on_requeue is not None:
+                try:
+                    self.on_requeue(report_id)
+                except Exception as e:
+                    print(f"Could not re-queue bulk report {report_id}: {e}")
@@ -0,0 +1,155 @@
+import atexit
+import queue
+import threading
+import uuid
+from collections import namedtuple
+from app.config import Config
+
+# Identifies this process as the owner of the reports it is working on
+WORKER_ID = uuid.uuid4().hex
+
+Job = namedtuple("Job", ["job_id", "target", "args", "kwargs"])
+
+# Tells a worker thread to exit
+_STOP = object()
+
+
+class JobQueueFull(Exception):
+    """Raised by `JobExecutor.submit` when no more jobs can be admitted."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobExecutor:
+    """
+    Bounded in-process executor for background analysis jobs.
+
+    A fixed number of worker threads take jobs from a bounded queue; once the queue
+    is full `submit` raises JobQueueFull instead of starting yet another thread.
+    On shutdown, jobs that have not started are handed to `on_requeue` so they can
+    be picked up again by the next process, and running jobs get `shutdown_timeout`
+    seconds to finish before they are handed over as well.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, shutdown_timeout=None):
+        self.max_workers = max_workers or Config.JOB_WORKERS
+        self.max_queue = max_queue or Config.JOB_QUEUE_SIZE
+        self.shutdown_timeout = shutdown_timeout if shutdown_timeout is not None else Config.JOB_SHUTDOWN_TIMEOUT
+        self.on_requeue = None
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.workers = []
+        self.lock = threading.Lock()
+        self.accepting = True
+        self.running_jobs = set()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "requeued": 0}
+
+    def init_app(self, app):
+        self.max_workers = app.config.get("JOB_WORKERS", self.max_workers)
+        self.max_queue = app.config.get("JOB_QUEUE_SIZE", self.max_queue)
+        self.shutdown_timeout = app.config.get("JOB_SHUTDOWN_TIMEOUT", self.shutdown_timeout)
+        if not self.workers:
+            self.queue = queue.Queue(maxsize=self.max_queue)
+        atexit.register(self.shutdown)
+
+    def _start_workers(self):
+        # Started on first use so processes that never run jobs (e.g. the reloader parent) stay idle
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, name=f"job-worker-{len(self.workers)}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def is_active(self, job_id):
+        """True while `job_id` is queued or running in this process."""
+        with self.lock:
+            return job_id in self.running_jobs or any(job.job_id == job_id for job in list(self.queue.queue) if job is not _STOP)
+
+    def has_capacity(self):
+        return self.accepting and not self.queue.full()
+
+    def reject(self):
+        """Count a request turned away before `submit` and return the error to report."""
+        with self.lock:
+            self.counters["rejected"] += 1
+        return JobQueueFull(Config.JOB_RETRY_AFTER)
+
+    def submit(self, job_id, target, *args, **kwargs):
+        """Queue `target(*args, **kwargs)`; raises JobQueueFull when the queue is full or shutting down."""
+        with self.lock:
+            if not self.accepting:
+                self.counters["rejected"] += 1
+                raise JobQueueFull(Config.JOB_RETRY_AFTER)
+            self._start_workers()
+            try:
+                self.queue.put_nowait(Job(job_id, target, args, kwargs))
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise JobQueueFull(Config.JOB_RETRY_AFTER)
+            self.counters["submitted"] += 1
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+            with self.lock:
+                self.running_jobs.add(job.job_id)
+            try:
+                job.target(*job.args, **job.kwargs)
+                outcome = "completed"
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+                outcome = "failed"
+            finally:
+                with self.lock:
+                    self.running_jobs.discard(job.job_id)
+            with self.lock:
+                self.counters[outcome] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "running": len(self.running_jobs),
+                "workers": self.max_workers,
+                "queue_capacity": self.max_queue,
+                "accepting": self.accepting,
+                **self.counters,
+            }
+
+    def shutdown(self, timeout=None):
+        """Stop admitting jobs, hand back queued ones and wait for running ones to finish."""
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        with self.lock:
+            if not self.accepting:
+                return
+            self.accepting = False
+
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self._requeue(job.job_id)
+
+        for _ in self.workers:
+            self.queue.put(_STOP)
+        for worker in self.workers:
+            worker.join(timeout)
+
+        # Jobs that did not finish in time are abandoned with the process
+        with self.lock:
+            unfinished = list(self.running_jobs)
+        for job_id in unfinished:
+            self._requeue(job_id)
+        print(f"Job executor stopped: {self.stats()}")
+
+    def _requeue(self, job_id):
+        with self.lock:
+            self.counters["requeued"] += 1
+        if self.on_requeue is not None:
+            try:
+                self.on_requeue(job_id)
+            except Exception as e:
+                print(f"Could not re-queue job {job_id}: {e}")
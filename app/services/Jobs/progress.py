@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from app.config import Config
+
+# Row fields pushed with each article event; clients read abstracts through GET /api/reports/<id>
+ARTICLE_EVENT_FIELDS = ["PubMedID", "Title", "Journal", "Relevance", "GeneVariants", "Reason", "Rule", "PrerankScore", "Tier"]
+
+
+class Subscription:
+    """One listener on a report's events; `events` yields (event, data) tuples."""
+
+    def __init__(self, report_id, max_size):
+        self.report_id = report_id
+        self.events = queue.Queue(maxsize=max_size)
+        self.dropped = False
+
+
+class ProgressTracker:
+    """
+    In-process progress of running analyses, fanned out to subscribers (the SSE endpoint).
+
+    The pipeline reports what it has done (`set_ids_found`, `add_fetched`, `add_results`,
+    `finish`) and every change is pushed to the report's subscribers as a `progress`
+    event, with one `article` event per persisted verdict. Finished reports are kept for
+    PROGRESS_RETENTION_SECONDS so late subscribers still get the final state.
+    A subscriber that falls more than SSE_QUEUE_SIZE events behind is dropped rather
+    than slowing down the pipeline.
+    """
+
+    def __init__(self, retention_seconds=None, subscriber_queue_size=None):
+        self.retention_seconds = retention_seconds if retention_seconds is not None else Config.PROGRESS_RETENTION_SECONDS
+        self.subscriber_queue_size = subscriber_queue_size or Config.SSE_QUEUE_SIZE
+        self.lock = threading.Lock()
+        self.reports = {}
+        self.subscribers = {}
+
+    def start(self, report_id):
+        with self.lock:
+            self._purge_finished()
+            self.reports[report_id] = {
+                "report_id": report_id,
+                "status": "processing",
+                "ids_found": None,
+                "already_classified": 0,
+                "fetched": 0,
+                "classified": 0,
+                "relevant_so_far": 0,
+                "eta_seconds": None,
+                "started_at": time.monotonic(),
+                "finished_at": None,
+            }
+            self._publish_progress(report_id)
+
+    def set_ids_found(self, report_id, ids_found, already_classified=0):
+        """`already_classified` counts verdicts persisted by an earlier run of a resumed report."""
+        self._update(report_id, ids_found=ids_found, already_classified=already_classified)
+
+    def add_fetched(self, report_id, count):
+        with self.lock:
+            state = self.reports.get(report_id)
+            if state is None:
+                return
+            state["fetched"] += count
+            self._publish_progress(report_id)
+
+    def add_results(self, report_id, rows):
+        """Count persisted verdicts and push each of them to subscribers."""
+        with self.lock:
+            state = self.reports.get(report_id)
+            if state is None:
+                return
+            state["classified"] += len(rows)
+            state["relevant_so_far"] += sum(1 for row in rows if row.get("Relevance") == "Relevant")
+            for row in rows:
+                self._publish(report_id, "article", {field: row[field] for field in ARTICLE_EVENT_FIELDS if field in row})
+            self._publish_progress(report_id)
+
+    def finish(self, report_id, status):
+        with self.lock:
+            state = self.reports.get(report_id)
+            if state is None:
+                return
+            state["status"] = status
+            state["eta_seconds"] = 0 if status == "complete" else None
+            state["finished_at"] = time.monotonic()
+            self._publish_progress(report_id)
+            self._publish(report_id, "done", {"report_id": report_id, "status": status})
+
+    def snapshot(self, report_id):
+        with self.lock:
+            state = self.reports.get(report_id)
+            return self._public_state(state) if state else None
+
+    def subscribe(self, report_id):
+        """
+        Start listening to a report tracked by this process; returns None if it is not.
+        The current progress (and `done`, if finished) is queued for the new subscriber first.
+        """
+        with self.lock:
+            state = self.reports.get(report_id)
+            if state is None:
+                return None
+            subscription = Subscription(report_id, self.subscriber_queue_size)
+            subscription.events.put_nowait(("progress", self._public_state(state)))
+            if state["finished_at"] is not None:
+                subscription.events.put_nowait(("done", {"report_id": report_id, "status": state["status"]}))
+            else:
+                self.subscribers.setdefault(report_id, []).append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            listeners = self.subscribers.get(subscription.report_id, [])
+            if subscription in listeners:
+                listeners.remove(subscription)
+            if not listeners:
+                self.subscribers.pop(subscription.report_id, None)
+
+    def _update(self, report_id, **changes):
+        with self.lock:
+            state = self.reports.get(report_id)
+            if state is None:
+                return
+            state.update(changes)
+            self._publish_progress(report_id)
+
+    def _publish_progress(self, report_id):
+        state = self.reports[report_id]
+        state["eta_seconds"] = self._eta(state)
+        self._publish(report_id, "progress", self._public_state(state))
+
+    def _publish(self, report_id, event, data):
+        listeners = self.subscribers.get(report_id, [])
+        for subscription in list(listeners):
+            try:
+                subscription.events.put_nowait((event, data))
+            except queue.Full:
+                subscription.dropped = True
+                listeners.remove(subscription)
+        if event == "done":
+            self.subscribers.pop(report_id, None)
+
+    @staticmethod
+    def _eta(state):
+        if state["finished_at"] is not None:
+            return state["eta_seconds"]
+        if not state["ids_found"] or not state["classified"]:
+            return None
+        elapsed = time.monotonic() - state["started_at"]
+        remaining = state["ids_found"] - state["already_classified"] - state["classified"]
+        return round(max(remaining, 0) * elapsed / state["classified"], 1)
+
+    @staticmethod
+    def _public_state(state):
+        public = {key: value for key, value in state.items() if key not in ("started_at", "finished_at")}
+        public["classified"] = state["classified"] + state["already_classified"]
+        public["elapsed_seconds"] = round((state["finished_at"] or time.monotonic()) - state["started_at"], 1)
+        return public
+
+    def _purge_finished(self):
+        now = time.monotonic()
+        for report_id, state in list(self.reports.items()):
+            if state["finished_at"] is not None and now - state["finished_at"] > self.retention_seconds:
+                del self.reports[report_id]
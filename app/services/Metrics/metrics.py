@@ -0,0 +1,189 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Counter name -> (label name, help text). Every counter has one label.
+COUNTERS = {
+    "ncbi_requests": ("endpoint", "E-utilities requests sent, including retries."),
+    "ncbi_retries": ("endpoint", "E-utilities requests retried after a 429, 5xx or connection error."),
+    "llm_calls": ("model", "Answered chat completion requests."),
+    "llm_retries": ("model", "Chat completion requests retried after a rate-limit or server error."),
+    "llm_prompt_tokens": ("model", "Prompt tokens reported by the API."),
+    "llm_cached_tokens": ("model", "Prompt tokens served from the provider's prompt cache."),
+    "llm_completion_tokens": ("model", "Completion tokens reported by the API."),
+    "llm_cost_usd": ("model", "Estimated LLM cost in US dollars."),
+    "dynamodb_requests": ("operation", "DynamoDB API calls."),
+    "dynamodb_consumed_capacity": ("table", "DynamoDB capacity units consumed."),
+    "dynamodb_retries": ("table", "BatchWriteItem calls retried for unprocessed items."),
+}
+
+# The metrics of the report being analyzed on this thread (see `report_metrics`)
+current_report_metrics = contextvars.ContextVar("current_report_metrics", default=None)
+# False while nothing should be recorded (see `paused`)
+recording = contextvars.ContextVar("metrics_recording", default=True)
+
+
+class Metrics:
+    """
+    Timing spans per stage (calls, total and slowest seconds) and labelled counters.
+
+    Spans of concurrent stages overlap, so their seconds add up to more than the wall
+    time of a report.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            totals = self.spans.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+
+    def count(self, name, label, amount=1):
+        with self.lock:
+            values = self.counters.setdefault(name, {})
+            values[label] = values.get(label, 0) + amount
+
+    def add_stats(self, stats):
+        """Add the totals of an earlier `stats()` (e.g. read back from a report header) to these."""
+        with self.lock:
+            for stage, stored in (stats.get("spans") or {}).items():
+                totals = self.spans.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+                totals["calls"] += int(stored["calls"])
+                totals["seconds"] += float(stored["seconds"])
+                totals["max_seconds"] = max(totals["max_seconds"], float(stored["max_seconds"]))
+            for name, stored in (stats.get("counters") or {}).items():
+                values = self.counters.setdefault(name, {})
+                for label, value in stored.items():
+                    value = float(value) if value % 1 else int(value)
+                    values[label] = values.get(label, 0) + value
+
+    def stats(self):
+        with self.lock:
+            spans = {stage: dict(totals) for stage, totals in self.spans.items()}
+            counters = {name: dict(values) for name, values in self.counters.items()}
+        for totals in spans.values():
+            totals["seconds"] = round(totals["seconds"], 3)
+            totals["max_seconds"] = round(totals["max_seconds"], 3)
+        for values in counters.values():
+            for label, value in values.items():
+                if isinstance(value, float):
+                    values[label] = round(value, 6)
+        return {"spans": spans, "counters": counters}
+
+
+# Totals of this process, exported on /metrics
+process_metrics = Metrics()
+
+
+def observe(stage, seconds):
+    """Record one `stage` span of `seconds` for the process and the current report."""
+    if not recording.get():
+        return
+    process_metrics.observe(stage, seconds)
+    report = current_report_metrics.get()
+    if report is not None:
+        report.observe(stage, seconds)
+
+
+def count(name, label, amount=1):
+    """Add `amount` to counter `name` (one of COUNTERS) for the process and the current report."""
+    if not recording.get():
+        return
+    process_metrics.count(name, label, amount)
+    report = current_report_metrics.get()
+    if report is not None:
+        report.count(name, label, amount)
+
+
+@contextmanager
+def span(stage):
+    started_at = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(stage, time.monotonic() - started_at)
+
+
+def timed(stage):
+    """Decorator recording a `stage` span for every call of the function."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def paused():
+    """Record no spans or counters for anything run in this context (e.g. a dry run's local stages)."""
+    token = recording.set(False)
+    try:
+        yield
+    finally:
+        recording.reset(token)
+
+
+@contextmanager
+def report_metrics():
+    """Collect the spans and counters of everything run in this context into a new Metrics."""
+    report = Metrics()
+    token = current_report_metrics.set(report)
+    try:
+        yield report
+    finally:
+        current_report_metrics.reset(token)
+
+
+def in_current_context(function):
+    """
+    Wrap `function` so it runs with this thread's context (and so counts towards the
+    current report) on whatever thread calls it. Used for thread and executor targets.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(metrics=None, jobs=None, prefix="unsw"):
+    """Prometheus text exposition (version 0.0.4) of `metrics` and the job executor `jobs` stats."""
+    stats = (metrics or process_metrics).stats()
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    for stage, totals in sorted(stats["spans"].items()):
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{escape_label(stage)}"}} {totals["seconds"]}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{escape_label(stage)}"}} {totals["calls"]}')
+
+    for name, (label_name, help_text) in COUNTERS.items():
+        lines.append(f"# HELP {prefix}_{name}_total {help_text}")
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        for label, value in sorted(stats["counters"].get(name, {}).items()):
+            lines.append(f'{prefix}_{name}_total{{{label_name}="{escape_label(label)}"}} {value}')
+
+    if jobs is not None:
+        for name in ("queued", "running"):
+            lines.append(f"# HELP {prefix}_jobs_{name} Analysis jobs {name}.")
+            lines.append(f"# TYPE {prefix}_jobs_{name} gauge")
+            lines.append(f"{prefix}_jobs_{name} {jobs[name]}")
+        lines.append(f"# HELP {prefix}_jobs_total Analysis jobs by outcome.")
+        lines.append(f"# TYPE {prefix}_jobs_total counter")
+        for outcome in ("submitted", "completed", "failed", "rejected", "requeued"):
+            lines.append(f'{prefix}_jobs_total{{outcome="{outcome}"}} {jobs[outcome]}')
+    return "\n".join(lines) + "\n"
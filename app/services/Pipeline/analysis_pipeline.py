@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+from app.config import Config
+from app.services.Metrics import metrics
+
+# Marks the end of a stage's output
+END_OF_STREAM = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage has already failed."""
+
+
+class AnalysisPipeline:
+    """
+    Streaming fetch -> classify -> persist execution of one report.
+
+    efetch batches (parsed incrementally) feed the classifier, whose verdicts feed
+    the DynamoDB writer. Stages run on their own threads and are connected by bounded
+    queues, so classification starts as soon as the first batch is parsed and only a
+    few batches are ever held in memory.
+
+    The resolved PMID list is checkpointed on the report header and every persisted
+    chunk of verdicts is durable, so running the pipeline again for the same report
+    only fetches and classifies the PMIDs that have no verdict yet.
+
+    When a `progress` tracker is given, stage counts and every persisted verdict are
+    reported to it as they happen. Stage threads run in the caller's context, so their
+    spans and counters go to the caller's report metrics.
+    """
+
+    def __init__(self, filter_service, report_service, queue_size=None, classify_chunk_size=None, progress=None):
+        self.filter_service = filter_service
+        self.report_service = report_service
+        self.progress = progress
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.classify_chunk_size = classify_chunk_size or Config.PIPELINE_CLASSIFY_CHUNK
+        self.stop_event = threading.Event()
+        self.errors = []
+
+    def run(self, report_id, pubmed_request, criteria, query, give_reason=False, extract_genes=False,
+            search_requests=None, **classify_options):
+        """
+        Run every stage to completion and return the number of persisted results.
+
+        `search_requests` are the PubMed searches that make up the report (default: just
+        `pubmed_request`); a report partly built from earlier verdicts only searches the
+        date ranges those do not cover. Raises the first stage error, after all stages
+        have shut down.
+        """
+        started_at = time.monotonic()
+        classify_options["prerank_selection"] = self.rank_report(
+            report_id, pubmed_request, criteria, query, classify_options.get("prerank"), classify_options.get("rules"), search_requests
+        )
+        articles_queue = queue.Queue(maxsize=self.queue_size)
+        results_queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(
+                target=metrics.in_current_context(self._run_stage), name=f"{report_id}-fetch",
+                args=(self.fetch_stage, report_id, pubmed_request, articles_queue, search_requests)
+            ),
+            threading.Thread(
+                target=metrics.in_current_context(self._run_stage), name=f"{report_id}-classify",
+                args=(self.classify_stage, articles_queue, results_queue, criteria, query, give_reason, extract_genes, classify_options)
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+
+        persisted = self._run_stage(self.persist_stage, report_id, results_queue, started_at)
+
+        for stage in stages:
+            stage.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        print(f"Pipeline for {report_id} persisted {persisted} results in {time.monotonic() - started_at:.1f}s.")
+        return persisted
+
+    def _run_stage(self, stage, *args):
+        try:
+            return stage(*args)
+        except PipelineStopped:
+            return None
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+            return None
+
+    def _put(self, target_queue, item):
+        # Wake up regularly so a failure downstream never leaves us blocked on a full queue
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                target_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source_queue):
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                return source_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+    @metrics.timed("resolve_ids")
+    def resolve_report_ids(self, report_id, pubmed_request, search_requests=None):
+        """The report's PMID checkpoint, created by searching PubMed on the first run."""
+        pubmed_ids = self.report_service.get_checkpoint_ids(self.report_service.get_report_header(report_id))
+        if pubmed_ids is None:
+            pubmed_ids = []
+            for search_request in (search_requests if search_requests is not None else [pubmed_request]):
+                pubmed_ids.extend(self.filter_service.resolve_pubmed_ids(search_request))
+            pubmed_ids = list(dict.fromkeys(pubmed_ids))
+            if pubmed_ids:
+                self.report_service.save_checkpoint_ids(report_id, pubmed_ids)
+        return pubmed_ids
+
+    def resolve_remaining_ids(self, report_id, pubmed_request, search_requests=None):
+        """Use (or create) the report's PMID checkpoint and drop PMIDs that already have a verdict."""
+        pubmed_ids = self.resolve_report_ids(report_id, pubmed_request, search_requests)
+
+        # Verdicts persisted by an earlier run, or copied from earlier reports
+        completed = self.report_service.get_completed_pubmed_ids(report_id)
+        remaining = [pubmed_id for pubmed_id in pubmed_ids if pubmed_id not in completed]
+        if self.progress:
+            self.progress.set_ids_found(report_id, len(remaining) + len(completed), len(completed))
+        if completed:
+            print(f"{report_id}: {len(completed)} articles already classified, {len(remaining)} to go.")
+        return remaining
+
+    def rank_report(self, report_id, pubmed_request, criteria, query, prerank, rules=None, search_requests=None):
+        """
+        With `prerank`, score every article of the report's PMID checkpoint (already
+        classified ones included, so a resumed report keeps the same cut-off) and return
+        the PrerankSelection the classify chunks share; None otherwise.
+
+        This is a pass over the articles of its own before classification starts. With
+        ARTICLE_STORE_ENABLED the second pass reads them from the store instead of NCBI.
+        """
+        if not prerank:
+            return None
+        pubmed_ids = self.resolve_report_ids(report_id, pubmed_request, search_requests)
+        if not pubmed_ids:
+            return None
+        return self.filter_service.rank_articles(
+            self.filter_service.iter_pubmed_article_batches(pubmed_request, pubmed_ids), criteria, query, prerank, rules
+        )
+
+    def fetch_stage(self, report_id, pubmed_request, articles_queue, search_requests=None):
+        try:
+            pubmed_ids = self.resolve_remaining_ids(report_id, pubmed_request, search_requests)
+            for batch in self.filter_service.iter_pubmed_article_batches(pubmed_request, pubmed_ids):
+                if batch:
+                    if self.progress:
+                        self.progress.add_fetched(report_id, len(batch))
+                    self._put(articles_queue, batch)
+        finally:
+            if not self.stop_event.is_set():
+                self._put(articles_queue, END_OF_STREAM)
+
+    def classify_stage(self, articles_queue, results_queue, criteria, query, give_reason, extract_genes, classify_options):
+        # Articles whose classification failed, retried once everything else is done
+        failed = {}
+        try:
+            while True:
+                batch = self._get(articles_queue)
+                if batch is END_OF_STREAM:
+                    break
+                for i in range(0, len(batch), self.classify_chunk_size):
+                    chunk = batch[i:i + self.classify_chunk_size]
+                    results = self.filter_service.analyze_articles_with_LLM(
+                        chunk, criteria, query, give_reason, extract_genes, **classify_options
+                    )
+                    self._put_classified(results_queue, chunk, results, failed)
+
+            for round_number in range(Config.LLM_REQUEUE_ROUNDS):
+                if not failed:
+                    break
+                print(f"Re-queueing {len(failed)} articles that failed classification (round {round_number + 1}).")
+                retry = [article for article, _ in failed.values()]
+                failed = {}
+                for i in range(0, len(retry), self.classify_chunk_size):
+                    chunk = retry[i:i + self.classify_chunk_size]
+                    results = self.filter_service.analyze_articles_with_LLM(
+                        chunk, criteria, query, give_reason, extract_genes, **classify_options
+                    )
+                    self._put_classified(results_queue, chunk, results, failed)
+
+            # Still failing: record the error rows (a resumed job classifies them again)
+            if failed:
+                self._put(results_queue, [row for _, row in failed.values()])
+        finally:
+            if not self.stop_event.is_set():
+                self._put(results_queue, END_OF_STREAM)
+
+    def _put_classified(self, results_queue, chunk, results, failed):
+        """Pass successful rows on and set the failed ones (with their article) aside in `failed`."""
+        articles = {article["pubmed_id"]: article for article in chunk}
+        succeeded = []
+        for row in results:
+            if row.get("Relevance") == "Error":
+                failed[row["PubMedID"]] = (articles[row["PubMedID"]], row)
+            else:
+                succeeded.append(row)
+        if succeeded:
+            self._put(results_queue, succeeded)
+
+    def persist_stage(self, report_id, results_queue, started_at):
+        persisted = 0
+        while True:
+            results = self._get(results_queue)
+            if results is END_OF_STREAM:
+                return persisted
+            with metrics.span("persist"):
+                response = self.report_service.add_filtered_articles(report_id, results)
+            if "error" in response:
+                raise RuntimeError(f"Failed to persist results for {report_id}: {response['error']}")
+            if self.progress:
+                self.progress.add_results(report_id, results)
+            if persisted == 0:
+                print(f"First results for {report_id} persisted after {time.monotonic() - started_at:.1f}s.")
+            persisted += len(results)
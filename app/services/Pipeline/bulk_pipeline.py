@@ -0,0 +1,225 @@
+import time
+from app.config import Config
+from app.services.Metrics import metrics
+from app.services.Pipeline.analysis_pipeline import AnalysisPipeline
+from app.services.ArticleFilteration.classification_cache import ClassificationCache
+from app.services.ArticleFilteration.filter_logic import classification_cache
+from app.services.ArticleFilteration.bulk_classifier import FINAL_BATCH_STATUSES
+from app.services.ArticleFilteration.llm_usage import TierUsage
+from app.services.Jobs.job_executor import WORKER_ID
+
+# Relevance of the rows waiting for a Batch API verdict
+PENDING = "Pending"
+# Stored rows read back per BatchGetItem round when a batch's verdicts are persisted
+VERDICT_CHUNK = 1000
+
+
+def bulk_model(give_reason):
+    """Same models as analyze_articles_with_LLM, so the classification cache is shared."""
+    return Config.LLM_REASONING_MODEL if give_reason else "gpt-4o-mini"
+
+
+def stored_article(item):
+    """The article fields `result_row` needs, from a stored report row."""
+    return {
+        "pubmed_id": item["PubMedID"],
+        "title": item.get("Title"),
+        "abstract": item.get("Abstract"),
+        "journal": item.get("Journal"),
+        "date": item.get("Date"),
+    }
+
+
+class BulkPipeline(AnalysisPipeline):
+    """
+    Offline execution of one report through the Batch API, for large backfills.
+
+    `run` fetches the articles and runs them through the local stages (rules, gene
+    pre-screen, pre-ranking, classification cache); whatever they decide is persisted
+    right away. Every other article is stored as a Pending row and streamed into batch
+    jobs (see BulkClassifier), whose IDs are recorded on the report header as soon as
+    they exist. `run` does not wait for them: BulkPoller calls `poll` for the report
+    until it is done, and each poll touches the report's checkpoint so no other
+    process takes it over.
+
+    Batch answers are keyed by PubMed ID and mapped back to the stored Pending rows, so
+    nothing about the pending articles is kept in memory between polls. Failed requests
+    are resubmitted for LLM_REQUEUE_ROUNDS more batches and recorded as errors after that.
+
+    The cascade and batch_mode options only apply to interactive runs and are ignored.
+    """
+
+    def __init__(self, filter_service, report_service, bulk_classifier, progress=None):
+        super().__init__(filter_service, report_service, progress=progress)
+        self.bulk_classifier = bulk_classifier
+        # Set by `run` when the report has batches (or Pending rows) left for `poll`
+        self.waiting = False
+
+    def run(self, report_id, pubmed_request, criteria, query, give_reason=False, extract_genes=False,
+            search_requests=None, use_cache=None, rules=None, prerank=None, tier_usage=None, **ignored_options):
+        """Persist the local verdicts, submit the rest and return the number of rows persisted."""
+        started_at = time.monotonic()
+        model = bulk_model(give_reason)
+        if use_cache is None:
+            use_cache = Config.CLASSIFICATION_CACHE_ENABLED
+        prompt_extract_genes = extract_genes and not Config.LOCAL_GENE_EXTRACTION
+
+        prerank_selection = self.rank_report(report_id, pubmed_request, criteria, query, prerank, rules, search_requests)
+        # Batches of an earlier run of this report are left to `poll`, their articles already have Pending rows
+        header = self.report_service.get_report_header(report_id) or {}
+        open_batches = [batch_id for batch_id, status in (header.get("bulk_batches") or {}).items() if status != "collected"]
+        counts = {"persisted": 0, "pending": 0}
+
+        def pending_articles():
+            pubmed_ids = self.resolve_remaining_ids(report_id, pubmed_request, search_requests)
+            for batch in self.filter_service.iter_pubmed_article_batches(pubmed_request, pubmed_ids):
+                if not batch:
+                    continue
+                if self.progress:
+                    self.progress.add_fetched(report_id, len(batch))
+                plan = self.filter_service.prepare_classification(
+                    batch, criteria, query, give_reason, extract_genes, model, use_cache, rules, prerank,
+                    prerank_selection=prerank_selection
+                )
+                pending_ids = {article["pubmed_id"] for article in plan.pending}
+                counts["persisted"] += self.persist(report_id, self.filter_service.finish_classification(
+                    [article for article in batch if article["pubmed_id"] not in pending_ids], plan, []
+                ))
+                if plan.pending:
+                    # Stored before the request is written, so an interrupted submit is picked up by `poll`
+                    self.store_pending(report_id, plan)
+                    counts["pending"] += len(plan.pending)
+                    yield from plan.pending
+
+        batch_ids = self.bulk_classifier.submit(
+            report_id, pending_articles(), criteria, query, give_reason, prompt_extract_genes, model,
+            on_batch=lambda batch_id: self.report_service.record_bulk_batch(report_id, batch_id, "submitted")
+        )
+        if tier_usage and counts["pending"]:
+            tier_usage.recorder("bulk", counts["pending"])
+
+        self.waiting = bool(batch_ids or open_batches or self.report_service.count_articles(report_id, PENDING))
+        print(f"{report_id}: {counts['persisted']} articles decided locally, {counts['pending']} submitted in "
+              f"{len(batch_ids)} batches in {time.monotonic() - started_at:.1f}s.")
+        return counts["persisted"]
+
+    def store_pending(self, report_id, plan):
+        """Write Pending rows for `plan.pending`, keeping what `poll` needs to finish them."""
+        rows = []
+        for article in plan.pending:
+            row = self.filter_service.pending_row(article, plan.mentions.get(article["pubmed_id"]) if plan.local_genes else None)
+            if article["pubmed_id"] in plan.prerank_scores:
+                row["PrerankScore"] = plan.prerank_scores[article["pubmed_id"]]
+            rows.append(row)
+        # Not counted in article_count until the verdict replaces them
+        with metrics.span("persist"):
+            self.report_service.batch_write_articles(report_id, rows)
+
+    def poll(self, report_id):
+        """
+        One BulkPoller tick for `report_id`: touch its checkpoint, collect the batches that
+        have finished and, once none is open, resubmit or give up on the failed requests
+        and finish the report. Returns True when the report needs no more polling.
+        """
+        header = self.report_service.get_report_header(report_id)
+        if header is None or header.get("status") != "processing" or header.get("worker_id") not in (None, WORKER_ID):
+            return True  # Deleted, finished, handed back or taken over by another process
+        self.report_service.touch_checkpoint(report_id)
+
+        # The header keeps the report's totals, this poll adds to them
+        with metrics.report_metrics() as report_metrics:
+            report_metrics.add_stats(header.get("metrics") or {})
+            tier_usage = TierUsage()
+            tier_usage.add_stats(header.get("llm_tiers") or {})
+            try:
+                with metrics.span("bulk_poll"):
+                    done = self.collect(report_id, header, tier_usage.recorder("bulk", 0))
+            finally:
+                self.report_service.record_llm_tiers(report_id, tier_usage.stats())
+                self.report_service.record_metrics(report_id, report_metrics.stats())
+
+        if done:
+            self.report_service.finish_report(report_id, "complete")
+            if self.progress:
+                self.progress.finish(report_id, "complete")
+            print(f"Bulk analysis complete for report_id: {report_id}")
+        return done
+
+    def collect(self, report_id, header, usage=None):
+        """Persist the verdicts of finished batches; returns True once no article is left pending."""
+        options = header.get("options") or {}
+        criteria, query = header.get("criteria", ""), header.get("query", "")
+        give_reason, extract_genes = options.get("give_reason", False), options.get("extract_genes", False)
+        model = bulk_model(give_reason)
+        local_genes = extract_genes and Config.LOCAL_GENE_EXTRACTION
+        prompt_extract_genes = extract_genes and not local_genes
+
+        still_open = 0
+        for batch_id, status in (header.get("bulk_batches") or {}).items():
+            if status == "collected":
+                continue
+            batch = self.bulk_classifier.retrieve(batch_id)
+            if batch.status not in FINAL_BATCH_STATUSES:
+                still_open += 1
+                continue
+            verdicts = self.bulk_classifier.results(batch, usage)
+            fingerprint = ClassificationCache.fingerprint(criteria, query, model, give_reason, prompt_extract_genes)
+            persisted = self.persist_verdicts(report_id, verdicts, fingerprint, local_genes)
+            self.report_service.record_bulk_batch(report_id, batch_id, "collected")
+            print(f"Batch {batch_id} {batch.status}, {persisted} verdicts persisted for {report_id}.")
+        if still_open:
+            return False
+
+        pending = self.report_service.count_articles(report_id, PENDING)
+        if not pending:
+            return True
+        round_number = int(header.get("bulk_round", 0)) + 1
+        if round_number <= Config.LLM_REQUEUE_ROUNDS:
+            print(f"Resubmitting {pending} articles that failed in the Batch API (round {round_number}).")
+            # Recorded first, so a submit that keeps failing cannot resubmit forever
+            self.report_service.record_bulk_round(report_id, round_number)
+            self.bulk_classifier.submit(
+                report_id, self.stored_pending_articles(report_id), criteria, query, give_reason, prompt_extract_genes, model,
+                on_batch=lambda batch_id: self.report_service.record_bulk_batch(report_id, batch_id, "submitted")
+            )
+            return False
+
+        # Still failing: record the error rows (a resumed job classifies them again)
+        for items in self.report_service.iter_articles_with_relevance(report_id, PENDING):
+            self.persist(report_id, [self.filter_service.error_row(stored_article(item), "Batch request failed") for item in items])
+        return True
+
+    def stored_pending_articles(self, report_id):
+        for items in self.report_service.iter_articles_with_relevance(report_id, PENDING):
+            yield from (stored_article(item) for item in items)
+
+    def persist_verdicts(self, report_id, verdicts, fingerprint, local_genes):
+        """Replace the Pending rows answered in `verdicts` with their verdicts (failed ones stay Pending)."""
+        answered = [pubmed_id for pubmed_id, verdict in verdicts.items() if verdict is not None]
+        persisted = 0
+        for i in range(0, len(answered), VERDICT_CHUNK):
+            rows = []
+            for item in self.report_service.get_articles(report_id, answered[i:i + VERDICT_CHUNK]):
+                if item.get("Relevance") != PENDING:
+                    continue  # Persisted by an earlier poll
+                rows.append((item, self.filter_service.result_row(stored_article(item), verdicts[item["pubmed_id"]])))
+            if Config.CLASSIFICATION_CACHE_ENABLED:
+                classification_cache.put_many([row for _, row in rows], fingerprint)
+            for item, row in rows:
+                if local_genes and row["Relevance"] != "Error":
+                    row["GeneVariants"] = item.get("GeneVariants", "None")
+                if item.get("PrerankScore") is not None:
+                    row["PrerankScore"] = float(item["PrerankScore"])
+            persisted += self.persist(report_id, [row for _, row in rows])
+        return persisted
+
+    def persist(self, report_id, rows):
+        if not rows:
+            return 0
+        with metrics.span("persist"):
+            response = self.report_service.add_filtered_articles(report_id, rows)
+        if "error" in response:
+            raise RuntimeError(f"Failed to persist results for {report_id}: {response['error']}")
+        if self.progress:
+            self.progress.add_results(report_id, rows)
+        return len(rows)
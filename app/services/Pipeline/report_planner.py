@@ -0,0 +1,76 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from app.config import Config
+
+DATE_FORMAT = "%Y-%m-%d"
+ONE_DAY = timedelta(days=1)
+
+# A date range of the new report served by an earlier report's verdicts
+# (`dated` is False when the whole report is reused because its rows have no date)
+ReusedRange = namedtuple("ReusedRange", ["report_id", "start_date", "end_date", "dated"])
+# A date range no earlier report covers; it has to be searched and classified
+DateRange = namedtuple("DateRange", ["start_date", "end_date"])
+ReportPlan = namedtuple("ReportPlan", ["reused", "uncovered"])
+
+
+class ReportPlanner:
+    """
+    Plans a report as a set of earlier reports' verdicts plus the date ranges nobody
+    has analyzed yet, so extending a window by a week only classifies that week.
+
+    Only completed reports of the same query, criteria and flags are reused, and only
+    ones younger than DELTA_MAX_SOURCE_AGE_DAYS (PubMed keeps indexing older articles).
+    A report whose rows carry no article date can only be reused whole.
+    """
+
+    def __init__(self, report_service, max_source_age_days=None):
+        self.report_service = report_service
+        self.max_source_age_days = max_source_age_days if max_source_age_days is not None else Config.DELTA_MAX_SOURCE_AGE_DAYS
+
+    def plan(self, report_id, start_date, end_date, query, criteria, give_reason=False, extract_genes=False, rules=None, prerank=None, cascade=False):
+        created_after = None
+        if self.max_source_age_days > 0:
+            created_after = (datetime.now() - timedelta(days=self.max_source_age_days)).isoformat()
+
+        sources = [
+            source for source in self.report_service.find_overlapping_reports(
+                start_date, end_date, query, criteria, give_reason, extract_genes, created_after, rules, prerank, cascade
+            )
+            if source["report_id"] != report_id
+        ]
+        return plan_coverage(parse_date(start_date), parse_date(end_date), sources)
+
+
+def parse_date(value):
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def plan_coverage(start: date, end: date, sources):
+    """
+    Greedily cover [start, end] with source reports, always taking the usable source
+    that reaches furthest from the first uncovered day. Returns a ReportPlan with
+    string (YYYY-MM-DD) dates.
+    """
+    sources = [
+        (source["report_id"], parse_date(source["start_date"]), parse_date(source["end_date"]), bool(source.get("verdict_dates")))
+        for source in sources
+    ]
+    reused = []
+    uncovered = []
+    day = start
+    while day <= end:
+        # Without dated rows a source cannot be sliced, so it must fit entirely from `day`
+        usable = [
+            (report_id, source_end, dated) for report_id, source_start, source_end, dated in sources
+            if source_start <= day <= source_end and (dated or (source_start == day and source_end <= end))
+        ]
+        if usable:
+            report_id, source_end, dated = max(usable, key=lambda source: (source[1], source[2]))
+            range_end = min(source_end, end)
+            reused.append(ReusedRange(report_id, day.strftime(DATE_FORMAT), range_end.strftime(DATE_FORMAT), dated))
+        else:
+            next_start = min((source_start for _, source_start, _, _ in sources if source_start > day), default=None)
+            range_end = min(next_start - ONE_DAY, end) if next_start else end
+            uncovered.append(DateRange(day.strftime(DATE_FORMAT), range_end.strftime(DATE_FORMAT)))
+        day = range_end + ONE_DAY
+    return ReportPlan(reused, uncovered)
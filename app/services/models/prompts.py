@@ -1,60 +1,99 @@
+# Bump whenever a template below changes; it is part of the classification cache key
+PROMPT_VERSION = "2"
+
+# Templates are kept flush-left: every leading space is a token paid on every call.
+# The instructions (criteria, query, tasks, response format) form a prefix that is
+# identical for every article of a job, so the provider can cache it; the article
+# itself always goes last (see prompt_compiler.py).
+
 SYSTEM_PROMPT = "You are an expert in biomedical research."
 
-BASE_PROMPT = """Your task is to analyze the following article.
+BASE_PROMPT = """Your task is to analyze the article given at the end.
 
-                **Task 1:** Determine if the article is **Relevant** or **Not Relevant** based on:
-                - Criteria: {criteria}
-                - Research Focus: {query}
-            """
+**Task 1:** Determine if the article is **Relevant** or **Not Relevant** based on:
+- Criteria: {criteria}
+- Research Focus: {query}
+"""
 
 REASON_SECTION = """
-                    **do not provide a reason, just return 
-                """
-REASON_SECTION_1 = """
-                    **Task 2 (Reason):** If and only if the article is classified as *Relevant*, provide a short reason with supporting evidence from the abstract. 
-                                If the article is *Not Relevant*, do not provide a reason, just return an empty string.
-                """
+**Task 2 (Reason):** If and only if the article is classified as *Relevant*, provide a short reason with supporting evidence from the abstract.
+If the article is *Not Relevant*, do not provide a reason, just return an empty string.
+"""
+
+# Neither a reason nor genes were asked for
+NO_REASON_SECTION = """
+Do not provide a reason, just return the relevance.
+"""
 
 GENE_EXTRACTION_SECTION = """
-                            **Task 2 (Gene Extraction):** Extract all genes, variants, or mutations mentioned in the article.
-                        """
+**Task 2 (Gene Extraction):** Extract all genes, variants, or mutations mentioned in the article.
+"""
 
 # If both reason & gene extraction are required, you might combine them or do them as separate tasks
 REASON_AND_GENE_SECTION = """
-                            **Task 2:** Extract all genes, variants, or mutations mentioned in the article.
-                            **Task 3:** If and only if the article is classified as *Relevant*, provide a short reason with supporting evidence from the abstract. 
-                                If the article is *Not Relevant*, do not provide a reason, just return an empty string.
-                        """
+**Task 2:** Extract all genes, variants, or mutations mentioned in the article.
+**Task 3:** If and only if the article is classified as *Relevant*, provide a short reason with supporting evidence from the abstract.
+If the article is *Not Relevant*, do not provide a reason, just return an empty string.
+"""
+
+# Asked of the cheap first-pass model in cascade mode, to decide which articles to escalate
+CONFIDENCE_SECTION = """
+**Confidence:** Also return "confidence", a number from 0 to 1 for how certain you are of the relevance decision.
+"""
 
 RESPONSE_FORMAT = """
-                    **Article Information:**
-                    - **Title**: {article_title}
-                    - **Journal**: {article_journal}
-                    - **Abstract**: {article_abstract}
-
-                    **Response Format (strict JSON)**
-                    ```json
-                    {{
-                        "relevance": "Relevant" or "Not Relevant",
-                        "genes_variants": ["GENE1", "VARIANT2", "MUTATION3"]
-                    }}
-                    ```
-                    Ensure your response contains **only JSON** without additional text.
-                """
+**Response Format (strict JSON)**
+```json
+{
+"relevance": "Relevant" or "Not Relevant",
+"genes_variants": ["GENE1", "VARIANT2", "MUTATION3"]
+}
+```
+Ensure your response contains **only JSON** without additional text.
+"""
 
 RESPONSE_FORMAT_WITh_REASON_GENE = """
-                    **Article Information:**
-                    - **Title**: {article_title}
-                    - **Journal**: {article_journal}
-                    - **Abstract**: {article_abstract}
-
-                    **Response Format (strict JSON)**
-                    ```json
-                    {{
-                        "relevance": "Relevant" or "Not Relevant",
-                        "genes_variants": ["GENE1", "VARIANT2", "MUTATION3"],
-                        "reason": ""
-                    }}
-                    ```
-                    Ensure your response contains **only JSON** without additional text.
-                """
\ No newline at end of file
+**Response Format (strict JSON)**
+```json
+{
+"relevance": "Relevant" or "Not Relevant",
+"genes_variants": ["GENE1", "VARIANT2", "MUTATION3"],
+"reason": ""
+}
+```
+Ensure your response contains **only JSON** without additional text.
+"""
+
+ARTICLE = """**Article Information:**
+- **Title**: {article_title}
+- **Journal**: {article_journal}
+- **Abstract**: {article_abstract}"""
+
+BATCH_BASE_PROMPT = """Your task is to analyze each of the articles given at the end independently.
+
+**Task 1:** For every article, determine if it is **Relevant** or **Not Relevant** based on:
+- Criteria: {criteria}
+- Research Focus: {query}
+"""
+
+BATCH_ARTICLE = """PubMed ID: {pubmed_id}
+Title: {article_title}
+Journal: {article_journal}
+Abstract: {article_abstract}
+---
+"""
+
+BATCH_RESPONSE_FORMAT = """
+**Response Format (strict JSON)**
+Return a single JSON object keyed by PubMed ID, with exactly one entry for every article:
+```json
+{
+"<PubMed ID>": {
+"relevance": "Relevant" or "Not Relevant",
+"genes_variants": ["GENE1", "VARIANT2", "MUTATION3"],
+"reason": ""
+}
+}
+```
+Ensure your response contains **only JSON** without additional text.
+"""
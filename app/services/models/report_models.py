@@ -1,8 +1,44 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class Report(BaseModel):
     report_id: str
     filtered_articles: List[str]
-    created_at: str = datetime.now().isoformat()
\ No newline at end of file
+    created_at: str = datetime.now().isoformat()
+
+
+class ArticleVerdict(BaseModel):
+    """One article's classification as returned by the LLM."""
+    relevance: Literal["Relevant", "Not Relevant"]
+    genes_variants: List[str] = []
+    reason: str = ""
+    confidence: Optional[float] = Field(default=None, ge=0, le=1)  # Only asked of the cascade's first pass
+
+    @field_validator("genes_variants", mode="before")
+    @classmethod
+    def split_gene_string(cls, value):
+        # Free-text answers sometimes give "BRCA1, TP53" instead of a list
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [part.strip() for part in value.split(",") if part.strip()]
+        return value
+
+    @classmethod
+    def json_schema(cls, give_reason=False, confidence=False):
+        """Strict JSON schema for structured outputs (every property required, nothing extra)."""
+        properties = {
+            "relevance": {"type": "string", "enum": ["Relevant", "Not Relevant"]},
+            "genes_variants": {"type": "array", "items": {"type": "string"}},
+        }
+        if give_reason:
+            properties["reason"] = {"type": "string"}
+        if confidence:
+            properties["confidence"] = {"type": "number"}
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "additionalProperties": False,
+        }
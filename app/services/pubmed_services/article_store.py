@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from app.config import Config
+from app.services.pubmed_services.pubmed_services import ARTICLE_SCHEMA_VERSION
+
+# Stored data of a PMID PubMed did not return
+TOMBSTONE = zlib.compress(b"null")
+
+
+class ArticleStore:
+    """
+    Local SQLite store of parsed PubMed articles keyed by PMID.
+
+    Articles are stored as zlib-compressed JSON together with the time they were
+    fetched, so callers can treat anything older than `max_age_days` as stale.
+    Entries written with another ARTICLE_SCHEMA_VERSION (fewer parsed fields) count
+    as missing and are replaced when re-fetched.
+
+    PMIDs that a successful efetch did not return (withdrawn, or records the parser
+    skips) are stored as tombstones, with the same age and schema rules, so they are
+    not requested again on every run.
+    """
+
+    def __init__(self, path=None, max_age_days=None, schema_version=ARTICLE_SCHEMA_VERSION):
+        self.path = path or Config.ARTICLE_STORE_PATH
+        self.max_age_days = max_age_days if max_age_days is not None else Config.ARTICLE_STORE_MAX_AGE_DAYS
+        self.schema_version = schema_version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        # Opened lazily so importing the service never touches the filesystem
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    pubmed_id TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    schema_version INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(articles)")}
+            if "schema_version" not in columns:
+                self._conn.execute("ALTER TABLE articles ADD COLUMN schema_version INTEGER NOT NULL DEFAULT 1")
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, pubmed_ids):
+        """
+        Return fresh stored entries for `pubmed_ids` as {pubmed_id: article}, with None
+        for PMIDs known not to be in PubMed (tombstones).
+        """
+        pubmed_ids = list(dict.fromkeys(pubmed_ids))
+        oldest = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else 0
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(pubmed_ids), 500):
+                chunk = pubmed_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT pubmed_id, data FROM articles WHERE fetched_at >= ? AND schema_version = ? AND pubmed_id IN ({placeholders})",
+                    [oldest, self.schema_version, *chunk]
+                ).fetchall()
+                found.update((pubmed_id, json.loads(zlib.decompress(data))) for pubmed_id, data in rows)
+
+            self.hits += len(found)
+            self.misses += len(pubmed_ids) - len(found)
+        return found
+
+    def put_many(self, articles, missing_ids=()):
+        """Insert or refresh `articles` and tombstones for `missing_ids`, stamping them with the current time."""
+        now = time.time()
+        entries = [
+            (article["pubmed_id"], zlib.compress(json.dumps(article).encode("utf-8")), now, self.schema_version)
+            for article in articles
+        ]
+        entries.extend((pubmed_id, TOMBSTONE, now, self.schema_version) for pubmed_id in missing_ids)
+        if not entries:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO articles (pubmed_id, data, fetched_at, schema_version) VALUES (?, ?, ?, ?)",
+                entries
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()
+            (tombstones,) = self.conn.execute("SELECT COUNT(*) FROM articles WHERE data = ?", [TOMBSTONE]).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "tombstones": tombstones,
+                "max_age_days": self.max_age_days,
+            }
@@ -0,0 +1,75 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from app.config import Config
+from app.services.RateLimiting.rate_limiter import TokenBucket
+from app.services.Metrics import metrics
+
+EUTILS_BASE_URL = Config.NCBI_EUTILS_URL.rstrip("/")
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def has_api_key():
+    return bool(Config.ENTREZ_API_KEY) and Config.ENTREZ_API_KEY != "default_ncbi_api_key"
+
+
+# NCBI allows 10 requests/s with an API key and 3 without; capacity 1 spaces calls evenly
+ncbi_rate_limiter = TokenBucket(rate=10 if has_api_key() else 3, capacity=1)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide keep-alive session sized for the parallel efetch workers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(Config.NCBI_FETCH_WORKERS, 1) + 2)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def eutils_request(endpoint, params, stream=False):
+    """
+    POST `params` to an E-utilities endpoint (e.g. "esearch", "efetch").
+
+    Every call goes through the shared NCBI rate limiter. 429 and 5xx responses and
+    connection errors are retried with jittered exponential backoff (honouring
+    Retry-After when NCBI sends it); other HTTP errors are raised immediately.
+    Requests, retries and the time to the response headers are recorded per endpoint.
+    """
+    params = {**params, "tool": "unsw-backend", "email": Config.ENTREZ_EMAIL}
+    if has_api_key():
+        params["api_key"] = Config.ENTREZ_API_KEY
+    url = f"{EUTILS_BASE_URL}/{endpoint}.fcgi"
+
+    for attempt in range(Config.NCBI_MAX_RETRIES + 1):
+        ncbi_rate_limiter.acquire()
+        metrics.count("ncbi_requests", endpoint)
+        retry_after = None
+        try:
+            with metrics.span(endpoint):
+                response = get_session().post(url, data=params, timeout=Config.NCBI_TIMEOUT, stream=stream)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("Retry-After")
+            error = requests.HTTPError(f"{response.status_code} from {endpoint}", response=response)
+            response.close()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt == Config.NCBI_MAX_RETRIES:
+            raise error
+        delay = Config.NCBI_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        metrics.count("ncbi_retries", endpoint)
+        print(f"NCBI {endpoint} failed ({error}), retrying in {delay:.1f}s...")
+        time.sleep(delay)
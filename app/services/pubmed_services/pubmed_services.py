@@ -1,28 +1,56 @@
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from datetime import datetime
 from xml.etree import ElementTree as ET
-from Bio import Entrez
 from app.config import Config
+from app.services.pubmed_services.entrez_client import eutils_request
+from app.services.Metrics import metrics
 
 
+# Bump when parse_article_element adds or changes fields; older stored articles are re-fetched
+ARTICLE_SCHEMA_VERSION = 2
+
+
+def search_pubmed(query, mindate=None, maxdate=None):
+    """
+    Run a single esearch with usehistory=y.
+
+    Returns the real result count together with the WebEnv/query_key pair that
+    identifies the result set on the Entrez history server, or None on failure.
+    """
+    try:
+        response = eutils_request("esearch", {
+            "db": "pubmed", "term": query, "retmax": 0, "usehistory": "y", "retmode": "json",
+            "mindate": mindate, "maxdate": maxdate, "datetype": "pdat"
+        })
+        record = response.json()["esearchresult"]
+        return {
+            "count": int(record["count"]),
+            "webenv": record["webenv"],
+            "query_key": record["querykey"],
+        }
+    except Exception as e:
+        print(f"Error searching PubMed: {e}")
+        return None
+
 def fetch_pubmed_ids(query, total_results=2000, batch_size=500, mindate=None, maxdate=None):
     """Fetch PubMed article IDs matching the query with pagination and date filtering."""
     all_ids = []
-    Entrez.email = Config.ENTREZ_EMAIL
-    Entrez.api_key = Config.ENTREZ_API_KEY
-    for start in range(0, total_results, batch_size):
+    start = 0
+    while start < total_results:
         print(f"Fetching IDs {start+1} to {min(start+batch_size, total_results)}")
         try:
-            handle = Entrez.esearch(
-                db="pubmed", term=query, retmax=batch_size, retstart=start,
-                mindate=mindate, maxdate=maxdate, datetype="pdat",
-                api_key=Entrez.api_key, email=Entrez.email
-            )
-            record = Entrez.read(handle)
-            ids = record['IdList']
-            handle.close()
-            all_ids.extend(ids)
-            time.sleep(0.5)
+            response = eutils_request("esearch", {
+                "db": "pubmed", "term": query, "retmax": batch_size, "retstart": start, "retmode": "json",
+                "mindate": mindate, "maxdate": maxdate, "datetype": "pdat"
+            })
+            record = response.json()["esearchresult"]
+            all_ids.extend(record["idlist"])
+            # Never page past the real number of matches
+            total_results = min(total_results, int(record["count"]))
+            start += batch_size
         except Exception as e:
             print(f"Error fetching IDs: {e}")
             break
@@ -31,21 +59,110 @@ def fetch_pubmed_ids(query, total_results=2000, batch_size=500, mindate=None, ma
 
     return all_ids
 
+def fetch_pubmed_ids_from_history(history, max_results=None, batch_size=10000):
+    """List the PMIDs of a history-server result set (efetch rettype=uilist), in search order."""
+    total = history["count"] if not max_results else min(history["count"], max_results)
+    all_ids = []
+    for start in range(0, total, batch_size):
+        print(f"Fetching IDs {start+1} to {min(start+batch_size, total)}")
+        try:
+            response = eutils_request("efetch", {
+                "db": "pubmed", "rettype": "uilist", "retmode": "text",
+                "query_key": history["query_key"], "WebEnv": history["webenv"],
+                "retstart": start, "retmax": min(batch_size, total - start)
+            })
+            all_ids.extend(line.strip() for line in response.text.splitlines() if line.strip())
+        except Exception as e:
+            print(f"Error fetching IDs: {e}")
+            break
+    return all_ids
+
+def iter_fetch_in_parallel(efetch_params_list, mindate=None, maxdate=None, fetch=None):
+    """
+    Run one efetch per entry of `efetch_params_list`, keeping up to NCBI_FETCH_WORKERS
+    requests in flight, and yield each batch's articles in batch order (what `fetch`,
+    default `efetch_articles`, returns for it).
+
+    All workers share the pooled session and the NCBI rate limiter, so the batches
+    are exactly what a sequential fetch would produce.
+    """
+    workers = max(Config.NCBI_FETCH_WORKERS, 1)
+    params_iter = iter(efetch_params_list)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetch = metrics.in_current_context(fetch or efetch_articles)
+        pending = deque(
+            executor.submit(fetch, params, mindate, maxdate)
+            for params in islice(params_iter, workers)
+        )
+        while pending:
+            batch = pending.popleft().result()
+            next_params = next(params_iter, None)
+            if next_params is not None:
+                pending.append(executor.submit(fetch, next_params, mindate, maxdate))
+            yield batch
+
+def fetch_in_parallel(efetch_params_list, mindate=None, maxdate=None):
+    """List version of `iter_fetch_in_parallel`."""
+    return [article for batch in iter_fetch_in_parallel(efetch_params_list, mindate, maxdate) for article in batch]
+
+def id_batches(pubmed_ids, batch_size=None):
+    batch_size = batch_size or Config.BATCH_SIZE
+    return [
+        {"id": ",".join(pubmed_ids[i:i + batch_size])}
+        for i in range(0, len(pubmed_ids), batch_size)
+    ]
+
+def history_batches(history, max_results=None, batch_size=None):
+    batch_size = batch_size or Config.BATCH_SIZE
+    total = history["count"] if not max_results else min(history["count"], max_results)
+    if total < history["count"]:
+        print(f"Warning: fetching only the first {total} of {history['count']} matching articles.")
+
+    print(f"Fetching {total} records in batches of {batch_size}")
+    return [
+        {"query_key": history["query_key"], "WebEnv": history["webenv"], "retstart": start, "retmax": min(batch_size, total - start)}
+        for start in range(0, total, batch_size)
+    ]
+
 def fetch_pubmed_data(pubmed_ids, mindate=None, maxdate=None):
     """Fetch titles, abstracts, and publication dates for the given PubMed IDs."""
-    articles = []
-    if len(pubmed_ids) <= Config.MAX_FETCH_IDS:
-        id_string = ",".join(pubmed_ids)
-        # articles.extend(parse_pubmed_data(id_string, pubmed_ids))
-        articles.extend(parse_pubmed_data(id_string, mindate, maxdate))
-    else:
-        for i in range(0, len(pubmed_ids), Config.BATCH_SIZE):
-            batch_ids = pubmed_ids[i:i+ Config.BATCH_SIZE]
-            id_string = ",".join(batch_ids)
-            # articles.extend(parse_pubmed_data(id_string, batch_ids))
-            articles.extend(parse_pubmed_data(id_string, mindate, maxdate))
-            time.sleep(0.5)
-    return articles
+    return fetch_in_parallel(id_batches(pubmed_ids), mindate, maxdate)
+
+def iter_pubmed_data(pubmed_ids, mindate=None, maxdate=None):
+    """Like `fetch_pubmed_data`, but yields the articles of each efetch batch as soon as it is parsed."""
+    return iter_fetch_in_parallel(id_batches(pubmed_ids), mindate, maxdate)
+
+def iter_pubmed_data_with_ids(pubmed_ids):
+    """
+    Like `iter_pubmed_data` (without a date filter), but yields (requested_ids, articles)
+    per efetch batch, with articles None when the efetch failed. PMIDs requested by a
+    successful efetch but missing from its articles are not in PubMed (or not parseable).
+    """
+    batches = id_batches(pubmed_ids)
+    for params, articles in zip(batches, iter_fetch_in_parallel(batches, fetch=efetch_articles_or_none)):
+        yield params["id"].split(","), articles
+
+def fetch_pubmed_data_from_history(history, mindate=None, maxdate=None, max_results=None, batch_size=None):
+    """
+    Fetch articles for a result set stored on the Entrez history server (see `search_pubmed`).
+
+    Pages through the full result count with retstart/retmax, or through the first
+    `max_results` records when a cap is given.
+    """
+    return fetch_in_parallel(history_batches(history, max_results, batch_size), mindate, maxdate)
+
+def iter_pubmed_data_from_history(history, mindate=None, maxdate=None, max_results=None, batch_size=None):
+    """Batch-by-batch generator version of `fetch_pubmed_data_from_history`."""
+    return iter_fetch_in_parallel(history_batches(history, max_results, batch_size), mindate, maxdate)
+
+def in_date_range(article, mindate=None, maxdate=None):
+    """Apply the same mindate/maxdate filter as the parser to an already parsed article."""
+    article_date = datetime.strptime(article["date"], "%Y/%m/%d")
+    if mindate and article_date < parse_filter_date(mindate):
+        return False
+    if maxdate and article_date > parse_filter_date(maxdate):
+        return False
+    return True
 
 def parse_date(date_string):
     """Helper function to parse dates with different formats."""
@@ -58,21 +175,24 @@ def parse_date(date_string):
     raise ValueError(f"Date format not recognized: {date_string}")
     
    
+MONTH_ABBREVIATIONS = {
+    name: number for number, name in enumerate(
+        ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+    )
+}
+
 def extract_date(date_element):
     if date_element is not None:
-        year = date_element.find("Year").text if date_element.find("Year") is not None else None
-        month = date_element.find("Month").text if date_element.find("Month") is not None else None
-        day = date_element.find("Day").text if date_element.find("Day") is not None else None
+        year = date_element.findtext("Year")
+        month = date_element.findtext("Month")
+        day = date_element.findtext("Day")
 
         if year:
             try:
                 # Convert year, month, and day to integers if available
                 year = int(year)
                 if month and not month.isdigit():
-                    try:
-                        month = datetime.strptime(month, "%b").month
-                    except ValueError:
-                        month = None
+                    month = MONTH_ABBREVIATIONS.get(month.strip().lower())
                 else:
                     month = int(month) if month and month.isdigit() else None
 
@@ -122,71 +242,134 @@ def compare_dates(date1, date2):
 
 def parse_pubmed_data(id_string, mindate, maxdate):
     """Fetch and parse PubMed data (PubMed ID, title, abstract, and date) with date filtering."""
-    from xml.etree import ElementTree as ET
-    articles = []
-    Entrez.email = Config.ENTREZ_EMAIL
-    Entrez.api_key = Config.ENTREZ_API_KEY
-    # mindate=Config.MINDATE
-    # maxdate=Config.MAXDATE
+    return efetch_articles({"id": id_string}, mindate, maxdate)
+
+def efetch_articles(efetch_params, mindate, maxdate):
+    """
+    Run one efetch and parse the result, selecting records either by `id` or by
+    `query_key`/`WebEnv`/`retstart`/`retmax` on the history server.
+    """
+    return list(iter_efetch_articles(efetch_params, mindate, maxdate))
 
+def efetch_articles_or_none(efetch_params, mindate=None, maxdate=None):
+    """Like `efetch_articles`, but None when the request or the parsing failed part-way."""
     try:
-        fetch_handle = Entrez.efetch(
-            db="pubmed", id=id_string, retmode="xml",
-            api_key=Entrez.api_key, email=Entrez.email
-        )
-        data = fetch_handle.read()
-        fetch_handle.close()
-
-        root = ET.fromstring(data)
-        for article in root.findall(".//PubmedArticle"):
-            pubmed_id = article.find(".//PMID").text
-            title = article.find(".//ArticleTitle")
-            abstract = article.find(".//AbstractText")
-            journal = article.find(".//Journal/Title")
-
-            # Extract publication date fields
-            article_date = article.find(".//ArticleDate")
-            pub_date = article.find(".//PubDate")
-
-            
-           # Parse dates
-            article_date_obj = extract_date(article_date)
-            pub_date_obj = extract_date(pub_date)
-
-            # Determine the earliest date
-            final_date_obj = compare_dates(article_date_obj, pub_date_obj)
-
-            # Skip if no valid date is found
-            if not final_date_obj:
-                continue
-
-            # Construct a datetime object for filtering
-            year = final_date_obj["year"]
-            month = final_date_obj["month"] if final_date_obj["month"] else 1
-            day = final_date_obj["day"] if final_date_obj["day"] else 1
-            final_date = datetime(year, month, day)
-
-            # Apply filtering based on mindate and maxdate
-            if mindate:
-                mindate_obj = datetime.strptime(mindate, "%Y/%m/%d")
-                if final_date < mindate_obj:
-                    continue
-
-            if maxdate:
-                maxdate_obj = datetime.strptime(maxdate, "%Y/%m/%d")
-                if final_date > maxdate_obj:
-                    continue
-
-            # Add article to the list if it passes the date filter
-            articles.append({
-                "pubmed_id": pubmed_id,
-                "title": title.text if title is not None else "N/A",
-                "abstract": abstract.text if abstract is not None else "N/A",
-                "journal": journal.text if journal is not None else "N/A", 
-                "date": final_date.strftime("%Y/%m/%d")
-            })
+        return list(iter_efetch_articles(efetch_params, mindate, maxdate, raise_errors=True))
+    except Exception:
+        return None
+
+def iter_efetch_articles(efetch_params, mindate, maxdate, raise_errors=False):
+    """
+    Streaming variant of `efetch_articles`: parses the response body as it arrives.
+    Errors are printed and end the stream, or are raised with `raise_errors`.
+    """
+    try:
+        response = eutils_request("efetch", {"db": "pubmed", "retmode": "xml", **efetch_params}, stream=True)
+        try:
+            response.raw.decode_content = True
+            articles = iter_pubmed_articles(response.raw, mindate, maxdate)
+            # One "parse" span per response: the time spent producing each article (reading the
+            # streamed body and parsing it), not the time the consumer holds on to it
+            parse_seconds = 0.0
+            try:
+                while True:
+                    started_at = time.monotonic()
+                    try:
+                        article = next(articles)
+                    except StopIteration:
+                        break
+                    finally:
+                        parse_seconds += time.monotonic() - started_at
+                    yield article
+            finally:
+                metrics.observe("parse", parse_seconds)
+        finally:
+            response.close()
 
     except Exception as e:
         print(f"Error fetching or parsing data: {e}")
+        if raise_errors:
+            raise
+
+def parse_filter_date(value):
+    return datetime.strptime(value, "%Y/%m/%d") if value else None
+
+def iter_pubmed_articles(source, mindate=None, maxdate=None):
+    """
+    Incrementally parse efetch XML from a file-like `source`, yielding one article
+    dict per PubmedArticle that passes the mindate/maxdate filter.
+
+    Each PubmedArticle element is discarded as soon as it has been converted, so
+    memory use stays flat no matter how many records the response holds.
+    """
+    mindate_obj = parse_filter_date(mindate)
+    maxdate_obj = parse_filter_date(maxdate)
+
+    root = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+
+        if element.tag == "PubmedArticle":
+            article = parse_article_element(element, mindate_obj, maxdate_obj)
+            if article is not None:
+                yield article
+        elif element.tag != "PubmedBookArticle":
+            continue
+
+        # Drop the finished record (and the root's reference to it)
+        element.clear()
+        root.clear()
+
+def element_texts(element, path):
+    """Stripped, non-empty texts of every element matching `path`."""
+    return [child.text.strip() for child in element.iterfind(path) if child.text and child.text.strip()]
+
+def parse_article_element(article, mindate_obj=None, maxdate_obj=None):
+    """Convert one PubmedArticle element into an article dict, or None if it is undated or out of range."""
+    pubmed_id = article.findtext(".//PMID")
+    title = article.find(".//ArticleTitle")
+    abstract = article.find(".//AbstractText")
+    journal = article.find(".//Journal/Title")
+
+    # Parse publication date fields
+    article_date_obj = extract_date(article.find(".//ArticleDate"))
+    pub_date_obj = extract_date(article.find(".//PubDate"))
+
+    # Determine the earliest date
+    final_date_obj = compare_dates(article_date_obj, pub_date_obj)
+
+    # Skip if no valid date is found
+    if not final_date_obj:
+        return None
+
+    # Construct a datetime object for filtering
+    year = final_date_obj["year"]
+    month = final_date_obj["month"] if final_date_obj["month"] else 1
+    day = final_date_obj["day"] if final_date_obj["day"] else 1
+    try:
+        final_date = datetime(year, month, day)
+    except ValueError:
+        return None
+
+    # Apply filtering based on mindate and maxdate
+    if mindate_obj and final_date < mindate_obj:
+        return None
+    if maxdate_obj and final_date > maxdate_obj:
+        return None
 
-    return articles
\ No newline at end of file
+    return {
+        "pubmed_id": pubmed_id,
+        "title": title.text if title is not None else "N/A",
+        "abstract": abstract.text if abstract is not None else "N/A",
+        "journal": journal.text if journal is not None else "N/A",
+        "date": final_date.strftime("%Y/%m/%d"),
+        # Metadata for the rule engine (empty until NLM indexes the record)
+        "mesh_terms": element_texts(article, ".//MeshHeadingList/MeshHeading/DescriptorName"),
+        "publication_types": element_texts(article, ".//PublicationTypeList/PublicationType"),
+        "issn": list(dict.fromkeys(
+            element_texts(article, ".//Journal/ISSN") + element_texts(article, ".//MedlineJournalInfo/ISSNLinking")
+        )),
+    }
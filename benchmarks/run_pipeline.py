@@ -0,0 +1,281 @@
+"""
+End-to-end benchmark of `run_analysis` against offline stand-ins.
+
+    python -m benchmarks.run_pipeline                       # 100, 1k and 10k articles
+    python -m benchmarks.run_pipeline --sizes 100 1000 --output baseline.json
+    python -m benchmarks.run_pipeline --baseline baseline.json --env LLM_BATCH_MODE=true
+
+E-utilities is served by EntrezStub (from fixtures/efetch_sample.xml, or --fixture),
+chat completions by FakeOpenAI (--llm-latency, --llm-rps, --llm-429-rate) and DynamoDB by
+an in-process moto server (or DynamoDB Local with --dynamodb-endpoint); --mode bulk uses
+the app's FakeBatchClient for the Batch API. The stand-ins run
+in this process; every size runs `run_analysis` in a fresh child process, so its peak
+RSS is the application's alone.
+
+The JSON result has, per size: wall time, time to the first persisted result, peak
+RSS, the report's status, article and error row counts, the report's stage spans and
+counters (see app/services/Metrics/metrics.py) and the requests each stand-in served.
+A size whose report did not complete, has error rows or (interactive mode) sent no
+request to FakeOpenAI is marked with an `error` and left out of the --baseline
+comparison, which prints the change against an earlier result.
+
+The prompt compiler counts tokens with tiktoken, which downloads its encodings on first
+use. They are loaded once before the children start; offline, point TIKTOKEN_CACHE_DIR
+at a directory holding the cached encodings (copied from a machine that has them).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_FIXTURE = os.path.join(BENCHMARK_DIR, "fixtures", "efetch_sample.xml")
+DEFAULT_SIZES = [100, 1000, 10000]
+# Models whose tiktoken encodings the children need (the app's default and reasoning models)
+TOKENIZER_MODELS = ["gpt-4o-mini", "o1-mini"]
+
+# Child settings: everything is fetched and classified (no caches, no reuse of earlier reports)
+CHILD_ENV = {
+    "OPENAI_API_KEY": "benchmark",
+    "ENTREZ_API_KEY": "benchmark",  # NCBI's 10 requests/s limit, as with a real key
+    "AWS_ACCESS_KEY": "benchmark",
+    "AWS_SECRET_KEY": "benchmark",
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "AWS_REGION": "us-east-1",
+    "RESUME_ON_STARTUP": "false",
+    "CLASSIFICATION_CACHE_ENABLED": "false",
+    "ARTICLE_STORE_ENABLED": "false",
+    "DELTA_ANALYSIS_ENABLED": "false",
+    "PUBMED_MAX_RESULTS": "0",  # Every size is fetched in full
+    # Rate limits are the stand-in's business (--llm-rps, --llm-429-rate)
+    "LLM_REQUESTS_PER_MINUTE": "0",
+    "LLM_TOKENS_PER_MINUTE": "0",
+    "LLM_BULK_FAKE": "true",
+    "LLM_BULK_FAKE_SECONDS": "1",
+    "LLM_BULK_POLL_SECONDS": "0.5",
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_encodings(models):
+    """
+    Load (and so cache) the tiktoken encodings of `models` before the children need them.
+    Without them every classification fails and the run measures nothing.
+    """
+    import tiktoken
+    for model in models:
+        try:
+            try:
+                tiktoken.encoding_for_model(model)
+            except KeyError:
+                tiktoken.get_encoding("o200k_base")  # The prompt compiler's fallback
+        except Exception as e:
+            sys.exit(f"Could not load the tiktoken encoding for {model}: {e}\n"
+                     "Set TIKTOKEN_CACHE_DIR to a directory holding the cached encodings to run offline.")
+
+
+def run_child(size, mode, result_path):
+    """Analyze one report of `size` articles in this (child) process and write the measurements."""
+    sys.path.insert(0, REPO_DIR)
+    from app.api import filter_article
+    from app.services.DynamoDB.dynamodb_service import REPORT_HEADER_FIELDS
+    from app.services.Jobs.job_executor import WORKER_ID
+
+    report_service = filter_article.report_service
+    report_service.create_tables()
+    report_id, _ = report_service.create_report(
+        "2024-01-01", "2024-12-31", f"benchmark {size}", "Genetic studies of epilepsy in humans",
+        time.strftime("%Y-%m-%dT%H:%M:%S"), False, False, options={"mode": mode}, worker_id=WORKER_ID
+    )
+
+    first_result = {}
+    add_filtered_articles = report_service.add_filtered_articles
+
+    def timed_add(*args, **kwargs):
+        response = add_filtered_articles(*args, **kwargs)
+        first_result.setdefault("at", time.monotonic())
+        return response
+    report_service.add_filtered_articles = timed_add
+
+    started_at = time.monotonic()
+    filter_article.run_analysis(
+        report_id, "2024-01-01", "2024-12-31", f"benchmark {size}", "Genetic studies of epilepsy in humans",
+        False, False, mode=mode
+    )
+    # Bulk reports are finished by the poller once their batches are collected
+    while filter_article.bulk_poller.is_watching(report_id):
+        time.sleep(0.1)
+    wall = time.monotonic() - started_at
+
+    header = report_service.get_report_header(report_id, REPORT_HEADER_FIELDS) or {}
+    result = {
+        "articles": size,
+        "mode": mode,
+        "status": header.get("status"),
+        "article_count": int(header.get("article_count") or 0),
+        "error_rows": report_service.count_articles(report_id, "Error"),
+        "wall_seconds": round(wall, 3),
+        "time_to_first_result_seconds": round(first_result["at"] - started_at, 3) if first_result else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "metrics": header.get("metrics") or {},
+    }
+    with open(result_path, "w") as f:
+        json.dump(result, f, default=lambda number: int(number) if number == int(number) else float(number))  # Decimals
+
+
+def run_size(size, args, env, stubs):
+    for stub in stubs.values():
+        stub.reset_counts()
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+    try:
+        with open(args.log, "a") if args.log else open(os.devnull, "w") as log:
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run_pipeline", "--child", str(size), "--mode", args.mode, "--result", result_path],
+                cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, timeout=args.timeout
+            )
+        if completed.returncode != 0:
+            return {"articles": size, "mode": args.mode, "error": f"benchmark process exited with {completed.returncode}"}
+        with open(result_path) as f:
+            result = json.load(f)
+    finally:
+        os.remove(result_path)
+    result["stub_requests"] = {name: stub.reset_counts() for name, stub in stubs.items()}
+    problem = failed_run(result)
+    if problem:
+        result["error"] = problem
+    return result
+
+
+def failed_run(result):
+    """Why a child's report cannot be compared (e.g. every classification failed), or None."""
+    if result["status"] != "complete":
+        return f"report finished as {result['status']}"
+    if result["error_rows"]:
+        return f"{result['error_rows']} of {result['article_count']} articles are error rows"
+    # Bulk mode uses the in-process FakeBatchClient instead
+    if result["mode"] == "interactive" and result["article_count"] and not result["stub_requests"]["openai"].get("requests"):
+        return "FakeOpenAI served no requests"
+    return None
+
+
+def compare(baseline, current):
+    """One line per size and measurement: baseline -> current (change)."""
+    previous = {(result["articles"], result.get("mode")): result for result in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        before = previous.get((result["articles"], result.get("mode")))
+        if before is None or "error" in result or "error" in before:
+            continue
+        for key in ("wall_seconds", "time_to_first_result_seconds", "peak_rss_mb"):
+            old, new = before.get(key), result.get(key)
+            if old and new is not None:
+                lines.append(f"{result['articles']:>6} {key:<30} {old:>9} -> {new:<9} ({(new - old) / old:+.1%})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run_analysis end to end against offline stand-ins.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Articles per report")
+    parser.add_argument("--mode", choices=["interactive", "bulk"], default="interactive")
+    parser.add_argument("--output", help="Write the JSON result here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="efetch XML whose records are replayed")
+    parser.add_argument("--ncbi-latency", type=float, default=0.05, help="Seconds added to every E-utilities request")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mean seconds per chat completion")
+    parser.add_argument("--llm-rps", type=int, default=0, help="Chat completions per second before 429s (0 = unlimited)")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="Fraction of chat completions answered 429 at random")
+    parser.add_argument("--dynamodb-endpoint", help="Use this DynamoDB (e.g. DynamoDB Local) instead of moto")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra app settings, e.g. LLM_BATCH_MODE=true")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds allowed per size")
+    parser.add_argument("--log", help="Append the application output to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.mode, args.result)
+        return
+
+    from benchmarks.stubs import EntrezStub, FakeOpenAI, start_moto_server
+
+    load_encodings(TOKENIZER_MODELS)
+
+    stubs = {
+        "entrez": EntrezStub(args.fixture, latency=args.ncbi_latency).start(),
+        "openai": FakeOpenAI(latency=args.llm_latency, requests_per_second=args.llm_rps, rate_limit_rate=args.llm_429_rate).start(),
+    }
+    moto_server, dynamodb_endpoint = (None, args.dynamodb_endpoint) if args.dynamodb_endpoint else start_moto_server()
+
+    env = {
+        **os.environ, **CHILD_ENV,
+        "NCBI_EUTILS_URL": stubs["entrez"].url,
+        "OPENAI_BASE_URL": stubs["openai"].url + "/v1",
+        "DYNAMODB_ENDPOINT_URL": dynamodb_endpoint,
+    }
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+
+    results = []
+    try:
+        for size in args.sizes:
+            if moto_server is not None:
+                # Fresh tables for every size
+                import requests
+                requests.post(f"{dynamodb_endpoint}/moto-api/reset", timeout=30)
+            print(f"Benchmarking {size} articles ({args.mode})...", file=sys.stderr)
+            results.append(run_size(size, args, env, stubs))
+            print(json.dumps({key: value for key, value in results[-1].items() if key not in ("metrics", "stub_requests")}), file=sys.stderr)
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+        if moto_server is not None:
+            moto_server.stop()
+
+    output = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "mode": args.mode, "fixture": os.path.relpath(args.fixture, REPO_DIR), "ncbi_latency": args.ncbi_latency,
+            "llm_latency": args.llm_latency, "llm_rps": args.llm_rps, "llm_429_rate": args.llm_429_rate,
+            "dynamodb": "external" if args.dynamodb_endpoint else "moto", "env": args.env,
+        },
+        "results": results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(json.load(f), output), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
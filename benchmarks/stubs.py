@@ -0,0 +1,254 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.etree import ElementTree as ET
+
+PMID_PATTERN = re.compile(rb"(<PMID[^>]*>)\d+(</PMID>)")
+FIRST_BENCHMARK_PMID = 30000000
+
+
+class StubServer:
+    """A ThreadingHTTPServer on a free local port, served from a daemon thread."""
+
+    def __init__(self, handler_class):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def reset_counts(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class EntrezStub(StubServer):
+    """
+    E-utilities stand-in serving esearch (JSON, with usehistory) and efetch (uilist and
+    XML) from a fixture of efetch records.
+
+    The number of matches is the first number in the search term ("benchmark 1000"
+    matches 1000 articles). Article i is fixture record i modulo the fixture size with
+    PMID FIRST_BENCHMARK_PMID + i, so every PMID is distinct and the efetch XML is what
+    the fixture's records look like. `latency` seconds are added to every request.
+    """
+
+    def __init__(self, fixture_path, latency=0.0):
+        super().__init__(EntrezHandler)
+        self.latency = latency
+        with open(fixture_path, "rb") as f:
+            root = ET.fromstring(f.read())
+        self.records = [ET.tostring(record) for record in root.iter("PubmedArticle")]
+        if not self.records:
+            raise ValueError(f"No PubmedArticle records in {fixture_path}")
+
+    def record(self, pmid):
+        index = int(pmid) - FIRST_BENCHMARK_PMID
+        return PMID_PATTERN.sub(rb"\g<1>" + str(pmid).encode() + rb"\g<2>", self.records[index % len(self.records)], count=1)
+
+    def efetch_xml(self, pmids):
+        return (
+            b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+            + b"\n".join(self.record(pmid) for pmid in pmids)
+            + b"\n</PubmedArticleSet>\n"
+        )
+
+
+def match_count(term):
+    number = re.search(r"\d+", term or "")
+    return int(number.group()) if number else 0
+
+
+def benchmark_ids(count, start=0, stop=None):
+    stop = count if stop is None else min(stop, count)
+    return [str(FIRST_BENCHMARK_PMID + i) for i in range(start, stop)]
+
+
+class EntrezHandler(QuietHandler):
+    def do_POST(self):
+        self.handle_eutils(parse_qs(self.read_body().decode("utf-8")))
+
+    def do_GET(self):
+        self.handle_eutils(parse_qs(urlparse(self.path).query))
+
+    def handle_eutils(self, query):
+        stub = self.server.stub
+        params = {key: values[0] for key, values in query.items()}
+        endpoint = urlparse(self.path).path.rsplit("/", 1)[-1].split(".")[0]
+        stub.count(endpoint)
+        time.sleep(stub.latency)
+
+        if endpoint == "esearch":
+            count = match_count(params.get("term"))
+            start, size = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+            body = {"esearchresult": {
+                "count": str(count), "retstart": str(start), "retmax": str(size),
+                "idlist": benchmark_ids(count, start, start + size),
+                "webenv": f"BENCHMARK_{count}", "querykey": "1",
+            }}
+            self.reply(200, json.dumps(body).encode("utf-8"), "application/json")
+        elif endpoint == "efetch":
+            if "id" in params:
+                pmids = params["id"].split(",")
+            else:
+                count = match_count(params.get("WebEnv"))
+                start = int(params.get("retstart", 0))
+                pmids = benchmark_ids(count, start, start + int(params.get("retmax", 20)))
+            if params.get("rettype") == "uilist":
+                self.reply(200, "\n".join(pmids).encode("utf-8"), "text/plain")
+            else:
+                self.reply(200, stub.efetch_xml(pmids), "text/xml")
+        else:
+            self.reply(404, b"Unknown endpoint", "text/plain")
+
+
+class FakeOpenAI(StubServer):
+    """
+    Chat completions stand-in (point OPENAI_BASE_URL at `url` + "/v1").
+
+    Every request waits `latency` seconds (+/- `jitter` as a fraction). Requests beyond
+    `requests_per_second` (0 = unlimited) or, at random, a `rate_limit_rate` fraction of
+    them are answered 429 with a Retry-After header, as the real API does. Verdicts are
+    deterministic per article (`relevant_fraction` of them Relevant), single or keyed by
+    PubMed ID for batch prompts; token usage is estimated at 4 characters per token.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.5, requests_per_second=0, rate_limit_rate=0.0, relevant_fraction=0.1, seed=0):
+        super().__init__(OpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_per_second = requests_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.relevant_fraction = relevant_fraction
+        self.random = random.Random(seed)
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+
+    def admit(self):
+        """False when this request should be rate limited."""
+        with self.lock:
+            if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+                return False
+            if not self.requests_per_second:
+                return True
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_requests = now, 0
+            self.window_requests += 1
+            return self.window_requests <= self.requests_per_second
+
+    def delay(self):
+        with self.lock:
+            factor = 1 + self.random.uniform(-self.jitter, self.jitter)
+        return max(self.latency * factor, 0.0)
+
+    def verdict(self, article_text):
+        relevant = zlib.crc32(article_text.encode("utf-8")) % 1000 < self.relevant_fraction * 1000
+        genes = sorted(set(re.findall(r"\b[A-Z][A-Z0-9]{2,}\d\b", article_text)))[:5]
+        return {
+            "relevance": "Relevant" if relevant else "Not Relevant",
+            "genes_variants": genes,
+            "reason": "Matches the criteria (benchmark stub)" if relevant else "",
+            "confidence": 0.9,
+        }
+
+    def answer(self, request):
+        content = request["messages"][-1]["content"]
+        articles = re.split(r"^PubMed ID: ", content, flags=re.MULTILINE)[1:]
+        if articles:
+            output = {article.split("\n", 1)[0].strip(): self.verdict(article) for article in articles}
+        else:
+            output = self.verdict(content)
+        text = json.dumps(output)
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        return {
+            "id": f"chatcmpl-bench{self.random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(text) // 4,
+                "total_tokens": prompt_tokens + len(text) // 4,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+
+
+class OpenAIHandler(QuietHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.read_body()
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.reply(404, b'{"error": {"message": "Not found"}}', "application/json")
+            return
+
+        stub.count("requests")
+        time.sleep(stub.delay())
+        if not stub.admit():
+            stub.count("rate_limited")
+            error = {"error": {"message": "Rate limit reached (benchmark stub)", "type": "requests", "code": "rate_limit_exceeded"}}
+            self.reply(429, json.dumps(error).encode("utf-8"), "application/json", {"Retry-After": "1"})
+            return
+        self.reply(200, json.dumps(stub.answer(json.loads(body))).encode("utf-8"), "application/json")
+
+
+def start_moto_server():
+    """In-process moto server for DynamoDB; returns (server, endpoint URL)."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError as e:
+        raise SystemExit(
+            "moto is needed for the DynamoDB stand-in (pip install -r benchmarks/requirements.txt), "
+            "or pass --dynamodb-endpoint to use DynamoDB Local."
+        ) from e
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # One line per request otherwise
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+# Offline settings; app.config reads them at import, so they are set before any app module is loaded
+CACHE_DIR = tempfile.mkdtemp(prefix="unsw-tests-")
+os.environ.update({
+    "OPENAI_API_KEY": "test",
+    "AWS_ACCESS_KEY": "testing",
+    "AWS_SECRET_KEY": "testing",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "RESUME_ON_STARTUP": "false",
+    "DYNAMODB_CHECK_TABLES": "false",
+    "DELTA_ANALYSIS_ENABLED": "false",
+    "CLASSIFICATION_CACHE_ENABLED": "false",
+    "CLASSIFICATION_CACHE_PATH": os.path.join(CACHE_DIR, "classification_cache.sqlite3"),
+    "ARTICLE_STORE_ENABLED": "false",
+    "ARTICLE_STORE_PATH": os.path.join(CACHE_DIR, "article_store.sqlite3"),
+    "LLM_BULK_DIR": os.path.join(CACHE_DIR, "bulk"),
+})
+
+import boto3
+import pytest
+from moto import mock_aws
+from app.services.ArticleFilteration import filter_logic, prompt_compiler
+from app.services.DynamoDB.dynamodb_service import ReportService
+
+
+class WhitespaceEncoding:
+    """Stands in for tiktoken, whose encodings are downloaded on first use."""
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+    def encode_batch(self, texts, **kwargs):
+        return [text.split() for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    monkeypatch.setattr(prompt_compiler, "get_encoding", lambda model: WhitespaceEncoding())
+    monkeypatch.setattr(filter_logic, "get_encoding", lambda model: WhitespaceEncoding())
+
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        yield boto3.resource("dynamodb", region_name="us-east-1")
+
+
+@pytest.fixture
+def report_service(dynamodb):
+    service = ReportService(dynamodb)
+    service.create_tables()
+    return service
+
@@ -0,0 +1,52 @@
+import time
+import pytest
+from app.services.ArticleFilteration import filter_logic
+from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from app.services.pubmed_services.article_store import ArticleStore
+
+
+def make_article(pubmed_id):
+    return {"pubmed_id": pubmed_id, "title": f"Title {pubmed_id}", "abstract": "", "journal": "J", "date": "2024/01/15"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArticleStore(str(tmp_path / "articles.sqlite3"), max_age_days=30, schema_version=2)
+
+
+def test_missing_pmids_are_stored_as_tombstones(store):
+    store.put_many([make_article("1")], missing_ids=["2"])
+
+    assert store.get_many(["1", "2", "3"]) == {"1": make_article("1"), "2": None}
+    assert store.stats()["tombstones"] == 1
+
+
+def test_tombstones_expire_and_follow_the_schema_version(store, tmp_path):
+    store.put_many([], missing_ids=["2", "3"])
+    store.conn.execute("UPDATE articles SET fetched_at = ? WHERE pubmed_id = '3'", [time.time() - 31 * 86400])
+    store.conn.commit()
+
+    assert store.get_many(["2", "3"]) == {"2": None}
+    newer = ArticleStore(store.path, max_age_days=30, schema_version=3)
+    assert newer.get_many(["2"]) == {}
+
+
+def test_pmids_pubmed_does_not_return_are_not_fetched_again(store, monkeypatch):
+    monkeypatch.setattr(filter_logic, "article_store", store)
+    requested = []
+
+    def fake_fetch(pubmed_ids):
+        requested.append(list(pubmed_ids))
+        # One batch answered without PMID 2, one efetch that failed
+        yield ["1", "2"], [make_article("1")] if "1" in pubmed_ids else []
+        if "3" in pubmed_ids:
+            yield ["3"], None
+    monkeypatch.setattr(filter_logic, "iter_pubmed_data_with_ids", fake_fetch)
+
+    first = [article for batch in ArticleFilter().iter_articles_by_ids(["1", "2", "3"]) for article in batch]
+    second = [article for batch in ArticleFilter().iter_articles_by_ids(["1", "2", "3"]) for article in batch]
+
+    assert [article["pubmed_id"] for article in first] == ["1"]
+    assert [article["pubmed_id"] for article in second] == ["1"]
+    # The tombstoned PMID is not requested again, the one whose efetch failed is
+    assert requested == [["1", "2", "3"], ["3"]]
@@ -0,0 +1,193 @@
+import json
+import pytest
+from app.config import Config
+from app.services.ArticleFilteration.bulk_classifier import BulkClassifier
+from app.services.ArticleFilteration.fake_batch_client import FakeBatchClient
+from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from app.services.Jobs.job_executor import WORKER_ID
+from app.services.models.data_models import PubmedRequest
+from app.services.Pipeline.bulk_pipeline import BulkPipeline, PENDING
+
+CRITERIA = "Genetic studies of epilepsy"
+QUERY = "epilepsy"
+REQUEST = PubmedRequest(start_date="2024/01/01", end_date="2024/01/31", query=QUERY)
+
+
+def make_articles(count):
+    # Every third article mentions the research focus, which FakeBatchClient answers as Relevant
+    return [
+        {
+            "pubmed_id": str(100 + i),
+            "title": f"Epilepsy cohort {i}" if i % 3 == 0 else f"Cardiology cohort {i}",
+            "abstract": "A study.",
+            "journal": "Test Journal",
+            "date": "2024-01-15",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def articles():
+    return make_articles(10)
+
+
+@pytest.fixture
+def filter_service(articles):
+    service = ArticleFilter()
+    service.resolve_pubmed_ids = lambda request: [article["pubmed_id"] for article in articles]
+    service.iter_pubmed_article_batches = lambda request, pubmed_ids: iter(
+        [[article for article in articles if article["pubmed_id"] in set(pubmed_ids)]]
+    )
+    return service
+
+
+@pytest.fixture
+def batch_client():
+    # In progress until the test lets it finish
+    return FakeBatchClient(processing_seconds=3600)
+
+
+def make_pipeline(filter_service, report_service, batch_client, tmp_path, max_requests=None):
+    classifier = BulkClassifier(client=batch_client, work_dir=str(tmp_path), max_requests=max_requests)
+    return BulkPipeline(filter_service, report_service, classifier)
+
+
+def create_report(report_service):
+    report_id, _ = report_service.create_report(
+        "2024-01-01", "2024-01-31", QUERY, CRITERIA, "2024-02-01T00:00:00", options={"mode": "bulk"}
+    )
+    return report_id
+
+
+def stored_rows(report_service, report_id):
+    return {row["PubMedID"]: row for row in report_service.get_all_articles(report_id)}
+
+
+def test_run_submits_and_returns_without_waiting(filter_service, report_service, batch_client, tmp_path):
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+
+    assert pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False) == 0
+
+    assert pipeline.waiting
+    header = report_service.get_report_header(report_id)
+    assert list(header["bulk_batches"].values()) == ["submitted"]
+    assert header["status"] == "processing"
+    # Pending rows stand in for the articles, but are not counted yet
+    assert report_service.count_articles(report_id, PENDING) == 10
+    assert int(header["article_count"]) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_poll_maps_verdicts_back_to_pending_rows(filter_service, report_service, batch_client, tmp_path, articles):
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+
+    # Batch still running: only the checkpoint moves
+    assert pipeline.poll(report_id) is False
+    header = report_service.get_report_header(report_id)
+    assert header["checkpoint_at"]
+    assert header["status"] == "processing"
+
+    batch_client.processing_seconds = 0
+    assert pipeline.poll(report_id) is True
+
+    header = report_service.get_report_header(report_id)
+    assert header["status"] == "complete"
+    assert int(header["article_count"]) == 10
+    assert list(header["bulk_batches"].values()) == ["collected"]
+    assert header["metrics"]["counters"]["llm_calls"] == {"gpt-4o-mini": 10}
+    rows = stored_rows(report_service, report_id)
+    for article in articles:
+        row = rows[article["pubmed_id"]]
+        assert row["Title"] == article["title"]
+        assert row["Relevance"] == ("Relevant" if article["title"].startswith("Epilepsy") else "Not Relevant")
+
+
+def test_failed_lines_are_resubmitted(filter_service, report_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_REQUEUE_ROUNDS", 1)
+    batch_client = FakeBatchClient(fail_ids={"101", "104"})
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+    batch_client.processing_seconds = 3600  # The first batch is done, the resubmitted one waits
+
+    # The first batch is collected and only its failed lines go into a new one
+    assert pipeline.poll(report_id) is False
+    header = report_service.get_report_header(report_id)
+    assert int(header["bulk_round"]) == 1
+    assert sorted(header["bulk_batches"].values()) == ["collected", "submitted"]
+    resubmitted = [batch_id for batch_id, status in header["bulk_batches"].items() if status == "submitted"]
+    input_file = batch_client.stored_files[batch_client.jobs[resubmitted[0]]["input_file_id"]]
+    assert sorted(line["custom_id"] for line in map(json.loads, input_file.decode("utf-8").splitlines())) == ["101", "104"]
+    assert report_service.count_articles(report_id, PENDING) == 2
+
+    batch_client.fail_ids = set()
+    batch_client.processing_seconds = 0
+    assert pipeline.poll(report_id) is True
+    rows = stored_rows(report_service, report_id)
+    assert rows["101"]["Relevance"] == "Not Relevant"
+    assert rows["104"]["Relevance"] in ("Relevant", "Not Relevant")
+    assert report_service.count_articles(report_id, PENDING) == 0
+
+
+def test_lines_failing_every_round_become_errors(filter_service, report_service, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_REQUEUE_ROUNDS", 1)
+    batch_client = FakeBatchClient(fail_ids={"102"})
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+
+    assert pipeline.poll(report_id) is False
+    assert pipeline.poll(report_id) is True
+
+    rows = stored_rows(report_service, report_id)
+    assert rows["102"]["Relevance"] == "Error"
+    assert rows["102"]["Reason"] == "Batch request failed"
+    assert report_service.get_report_header(report_id)["status"] == "complete"
+    # A resumed report classifies the error rows again
+    assert "102" not in report_service.get_completed_pubmed_ids(report_id)
+
+
+def test_batches_are_split_at_max_requests(filter_service, report_service, tmp_path):
+    batch_client = FakeBatchClient()
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path, max_requests=4)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+
+    batch_ids = list(report_service.get_report_header(report_id)["bulk_batches"])
+    assert sorted(batch_client.retrieve_batch(batch_id).request_counts.total for batch_id in batch_ids) == [2, 4, 4]
+
+    assert pipeline.poll(report_id) is True
+    assert report_service.count_articles(report_id) == 10
+
+
+def test_resumed_run_collects_earlier_batches_instead_of_resubmitting(filter_service, report_service, batch_client, tmp_path):
+    report_id = create_report(report_service)
+    make_pipeline(filter_service, report_service, batch_client, tmp_path).run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+
+    # Another process picks the report up while its batch is still running
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+    assert pipeline.waiting
+    assert len(report_service.get_report_header(report_id)["bulk_batches"]) == 1
+    assert len(batch_client.jobs) == 1
+
+    batch_client.processing_seconds = 0
+    assert pipeline.poll(report_id) is True
+    assert report_service.count_articles(report_id) == 10
+
+
+def test_poll_leaves_reports_claimed_by_another_worker(filter_service, report_service, batch_client, tmp_path):
+    report_id = create_report(report_service)
+    pipeline = make_pipeline(filter_service, report_service, batch_client, tmp_path)
+    pipeline.run(report_id, REQUEST, CRITERIA, QUERY, use_cache=False)
+    assert report_service.claim_report(report_id, "another-worker")
+    assert "another-worker" != WORKER_ID
+
+    batch_client.processing_seconds = 0
+    assert pipeline.poll(report_id) is True
+    assert report_service.get_report_header(report_id)["status"] == "processing"
+    assert report_service.count_articles(report_id, PENDING) == 10
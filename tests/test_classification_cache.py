@@ -0,0 +1,32 @@
+import pytest
+from app.services.ArticleFilteration.classification_cache import ClassificationCache
+from app.services.ArticleFilteration.filter_logic import ArticleFilter
+
+FINGERPRINT = ClassificationCache.fingerprint("criteria", "query", "o3-mini", True, False)
+
+
+def make_article(pubmed_id):
+    return {"pubmed_id": pubmed_id, "title": f"Title {pubmed_id}", "abstract": "", "journal": "J", "date": "2024/01/15"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ClassificationCache(str(tmp_path / "classifications.sqlite3"), max_entries=100)
+
+
+def test_cached_rows_keep_the_full_verdict(cache):
+    service = ArticleFilter()
+    screened = service.result_row(make_article("1"), {"relevance": "Not Relevant", "genes_variants": [], "confidence": 0.97})
+    escalated = service.result_row(make_article("2"), {"relevance": "Relevant", "genes_variants": ["BRCA1"], "reason": "Cohort study"})
+    rows = [{**screened, "Tier": "screen"}, {**escalated, "Tier": "escalate"}]
+    cache.put_many(rows, FINGERPRINT)
+
+    cached = cache.get_many(["1", "2"], FINGERPRINT)
+    assert [service.cached_row(make_article(pubmed_id), cached[pubmed_id]) for pubmed_id in ("1", "2")] == rows
+
+
+def test_error_rows_are_not_cached(cache):
+    row = ArticleFilter().result_row(make_article("1"), {})
+    cache.put_many([row], FINGERPRINT)
+
+    assert cache.get_many(["1"], FINGERPRINT) == {}
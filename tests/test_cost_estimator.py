@@ -0,0 +1,65 @@
+import pytest
+from app import create_app
+from app.api import filter_article as filter_api
+from app.services.ArticleFilteration import cost_estimator as estimator_module, filter_logic
+from app.services.ArticleFilteration.classification_cache import ClassificationCache
+from app.services.ArticleFilteration.cost_estimator import CostEstimator
+from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from app.services.Metrics import metrics
+from app.services.models.data_models import PubmedRequest
+
+CRITERIA = "Genetic studies of epilepsy"
+QUERY = "epilepsy"
+REQUEST = PubmedRequest(start_date="2024/01/01", end_date="2024/01/31", query=QUERY)
+
+
+def make_article(pubmed_id):
+    return {"pubmed_id": pubmed_id, "title": f"Epilepsy cohort {pubmed_id}", "abstract": "A study.", "journal": "J",
+            "date": "2024/01/15"}
+
+
+@pytest.fixture
+def sample(monkeypatch):
+    articles = [make_article(str(i)) for i in range(4)]
+    history = {"count": len(articles), "query_key": "1", "webenv": "W"}
+    monkeypatch.setattr(estimator_module, "search_pubmed", lambda query, mindate=None, maxdate=None: history)
+    monkeypatch.setattr(estimator_module, "fetch_in_parallel", lambda params, mindate=None, maxdate=None: list(articles))
+    return articles
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ClassificationCache(str(tmp_path / "classifications.sqlite3"), max_entries=100)
+    monkeypatch.setattr(filter_logic, "classification_cache", cache)
+    return cache
+
+
+def test_estimate_leaves_cache_and_metrics_untouched(sample, cache):
+    fingerprint = ClassificationCache.fingerprint(CRITERIA, QUERY, "gpt-4o-mini", False, False)
+    service = ArticleFilter()
+    cache.put_many([service.result_row(sample[0], {"relevance": "Relevant", "genes_variants": []})], fingerprint)
+    (last_used,) = cache.conn.execute("SELECT last_used FROM classifications").fetchone()
+    spans = metrics.process_metrics.stats()["spans"]
+
+    estimate = CostEstimator(service).estimate(REQUEST, CRITERIA, QUERY, prerank={"top_k": 3})
+
+    assert estimate["sample"]["cached"] == 1
+    assert estimate["sample"]["decided_locally"] == 1
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert cache.conn.execute("SELECT last_used FROM classifications").fetchone() == (last_used,)
+    stats = metrics.process_metrics.stats()["spans"]
+    assert {stage: stats.get(stage) for stage in ("prepare", "prerank")} == {stage: spans.get(stage) for stage in ("prepare", "prerank")}
+
+
+@pytest.mark.parametrize("max_concurrency", [True, 0, "4"])
+def test_estimate_rejects_invalid_max_concurrency(max_concurrency, monkeypatch):
+    monkeypatch.setattr(filter_api.cost_estimator, "estimate", lambda *args: pytest.fail("estimate should not run"))
+    client = create_app().test_client()
+
+    response = client.post("/api/articles/filter/estimate", json={
+        "start_date": "2024-01-01", "end_date": "2024-01-31", "query": QUERY, "criteria": CRITERIA,
+        "max_concurrency": max_concurrency,
+    })
+
+    assert response.status_code == 400
+    assert response.json == {"error": "max_concurrency must be a positive integer"}
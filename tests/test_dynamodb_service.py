@@ -0,0 +1,151 @@
+import pytest
+import app as app_module
+from app import create_app
+from app.config import Config
+from app.services.DynamoDB import dynamodb_service
+
+
+def make_row(pubmed_id, relevance="Not Relevant"):
+    return {
+        "PubMedID": pubmed_id,
+        "Title": f"Title {pubmed_id}",
+        "Abstract": "",
+        "Journal": "J",
+        "Date": "2024/01/15",
+        "Relevance": relevance,
+        "GeneVariants": "None",
+        "Reason": "",
+    }
+
+
+def create_report(report_service):
+    report_id, _ = report_service.create_report("2024-01-01", "2024-01-31", "epilepsy", "Genetic studies", "2024-02-01T00:00:00")
+    return report_id
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(dynamodb_service.time, "sleep", lambda seconds: None)
+
+
+def hold_back_once(report_service, monkeypatch, held=1):
+    """Make the first BatchWriteItem call leave its last `held` items unprocessed, like a throttled table."""
+    batch_write_item = report_service.dynamodb.batch_write_item
+    calls = []
+
+    def throttled(RequestItems):
+        calls.append({table: len(requests) for table, requests in RequestItems.items()})
+        if len(calls) > 1:
+            return batch_write_item(RequestItems=RequestItems)
+        (table, requests), = RequestItems.items()
+        batch_write_item(RequestItems={table: requests[:-held]})
+        return {"UnprocessedItems": {table: requests[-held:]}}
+
+    monkeypatch.setattr(report_service.dynamodb, "batch_write_item", throttled)
+    return calls
+
+
+def test_unprocessed_items_are_retried(report_service, monkeypatch, no_backoff):
+    report_id = create_report(report_service)
+    calls = hold_back_once(report_service, monkeypatch, held=2)
+
+    response = report_service.add_filtered_articles(report_id, [make_row(str(i)) for i in range(30)])
+
+    assert response["written"] == 30
+    table = report_service.articles_table.name
+    # The first chunk of 25 is retried with its two unprocessed items before the next chunk
+    assert calls == [{table: 25}, {table: 2}, {table: 5}]
+    assert report_service.count_articles(report_id) == 30
+    assert int(report_service.get_report_header(report_id)["article_count"]) == 30
+
+
+def test_items_unprocessed_after_every_retry_are_an_error(report_service, monkeypatch, no_backoff):
+    monkeypatch.setattr(Config, "DYNAMODB_MAX_RETRIES", 2)
+    report_id = create_report(report_service)
+    monkeypatch.setattr(report_service.dynamodb, "batch_write_item",
+                        lambda RequestItems: {"UnprocessedItems": RequestItems})
+
+    response = report_service.add_filtered_articles(report_id, [make_row("1")])
+
+    assert response == {"error": f"1 articles still unprocessed for {report_id}"}
+    assert int(report_service.get_report_header(report_id).get("article_count", 0)) == 0
+
+
+def test_report_pages_follow_query_pagination(report_service):
+    report_id = create_report(report_service)
+    relevant = {"2", "5", "6"}
+    report_service.add_filtered_articles(report_id, [
+        make_row(str(i), "Relevant" if str(i) in relevant else "Not Relevant") for i in range(8)
+    ])
+
+    pages, start_key = [], None
+    while True:
+        header, articles, start_key = report_service.get_report_page(report_id, 3, start_key)
+        pages.append([article["PubMedID"] for article in articles])
+        if start_key is None:
+            break
+    assert header["article_count"] == 8
+    assert pages == [["0", "1", "2"], ["3", "4", "5"], ["6", "7"]]
+    assert all("report_id" not in article for article in articles)
+
+    # DynamoDB filters after Limit, so a filtered page is assembled from several reads
+    _, articles, start_key = report_service.get_report_page(report_id, 2, fields=["Title"], relevance=["Relevant"])
+    assert articles == [{"Title": "Title 2"}, {"Title": "Title 5"}]
+    _, articles, start_key = report_service.get_report_page(report_id, 2, start_key, fields=["Title"], relevance=["Relevant"])
+    assert articles == [{"Title": "Title 6"}]
+    assert start_key is None
+
+    assert sorted(item["pubmed_id"] for item in report_service.get_all_articles(report_id)) == [str(i) for i in range(8)]
+    assert sum(len(page) for page in report_service.iter_articles_with_relevance(report_id, "Relevant")) == 3
+
+
+def test_legacy_reports_with_inline_articles_are_read(report_service):
+    # Written before the per-article layout: the header holds the list and has no article_count
+    rows = [make_row(str(i), "Relevant" if i % 2 else "Not Relevant") for i in range(5)]
+    report_service.table.put_item(Item={
+        "report_id": "legacy",
+        "start_date": "2023-01-01",
+        "end_date": "2023-01-31",
+        "query": "epilepsy",
+        "criteria": "Genetic studies",
+        "status": "complete",
+        "filtered_articles": rows,
+    })
+
+    assert report_service.get_report("legacy")["filtered_articles"] == rows
+
+    header, articles, start_key = report_service.get_report_page("legacy", 2)
+    assert "filtered_articles" not in header
+    assert articles == rows[:2]
+    assert start_key == {"offset": 2}
+    _, articles, start_key = report_service.get_report_page("legacy", 2, start_key)
+    assert articles == rows[2:4]
+    _, articles, start_key = report_service.get_report_page("legacy", 2, start_key)
+    assert articles == rows[4:]
+    assert start_key is None
+
+    _, articles, start_key = report_service.get_report_page("legacy", 5, fields=["PubMedID"], relevance=["Relevant"])
+    assert articles == [{"PubMedID": "1"}, {"PubMedID": "3"}]
+    assert start_key is None
+
+
+
+def test_missing_tables_stop_startup_until_created(dynamodb, monkeypatch):
+    service = dynamodb_service.ReportService(dynamodb)
+    monkeypatch.setattr(app_module, "report_service", service)
+    assert service.missing_tables() == [
+        dynamodb_service.TABLE_NAME, dynamodb_service.ARTICLES_TABLE_NAME, dynamodb_service.FINGERPRINTS_TABLE_NAME
+    ]
+
+    monkeypatch.setattr(Config, "DYNAMODB_CHECK_TABLES", True)
+    with pytest.raises(RuntimeError, match="create-tables"):
+        create_app()
+
+    monkeypatch.setattr(Config, "DYNAMODB_CHECK_TABLES", False)
+    result = create_app().test_cli_runner().invoke(args=["create-tables"])
+    assert result.exit_code == 0
+    assert service.missing_tables() == []
+    assert create_app().test_cli_runner().invoke(args=["create-tables"]).output == "All DynamoDB tables already exist.\n"
+
+    monkeypatch.setattr(Config, "DYNAMODB_CHECK_TABLES", True)
+    create_app()
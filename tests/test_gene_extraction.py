@@ -0,0 +1,78 @@
+import pytest
+from app import create_app
+from app.config import Config
+from app.services.ArticleFilteration import filter_logic
+from app.services.ArticleFilteration.filter_logic import ArticleFilter
+from app.services.GeneExtraction import extract_logic
+from app.services.GeneExtraction.extract_logic import GeneExtractor, GeneSymbolsUnavailable
+
+HGNC_ROWS = [
+    ("symbol", "alias_symbol", "prev_symbol"),
+    ("AR", "AIS|NR3C4", ""),
+    ("MAX", "bHLHd4", ""),
+    ("SCN2A", "Nav1.2", ""),
+    ("MS4A1", "CD20", "MS"),
+    ("APP", "AD1", "AD"),
+    ("CNTN4", "CNS", ""),
+]
+
+
+@pytest.fixture
+def hgnc_path(tmp_path):
+    path = tmp_path / "hgnc.txt"
+    path.write_text("".join("\t".join(row) + "\n" for row in HGNC_ROWS), encoding="utf-8")
+    return str(path)
+
+
+def test_common_clinical_abbreviations_are_not_gene_aliases(hgnc_path):
+    extractor = GeneExtractor(hgnc_path, min_alias_length=2, symbol_stoplist=[])
+    text = (
+        "AD inheritance was seen; CNS involvement resembled MS. "
+        "A de novo SCN2A variant c.4886G>A was found."
+    )
+
+    result = extractor.extract_many([text])[0]
+
+    assert result["genes"] == ["SCN2A"]
+    assert result["variants"] == ["c.4886G>A"]
+
+
+def test_approved_symbols_are_found_unless_stoplisted(hgnc_path):
+    text = "MAX dimerizes with MYC; AR signalling was reduced."
+
+    assert GeneExtractor(hgnc_path, symbol_stoplist=[]).find_genes(text) == ["MAX", "AR"]
+    assert GeneExtractor(hgnc_path, symbol_stoplist=["AR"]).find_genes(text) == ["MAX"]
+
+
+def make_article(pubmed_id, text):
+    return {"pubmed_id": pubmed_id, "title": text, "abstract": "", "journal": "J", "date": "2024-01-01"}
+
+
+def test_prescreen_is_skipped_without_gene_symbols(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "GENE_PRESCREEN", True)
+    monkeypatch.setattr(filter_logic, "gene_extractor", GeneExtractor(str(tmp_path / "missing.txt")))
+    articles = [make_article("1", "SCN2A in epilepsy"), make_article("2", "A cohort study")]
+
+    decided, _, _ = ArticleFilter().screen_articles(articles, None, False)
+
+    assert decided == {}
+
+
+def test_prescreen_rejects_articles_without_mentions(hgnc_path, monkeypatch):
+    monkeypatch.setattr(Config, "GENE_PRESCREEN", True)
+    monkeypatch.setattr(filter_logic, "gene_extractor", GeneExtractor(hgnc_path))
+    articles = [make_article("1", "SCN2A in epilepsy"), make_article("2", "A cohort study")]
+
+    decided, _, _ = ArticleFilter().screen_articles(articles, None, False)
+
+    assert list(decided) == ["2"]
+    assert decided["2"]["Rule"] == "no-gene-mention"
+
+
+def test_app_refuses_to_start_prescreen_without_gene_symbols(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "GENE_PRESCREEN", True)
+    monkeypatch.setattr(extract_logic.gene_extractor, "hgnc_path", str(tmp_path / "missing.txt"))
+    monkeypatch.setattr(extract_logic.gene_extractor, "_symbols", None)
+
+    with pytest.raises(GeneSymbolsUnavailable):
+        create_app()
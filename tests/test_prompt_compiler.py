@@ -0,0 +1,16 @@
+from app.services.ArticleFilteration.prompt_compiler import CompiledPrompt
+
+
+def test_give_reason_asks_for_a_reason():
+    for batch in (False, True):
+        instructions = CompiledPrompt("criteria", "query", give_reason=True, batch=batch).instructions
+        assert "provide a short reason" in instructions
+        assert "Do not provide a reason" not in instructions
+
+
+def test_reason_only_asked_for_when_requested():
+    instructions = CompiledPrompt("criteria", "query", extract_genes=True).instructions
+    assert "reason" not in instructions.lower()
+
+    instructions = CompiledPrompt("criteria", "query").instructions
+    assert "Do not provide a reason" in instructions
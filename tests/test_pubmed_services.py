@@ -0,0 +1,41 @@
+import io
+import os
+from app.services.Metrics import metrics
+from app.services.pubmed_services import pubmed_services
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks", "fixtures", "efetch_sample.xml")
+
+
+class TrickleResponse:
+    """A streamed efetch response whose body arrives in small pieces."""
+
+    def __init__(self, body, piece=512):
+        self.body = io.BytesIO(body)
+        self.piece = piece
+        self.raw = self
+        self.closed = False
+
+    def read(self, size=-1):
+        return self.body.read(self.piece if size is None or size < 0 else min(size, self.piece))
+
+    def close(self):
+        self.closed = True
+
+
+def test_iter_efetch_articles_yields_while_the_body_is_still_being_read(monkeypatch):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    response = TrickleResponse(body)
+    monkeypatch.setattr(pubmed_services, "eutils_request", lambda *args, **kwargs: response)
+
+    with metrics.report_metrics() as report_metrics:
+        articles = pubmed_services.iter_efetch_articles({"id": "1"}, None, None)
+        first = next(articles)
+        assert first["pubmed_id"] == "39000001"
+        assert response.body.tell() < len(body)
+
+        rest = list(articles)
+
+    assert len(rest) == body.count(b"<PubmedArticle>") - 1
+    assert response.closed
+    assert report_metrics.stats()["spans"]["parse"]["calls"] == 1
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+from app.api import filter_article as filter_api, report as report_api
+from app.config import Config
+from app.services.Jobs.job_executor import WORKER_ID
+
+
+@pytest.fixture
+def client(report_service, monkeypatch):
+    monkeypatch.setattr(report_api, "report_service", report_service)
+    resumed = []
+    monkeypatch.setattr(report_api, "resume_analysis_job", lambda report: resumed.append(report["report_id"]))
+    client = create_app().test_client()
+    client.resumed = resumed
+    return client
+
+
+def processing_report(report_service, checkpoint_age):
+    report_id, _ = report_service.create_report("2024-01-01", "2024-01-31", "q", "c", "2024-02-01T00:00:00", worker_id="another-worker")
+    assert report_service.start_job(report_id, "another-worker")
+    checkpoint_at = (datetime.now() - timedelta(seconds=checkpoint_age)).isoformat()
+    report_service.table.update_item(
+        Key={"report_id": report_id},
+        UpdateExpression="SET checkpoint_at = :at",
+        ExpressionAttributeValues={":at": checkpoint_at}
+    )
+    return report_id
+
+
+def test_resume_refuses_report_with_fresh_checkpoint(client, report_service):
+    report_id = processing_report(report_service, checkpoint_age=5)
+
+    response = client.post(f"/api/reports/{report_id}/resume")
+
+    assert response.status_code == 409
+    assert response.json["stale_after_seconds"] == Config.RESUME_STALE_SECONDS
+    assert client.resumed == []
+    assert report_service.get_report_header(report_id)["worker_id"] == "another-worker"
+
+
+def test_resume_takes_over_stale_report(client, report_service):
+    report_id = processing_report(report_service, checkpoint_age=Config.RESUME_STALE_SECONDS + 60)
+
+    response = client.post(f"/api/reports/{report_id}/resume")
+
+    assert response.status_code == 202
+    assert client.resumed == [report_id]
+    assert report_service.get_report_header(report_id)["worker_id"] == WORKER_ID
+
+
+def test_queued_job_is_skipped_once_another_worker_claimed_the_report(report_service, monkeypatch):
+    monkeypatch.setattr(filter_api, "report_service", report_service)
+    monkeypatch.setattr(filter_api, "AnalysisPipeline", lambda *args, **kwargs: pytest.fail("the job should not run"))
+    report_id, _ = report_service.create_report("2024-01-01", "2024-01-31", "q", "c", "2024-02-01T00:00:00", worker_id=WORKER_ID)
+    # Another process resumes the report while the job still waits in this process's queue
+    assert report_service.claim_report(report_id, "another-worker", WORKER_ID)
+
+    filter_api.run_analysis(report_id, "2024-01-01", "2024-01-31", "q", "c", False, False)
+
+    header = report_service.get_report_header(report_id)
+    assert header["worker_id"] == "another-worker"
+    assert header["status"] == "processing"
+    assert "metrics" not in header